@@ -1,14 +1,12 @@
-import requests
 import os
 import json
+import math
 from functools import wraps
 from random import randint
 from datetime import datetime
 import secrets
-import smtplib
-
-import firebase_admin
-from firebase_admin import credentials, firestore
+import threading
+import time
 
 from flask import (
     Flask,
@@ -21,86 +19,95 @@ from flask import (
     abort,
     send_file,
 )
-from flask_bcrypt import Bcrypt
 from dotenv import load_dotenv
 
 from email.mime.text import MIMEText
-from groq import Groq
-
-from google.oauth2 import id_token
-from google_auth_oauthlib.flow import Flow
-import google.auth.transport.requests
-import wikipedia
-import feedparser
-# 🔥 DUCKDUCKGO SEARCH (ADDITION ONLY)
-from duckduckgo_search import DDGS
 import traceback
 
+# groq, firebase_admin, requests, feedparser, duckduckgo_search and the
+# Google auth libraries are imported where they are first used (or by
+# preload_heavy_imports), so importing this module stays cheap
+
+def session_user():
+    # email of the logged-in user, or None if the session was revoked;
+    # a cookie from before sessions had ids can't be revoked, so it is
+    # treated as logged out too
+    email = session.get("email")
+    if not email:
+        return None
+
+    sid = session.get("sid")
+    if not sid or not session_registry.is_active(sid):
+        session.clear()
+        return None
+    return email
+
 def login_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
-        if "email" not in session:
+        if not session_user():
             return redirect("/login")
         return f(*args, **kwargs)
     return decorated
 
-from utils.sessions import register_session
-FACT_RESOLVER=[]
-def resolve_ipl_facts(text: str) -> str | None:
-    t = text.lower()
-
-    IPL_ORANGE_CAP = {
-        2023: "Shubman Gill",
-        2022: "Jos Buttler",
-        2021: "Ruturaj Gaikwad",
-        2020: "KL Rahul",
-        2019: "David Warner",
-        2018: "Kane Williamson",
-    }
-
-    if "orange cap" in t:
-        for year, winner in IPL_ORANGE_CAP.items():
-            if str(year) in t:
-                return f"The {year} IPL Orange Cap winner was {winner}."
-
-        return "I don’t have verified information for that year."
-
-    return None
-
-FACT_RESOLVER.append(resolve_ipl_facts)
-
-def resolve_indian_leaders(text: str) -> str | None:
-    t = text.lower()
-
-    if "prime minister of india" in t:
-        return "The current Prime Minister of India is Narendra Modi."
-
-    if "president of india" in t:
-        return "The current President of India is Droupadi Murmu."
-
-    return None
+def admin_required(f):
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        email = session_user()
+        if not email:
+            return redirect("/login")
+        if email not in ADMIN_EMAILS:
+            abort(403)
+        return f(*args, **kwargs)
+    return decorated
 
-FACT_RESOLVER.append(resolve_indian_leaders)
+from utils.lazy import Lazy
+from utils.sessions import register_session
+from utils.location import offline_table
+from utils.cache import cached_lookup, retrieval_cache_stats
+from utils.retrieval import fan_out, source_timeout
+from utils.sources import wiki_summary, fetch_feed, split_sentences
+from utils.intents import classify_intents
+from utils.facts import fact_engine  # fact tables: data/facts.json
+from utils.message_sink import create_message_sink
+from utils.conversation import ConversationStore
+from utils.history import HistoryVersions, encode_cursor, decode_cursor, page_size
+from utils.conversation_index import conversations_ref, index_update
+from utils.jobs import JobRunner
+from utils.export import EXPORT_FORMATS, find_export, write_export
+from utils.deletion import delete_query
+from utils.session_registry import SessionRegistry
+from utils.kvstore import create_store
+from utils.mailer import mailer
+from utils.users import UserRepository, UserExists
+from utils.hashing import hasher, HashingBusy
+from utils.response_cache import response_cache, context_scope
+from utils.metrics import (
+    STAGE_SECONDS,
+    STREAMS,
+    TokenMeter,
+    FIRESTORE_SECONDS,
+    count_sse,
+    worker_metrics,
+)
+from utils.sse import chunk_frame, coalesce_into
+from utils.replay import replay_buffer, follow, StreamGone, SSE_REPLAY_MAX_AGE
+from utils.admission import (
+    stream_buckets,
+    llm_governor,
+    UpstreamBusy,
+    retry_after_from,
+)
 # =========================
 # 🛡️ HALLUCINATION GUARD
 # =========================
 
 def is_fact_query(text: str) -> bool:
-    keywords = [
-        "who", "winner", "when", "year", "born",
-        "orange cap", "ipl", "score", "record",
-        "president", "prime minister"
-    ]
-    return any(k in text.lower() for k in keywords)
+    return "fact" in classify_intents(text)
 
 
-def get_verified_context(user_text: str) -> str:
-    if is_fact_query(user_text):
-        try:
-            return wikipedia.summary(user_text, sentences=4)
-        except:
-            return ""
-    return ""
+# sentences of the Wikipedia extract used as verified context
+VERIFIED_SENTENCES = 4
 
 
 def hallucination_guard(user_text: str, verified_context: str) -> str:
@@ -130,85 +137,141 @@ SERVICE_ACCOUNT = os.getenv("SERVICE_ACCOUNT")
 
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 GROQ_MODEL = os.getenv("GROQ_MODEL", "llama3-8b")
-groq_client = Groq(api_key=GROQ_API_KEY) if GROQ_API_KEY else None
+
+
+def connect_groq():
+    from groq import Groq
+    return Groq(api_key=GROQ_API_KEY)
+
+
+groq_client = Lazy(connect_groq) if GROQ_API_KEY else None
 
 ADMIN_EMAILS = {"youradmin@gmail.com"}  # change this
 
 
-# Firebase init
 # Firebase init (SAFE)
-if not firebase_admin._apps:
-   SERVICE_ACCOUNT_PATH = os.path.abspath(SERVICE_ACCOUNT) if SERVICE_ACCOUNT else None
+SERVICE_ACCOUNT_PATH = os.path.abspath(SERVICE_ACCOUNT) if SERVICE_ACCOUNT else None
 
-if not firebase_admin._apps:
+# firestore.Query.DESCENDING, without importing the client library
+DESCENDING = "DESCENDING"
+
+
+def check_service_account():
     if not SERVICE_ACCOUNT_PATH or not os.path.exists(SERVICE_ACCOUNT_PATH):
         raise RuntimeError(
             "SERVICE_ACCOUNT path is invalid. "
             "Set full path in .env (e.g. /Users/you/project/serviceAccountKey.json)"
         )
 
-    cred = credentials.Certificate(SERVICE_ACCOUNT_PATH)
-    firebase_admin.initialize_app(cred)
 
-db = firestore.client()
-users_col = db.collection("users")
-messages_col = db.collection("messages")
-api_keys_col = db.collection("api_keys")
+def connect_firestore():
+    import firebase_admin
+    from firebase_admin import credentials, firestore
+
+    if not firebase_admin._apps:
+        check_service_account()
+        cred = credentials.Certificate(SERVICE_ACCOUNT_PATH)
+        firebase_admin.initialize_app(cred)
+    return firestore.client()
+
+
+# all of these connect on first use, in the process that uses them
+db = Lazy(connect_firestore)
+users_col = Lazy(lambda: db.collection("users"))
+messages_col = Lazy(lambda: db.collection("messages"))
+api_keys_col = Lazy(lambda: db.collection("api_keys"))
+
+# change counters behind the /api/history ETags, shared by all workers
+history_versions = HistoryVersions(Lazy(create_store))
+
+
+# token-budgeted per-conversation history for the prompt
+conversations = ConversationStore(messages_col, Lazy(create_store))
+
+
+def messages_committed(docs: list):
+    for email, convo in {(doc["user"], doc["convo"]) for doc in docs}:
+        history_versions.bump(email, convo)
+    conversations.committed(docs)
+
+
+# chat messages are written behind the stream in batches; ETags and
+# conversation windows move only once a batch is committed
+message_sink = create_message_sink(db, messages_col, on_commit=messages_committed)
+# background exports / deletions, status in jobs/{id}
+jobs = JobRunner(db)
+# sid -> active, cached for a few seconds per worker
+session_registry = SessionRegistry(db)
+# read-through profile cache; all user doc writes go through it
+users = UserRepository(users_col)
+# accounts being deleted; outlives any reply that was still streaming
+deleted_accounts = Lazy(create_store)
+ACCOUNT_TOMBSTONE_TTL = SSE_REPLAY_MAX_AGE + 60
 
 
 # Flask
 app = Flask(__name__, static_folder="static", template_folder="templates")
 app.secret_key = FLASK_SECRET
-bcrypt = Bcrypt(app)
 
-otp_storage = {}  # memory OTP
+@app.errorhandler(HashingBusy)
+def hashing_busy(e):
+    # password hashing pool is saturated: shed load instead of queueing
+    return "Too many requests, please try again in a moment", 429, {"Retry-After": "1"}
+
+# OTPs expire and are shared by every worker (see utils/kvstore.py)
+OTP_TTL = 600
+OTP_MAX_ATTEMPTS = 5
+otp_storage = Lazy(create_store)
+
+
+def check_otp(email: str, otp: str) -> str | None:
+    """
+    None if `otp` is valid for `email`, else the error to show.
+    """
+    # count the attempt before comparing: the increment is atomic, so
+    # parallel guesses can't all slip in under the cap
+    record = otp_storage.incr(f"otp:{email}", "attempts")
+    if not record:
+        return "OTP expired, please request a new one"
+    if record["attempts"] > OTP_MAX_ATTEMPTS:
+        return "Too many attempts, please request a new OTP"
+    if not secrets.compare_digest(
+        str(record.get("otp", "")).encode(), str(otp or "").encode()
+    ):
+        return "Incorrect OTP"
+    return None
 
 # =====================================================
 # 🔥 WIKIPEDIA HELPERS (ADDITION ONLY)
 # =====================================================
 
 def needs_wikipedia(text: str) -> bool:
-    keywords = [
-        "who is", "what is", "explain", "define",
-        "history", "about", "meaning"
-    ]
-    t = text.lower()
-    return any(k in t for k in keywords)
+    return "wikipedia" in classify_intents(text)
 
+@cached_lookup("wikipedia")
 def wikipedia_lookup(query: str) -> str:
+    # disambiguation pages are skipped for the next best match
     try:
-        wikipedia.set_lang("en")
-        return wikipedia.summary(query, sentences=5, auto_suggest=True)
-    except wikipedia.DisambiguationError as e:
-        try:
-            return wikipedia.summary(e.options[0], sentences=4)
-        except Exception:
-            return ""
+        return wiki_summary(query, sentences=5, timeout=source_timeout("wikipedia"))
     except Exception:
         return ""
 
 
 
 def needs_news(text: str) -> bool:
-    keywords = [
-        "news", "latest", "today", "current",
-        "update", "updates", "breaking",
-        "price", "launch", "released"
-    ]
-    t = text.lower()
-    return any(k in t for k in keywords)
+    return "news" in classify_intents(text)
 
 
+@cached_lookup("news")
 def google_news_lookup(query: str) -> str:
     try:
         # Google News RSS search
-        rss_url = (
-            "https://news.google.com/rss/search?"
-            f"q={query}&hl=en-IN&gl=IN&ceid=IN:en"
+        feed = fetch_feed(
+            "https://news.google.com/rss/search",
+            {"q": query, "hl": "en-IN", "gl": "IN", "ceid": "IN:en"},
+            timeout=source_timeout("news"),
         )
 
-        feed = feedparser.parse(rss_url)
-
         summaries = []
         for entry in feed.entries[:5]:
             summaries.append(
@@ -221,21 +284,17 @@ def google_news_lookup(query: str) -> str:
         return ""
 
 def needs_search(text: str) -> bool:
-    keywords = [
-        "how to", "best", "compare", "vs",
-        "tool", "library", "framework",
-        "alternative", "example", "tutorial",
-        "use case", "guide"
-    ]
-    t = text.lower()
-    return any(k in t for k in keywords)
+    return "search" in classify_intents(text)
 
 
+@cached_lookup("search")
 def duckduckgo_lookup(query: str) -> str:
+    # 🔥 DUCKDUCKGO SEARCH (ADDITION ONLY)
+    from duckduckgo_search import DDGS
     try:
         results = []
 
-        with DDGS() as ddgs:
+        with DDGS(timeout=source_timeout("search")) as ddgs:
             for r in ddgs.text(query, max_results=5):
                 title = r.get("title", "")
                 snippet = r.get("body", "")
@@ -248,33 +307,57 @@ def duckduckgo_lookup(query: str) -> str:
     except Exception:
         return ""
 
-def inject_wikipedia_context(user_text: str) -> str:
+def retrieve_context(user_text: str) -> dict:
+    # every applicable source runs at once, bounded by one latency budget
+    intents = classify_intents(user_text)
+    jobs = {}
+    if "news" in intents:
+        jobs["news"] = google_news_lookup
+    if "fact" in intents or "wikipedia" in intents:
+        # one extract feeds both the verified snippet and the summary
+        jobs["wikipedia"] = wikipedia_lookup
+    if "search" in intents:
+        jobs["search"] = duckduckgo_lookup
+
+    live = fan_out(jobs, user_text)
+    if "fact" in intents and live.get("wikipedia"):
+        # the guard carries the opening sentences; only the rest is
+        # repeated in the question, so no text goes in the prompt twice
+        live["verified"], rest = split_sentences(live["wikipedia"], VERIFIED_SENTENCES)
+        if "wikipedia" in intents and rest:
+            live["wikipedia"] = rest
+        else:
+            del live["wikipedia"]
+    return live
+
+
+def inject_wikipedia_context(user_text: str, live: dict | None = None) -> str:
     today = datetime.utcnow().strftime("%Y-%m-%d")
     context_blocks = []
 
+    if live is None:
+        live = retrieve_context(user_text)
+
     # 1️⃣ Google News (time-sensitive)
-    if needs_news(user_text):
-        news_text = google_news_lookup(user_text)
-        if news_text:
-            context_blocks.append(
-                f"GOOGLE NEWS (retrieved {today}):\n{news_text}"
-            )
+    news_text = live.get("news")
+    if news_text:
+        context_blocks.append(
+            f"GOOGLE NEWS (retrieved {today}):\n{news_text}"
+        )
 
     # 2️⃣ Wikipedia (encyclopedic)
-    if needs_wikipedia(user_text):
-        wiki_text = wikipedia_lookup(user_text)
-        if wiki_text:
-            context_blocks.append(
-                f"WIKIPEDIA (retrieved {today}):\n{wiki_text}"
-            )
+    wiki_text = live.get("wikipedia")
+    if wiki_text:
+        context_blocks.append(
+            f"WIKIPEDIA (retrieved {today}):\n{wiki_text}"
+        )
 
     # 3️⃣ DuckDuckGo (fallback web search)
-    if not context_blocks and needs_search(user_text):
-        search_text = duckduckgo_lookup(user_text)
-        if search_text:
-            context_blocks.append(
-                f"WEB SEARCH (DuckDuckGo, retrieved {today}):\n{search_text}"
-            )
+    search_text = live.get("search")
+    if not context_blocks and search_text:
+        context_blocks.append(
+            f"WEB SEARCH (DuckDuckGo, retrieved {today}):\n{search_text}"
+        )
 
     if not context_blocks:
         return user_text
@@ -311,7 +394,7 @@ def send_otp(email: str) -> bool:
         return False
 
     otp = randint(100000, 999999)
-    otp_storage[email] = otp
+    otp_storage.set(f"otp:{email}", {"otp": str(otp), "attempts": 0}, OTP_TTL)
 
     msg = MIMEText(
         f"""
@@ -351,14 +434,8 @@ def send_otp(email: str) -> bool:
     msg["From"] = f"GHost AI 👻 <{EMAIL_ADDRESS}>"
     msg["To"] = email
 
-    try:
-        with smtplib.SMTP_SSL("smtp.gmail.com", 465) as s:
-            s.login(EMAIL_ADDRESS, EMAIL_PASSWORD)
-            s.sendmail(EMAIL_ADDRESS, email, msg.as_string())
-        return True
-    except Exception as e:
-        print("OTP error:", e)
-        return False
+    # queued: the SMTP handshake happens off the request thread
+    return mailer.send(email, msg)
 
 
 def send_password_changed_email(email: str):
@@ -400,14 +477,7 @@ def send_password_changed_email(email: str):
     msg["From"] = f"GHost AI 👻 "
     msg["To"] = email
 
-    try:
-        with smtplib.SMTP_SSL("smtp.gmail.com", 465) as s:
-            s.login(EMAIL_ADDRESS, EMAIL_PASSWORD)
-            s.sendmail(EMAIL_ADDRESS, email, msg.as_string())
-        return True
-    except Exception as e:
-        print("Password change email error:", e)
-        return False
+    return mailer.send(email, msg)
 
 
 # =========================
@@ -415,7 +485,7 @@ def send_password_changed_email(email: str):
 # =========================
 @app.route("/")
 def index():
-    if session.get("email"):
+    if session_user():
         return redirect("/chat")
     return render_template("index.html")
 
@@ -430,19 +500,25 @@ def signup():
         if not name or not email or not pw:
             return render_template("signup.html", error="Please fill in all fields")
 
-        if users_col.document(email).get().exists:
+        if users.exists(email):
             return render_template("signup.html", error="Email already exists")
 
-        hashed = bcrypt.generate_password_hash(pw).decode("utf-8")
-        users_col.document(email).set(
-            {
-                "name": name,
-                "email": email,
-                "password": hashed,
-                "photo": "https://i.pravatar.cc/150?u=" + email,
-                "verified": False,
-            }
-        )
+        hashed = hasher.hash(pw)
+        try:
+            users.create(
+                email,
+                {
+                    "name": name,
+                    "email": email,
+                    "password": hashed,
+                    "photo": "https://i.pravatar.cc/150?u=" + email,
+                    "verified": False,
+                }
+            )
+        except UserExists:
+            return render_template("signup.html", error="Email already exists")
+        # the address may belong to an account deleted minutes ago
+        deleted_accounts.delete(f"deleted:{email}")
 
         session["verify_email"] = email
         send_otp(email)
@@ -498,19 +574,26 @@ def login():
         if not email or not pw:
             return render_template("login.html", error="Please enter email & password")
 
-        doc = users_col.document(email).get()
-        if not doc.exists:
+        # never a cached profile: a password reset or account deletion on
+        # another worker must take effect here at once
+        user = users.get(email, fresh=True)
+        if not user:
             return render_template("login.html", error="User not found")
 
-        user = doc.to_dict()
-        if not bcrypt.check_password_hash(user["password"], pw):
+        if not hasher.check(user.get("password"), pw):
             return render_template("login.html", error="Incorrect password")
 
+        # cost factor changed since this hash was made: upgrade it quietly
+        if hasher.needs_rehash(user["password"]):
+            hasher.rehash_later(
+                pw, lambda new_hash: users.update(email, {"password": new_hash})
+            )
+
         session["email"] = email
         session["name"] = user.get("name")
         session["photo"] = user.get("photo")
 
-        register_session(db, email, request)
+        session["sid"] = register_session(db, email, request)
 
         return redirect("/chat")
 
@@ -519,6 +602,9 @@ def login():
 
 @app.route("/logout")
 def logout():
+    sid = session.get("sid")
+    if sid:
+        session_registry.revoke(sid)
     session.clear()
     return redirect("/login")
 
@@ -531,8 +617,7 @@ def forgot_password():
     if request.method == "POST":
         email = request.form.get("email", "").strip().lower()
 
-        doc = users_col.document(email).get()
-        if not doc.exists:
+        if not users.exists(email):
             return render_template("forgot_password.html", error="Email not found")
 
         send_otp(email)
@@ -557,15 +642,16 @@ def reset_password():
                 "reset_password.html", error="Please fill all fields"
             )
 
-        if str(otp_storage.get(email)) != otp:
-            return render_template("reset_password.html", error="Incorrect OTP")
+        error = check_otp(email, otp)
+        if error:
+            return render_template("reset_password.html", error=error)
 
-        hashed = bcrypt.generate_password_hash(new_pw).decode("utf-8")
-        users_col.document(email).update({"password": hashed})
+        hashed = hasher.hash(new_pw)
+        users.update(email, {"password": hashed})
 
         send_password_changed_email(email)
 
-        otp_storage.pop(email, None)
+        otp_storage.delete(f"otp:{email}")
         session.pop("reset_email", None)
 
         return redirect("/login")
@@ -584,15 +670,21 @@ os.environ["OAUTHLIB_INSECURE_TRANSPORT"] = "1"  # dev only
 
 GOOGLE_REDIRECT_URI = "http://127.0.0.1:5000/login/callback"
 
-flow = Flow.from_client_secrets_file(
-    "client_secret.json",
-    scopes=[
-        "openid",
-        "https://www.googleapis.com/auth/userinfo.email",
-        "https://www.googleapis.com/auth/userinfo.profile"
-    ],
-    redirect_uri=GOOGLE_REDIRECT_URI,
-)
+def build_google_flow():
+    from google_auth_oauthlib.flow import Flow
+    return Flow.from_client_secrets_file(
+        "client_secret.json",
+        scopes=[
+            "openid",
+            "https://www.googleapis.com/auth/userinfo.email",
+            "https://www.googleapis.com/auth/userinfo.profile"
+        ],
+        redirect_uri=GOOGLE_REDIRECT_URI,
+    )
+
+
+# client_secret.json is read on the first Google sign-in, not at import
+flow = Lazy(build_google_flow)
 
 @app.route("/login/google")
 def login_google():
@@ -617,6 +709,9 @@ def connect_google():
 
 @app.route("/login/callback")
 def login_callback():
+    from google.oauth2 import id_token
+    import google.auth.transport.requests
+
     flow.fetch_token(authorization_response=request.url)
 
     credentials = flow.credentials
@@ -635,7 +730,7 @@ def login_callback():
     # 👉 If we are CONNECTING account (not logging in)
     if session.get("oauth_action") == "connect":
         # update existing user only
-        users_col.document(session["email"]).update({
+        users.update(session["email"], {
             "photo": photo,
             "name": name
         })
@@ -648,21 +743,23 @@ def login_callback():
         return redirect("/settings")   # redirect to settings page (YOU CAN CHANGE)
 
     # 👉 Normal Google login flow
-    doc = users_col.document(email).get()
-
-    if not doc.exists:
-        users_col.document(email).set({
-            "name": name,
-            "email": email,
-            "photo": photo,
-            "verified": True
-        })
+    if not users.exists(email):
+        try:
+            users.create(email, {
+                "name": name,
+                "email": email,
+                "photo": photo,
+                "verified": True
+            })
+            deleted_accounts.delete(f"deleted:{email}")
+        except UserExists:
+            pass  # created meanwhile, e.g. by a signup on another worker
 
     session["email"] = email
     session["name"] = name
     session["photo"] = photo
 
-    register_session(db, email, request)
+    session["sid"] = register_session(db, email, request)
 
     return redirect("/chat")
 # =========================
@@ -670,7 +767,7 @@ def login_callback():
 # =========================
 @app.route("/chat")
 def chat():
-    if "email" not in session:
+    if not session_user():
         return redirect("/login")
 
     cfg = os.getenv("FIREBASE_CLIENT_CONFIG")
@@ -679,21 +776,39 @@ def chat():
 
 @app.route("/api/history")
 def api_history():
-    email = session.get("email")
+    email = session_user()
     if not email:
         return jsonify([]), 401
 
-    docs = (
-    db.collection("messages")
-    .where("user", "==", email)
-    .order_by("ts", direction=firestore.Query.DESCENDING)
-    .limit(20)
-    .stream()
-)
+    convo = request.args.get("convo") or None
+    cursor = request.args.get("cursor") or None
+    limit = page_size(request.args.get("limit"))
+
+    # unchanged history: 304 without touching Firestore
+    etag = history_versions.etag(email, convo, cursor, limit)
+    if request.if_none_match.contains(etag):
+        resp = Response(status=304)
+        resp.set_etag(etag)
+        resp.headers["Cache-Control"] = "private, no-cache"
+        return resp
+
+    query = db.collection("messages").where("user", "==", email)
+    if convo:
+        query = query.where("convo", "==", convo)
+    query = query.order_by("ts", direction=DESCENDING)
+
+    after = decode_cursor(cursor)
+    if after:
+        query = query.start_after({"ts": after})
+
+    with FIRESTORE_SECONDS.time(op="history_page"):
+        docs = list(query.limit(limit).stream())
 
     out = []
+    last_ts = None
     for d in docs:
         x = d.to_dict()
+        last_ts = x.get("ts")
         out.append(
             {
                 "sender": x.get("sender"),
@@ -701,7 +816,103 @@ def api_history():
                 "convo": x.get("convo", "default"),
             }
         )
-    return jsonify(out)
+
+    next_cursor = encode_cursor(last_ts) if len(out) == limit and last_ts else None
+
+    resp = jsonify({"messages": out, "next_cursor": next_cursor})
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = "private, no-cache"
+    return resp
+
+@app.route("/api/conversations")
+def api_conversations():
+    email = session_user()
+    if not email:
+        return jsonify([]), 401
+
+    limit = page_size(request.args.get("limit"))
+    query = conversations_ref(db, email).order_by(
+        "last_ts", direction=DESCENDING
+    )
+
+    after = decode_cursor(request.args.get("cursor"))
+    if after:
+        query = query.start_after({"last_ts": after})
+
+    with FIRESTORE_SECONDS.time(op="conversation_page"):
+        docs = list(query.limit(limit).stream())
+
+    out = []
+    last_ts = None
+    for d in docs:
+        x = d.to_dict()
+        last_ts = x.get("last_ts")
+        out.append(
+            {
+                "convo": d.id,
+                "title": x.get("title", ""),
+                "preview": x.get("preview", ""),
+                "last_ts": last_ts.isoformat() if last_ts else None,
+                "message_count": x.get("message_count", 0),
+            }
+        )
+
+    next_cursor = encode_cursor(last_ts) if len(out) == limit and last_ts else None
+    return jsonify({"conversations": out, "next_cursor": next_cursor})
+
+@app.route("/admin/cache-stats")
+@admin_required
+def cache_stats():
+    return jsonify(retrieval_cache_stats())
+
+@app.route("/admin/fact-stats")
+@admin_required
+def fact_stats():
+    return jsonify(fact_engine.stats())
+
+@app.route("/admin/sink-stats")
+@admin_required
+def sink_stats():
+    return jsonify(message_sink.stats())
+
+@app.route("/admin/user-cache-stats")
+@admin_required
+def user_cache_stats():
+    return jsonify(users.stats())
+
+@app.route("/admin/hash-stats")
+@admin_required
+def hash_stats():
+    return jsonify(hasher.stats())
+
+@app.route("/metrics")
+def metrics():
+    # Prometheus scrape target, every worker on the host in one response
+    # (series labelled by worker pid). Needs a bearer token: without
+    # METRICS_TOKEN set it stays closed.
+    token = os.getenv("METRICS_TOKEN")
+    auth = request.headers.get("Authorization", "")
+    if not token or not secrets.compare_digest(auth.encode(), f"Bearer {token}".encode()):
+        abort(403)
+    return Response(worker_metrics.render(), mimetype="text/plain; version=0.0.4")
+
+@app.route("/admin/response-cache-stats")
+@admin_required
+def response_cache_stats():
+    return jsonify(response_cache.stats())
+
+@app.route("/admin/replay-stats")
+@admin_required
+def replay_stats():
+    return jsonify(replay_buffer.stats())
+
+@app.route("/admin/admission-stats")
+@admin_required
+def admission_stats():
+    return jsonify({
+        "governor": llm_governor.stats(),
+        "stream_rate_limited": stream_buckets.rejected,
+    })
 
 @app.route("/settings/update-name", methods=["POST"])
 @login_required
@@ -712,7 +923,7 @@ def update_name():
     if len(new_name) < 2:
         return jsonify({"error": "Invalid name"}), 400
 
-    db.collection("users").document(email).update({"name": new_name})
+    users.update(email, {"name": new_name})
     session["name"] = new_name
 
     return jsonify({"success": True})
@@ -753,8 +964,8 @@ def change_password():
     if len(pwd) < 8:
         return jsonify({"error": "Weak password"}), 400
 
-    hashed = bcrypt.generate_password_hash(pwd).decode("utf-8")
-    db.collection("users").document(email).update({"password": hashed})
+    hashed = hasher.hash(pwd)
+    users.update(email, {"password": hashed})
 
     send_password_changed_email(email)
 
@@ -772,9 +983,12 @@ def list_sessions():
         .stream()
     )
 
+    current_sid = session.get("sid")
     sessions = []
     for d in docs:
-        sessions.append(d.to_dict())
+        x = d.to_dict()
+        x["current"] = d.id == current_sid
+        sessions.append(x)
 
     return jsonify(sessions)
 
@@ -782,85 +996,251 @@ def list_sessions():
 @login_required
 def logout_others():
     email = session["email"]
-    current_ip = request.remote_addr
 
-    docs = (
-        db.collection("sessions")
-        .where("user_id", "==", email)
-        .stream()
-    )
-
-    for d in docs:
-        data = d.to_dict()
-        if data.get("ip") != current_ip:
-            d.reference.update({"active": False})
+    # by session id, not IP: two devices on one network are still two sessions
+    revoked = session_registry.revoke_user(email, keep_sid=session.get("sid"))
 
-    return jsonify({"success": True})
+    return jsonify({"success": True, "revoked": revoked})
 
 @app.route("/settings/theme", methods=["POST"])
 @login_required
 def save_theme():
     theme = request.json.get("theme", "dark")
 
-    db.collection("users").document(session["email"]).update({
-    "theme": theme
-})
+    users.update(session["email"], {"theme": theme})
     return jsonify({"success": True})
 
 @app.route("/settings/export-chat", methods=["POST"])
 @login_required
 def export_chat():
-    email = request.json.get("email")
+    body = request.json or {}
+    email = body.get("email") or session["email"]
+    fmt = EXPORT_FORMATS.get(body.get("format", "jsonl"))
+    if not fmt:
+        return jsonify({"error": "Unsupported format"}), 400
 
     token = secrets.token_urlsafe(32)
-    create_chat_export_file(session["email"], token)
+    job_id = jobs.submit(
+        "export", session["email"], run_chat_export,
+        session["email"], token, fmt, email,
+        format=fmt,
+    )
+    return jsonify({"success": True, "job": job_id})
 
-    send_download_email(email, token)
-    return jsonify({"success": True})
+@app.route("/settings/jobs/<job_id>")
+@login_required
+def job_status(job_id):
+    status = jobs.status(job_id)
+    if not status or status.get("user") != session["email"]:
+        abort(404)
+    status.pop("user", None)
+    return jsonify(status)
 
 @app.route("/download/chat/<token>")
 def download_chat(token):
-    path = f"/exports/{token}.txt"
-    if not os.path.exists(path):
+    path = find_export(token)
+    if not path:
         abort(404)
-    return send_file(path, as_attachment=True)
+    # conditional=True: streamed in chunks, with Range / If-Range support
+    return send_file(
+        path,
+        mimetype="application/gzip",
+        as_attachment=True,
+        conditional=True,
+    )
 
 @app.route("/settings/delete-account", methods=["POST"])
 @login_required
 def delete_account():
     email = session["email"]
 
-    # delete user
-    db.collection("users").document(email).delete()
+    # delete user first: the account can no longer log in
+    users.delete(email)
+    db.collection("known_devices").document(email).delete()
+    session_registry.revoke_user(email)
+    # and nothing, not even a reply still streaming, writes for it again
+    deleted_accounts.set(f"deleted:{email}", {"at": time.time()}, ACCOUNT_TOMBSTONE_TTL)
 
-    # delete sessions
-    docs = db.collection("sessions").where("user_id", "==", email).stream()
-    for d in docs:
-        d.reference.delete()
+    conversations.forget_user(email)
+    history_versions.forget_user(email)
 
-    # delete messages
-    msgs = db.collection("messages").where("user", "==", email).stream()
-    for m in msgs:
-        m.reference.delete()
+    # sessions, messages and the conversation index go in the background
+    job_id = jobs.submit("delete_account", email, run_account_deletion, email)
 
     session.clear()
-    return jsonify({"success": True})
+    return jsonify({
+        "success": True,
+        "job": job_id,
+        "progress_url": f"/account/deletion/{job_id}",
+    })
+
+@app.route("/account/deletion/<job_id>")
+def account_deletion_status(job_id):
+    # the unguessable job id is the capability: the user is logged out
+    status = jobs.status(job_id)
+    if not status or status.get("kind") != "delete_account":
+        abort(404)
+    return jsonify({k: status.get(k) for k in ("status", "progress", "error")})
+
+def run_account_deletion(job, email):
+    # anything queued for this user before the tombstone must land first
+    message_sink.barrier()
+
+    counts = {}
+    targets = (
+        ("sessions", db.collection("sessions").where("user_id", "==", email)),
+        ("messages", messages_col.where("user", "==", email)),
+        ("conversations", conversations_ref(db, email)),
+    )
+    for name, query in targets:
+        def progress(n, name=name):
+            job.update(progress={**counts, name: n})
+        counts[name] = delete_query(db, query, progress)
+
+    # a save that read the tombstone just before it was set can still
+    # have been queued meanwhile: wait for it and sweep once more
+    message_sink.barrier()
+    for name, query in targets[1:]:
+        counts[name] += delete_query(db, query)
+
+    return {"progress": counts}
+
 # =========================
-# STREAMING: GROQ ONLY
+# STARTUP
 # =========================
-def groq_stream(text: str, full_reply_holder: list):
-    if not groq_client:
-        print("Groq client not configured")
+_started_pid = None
+
+
+def start_background_work():
+    """
+    Per-process startup: runs once in each worker (from gunicorn's
+    post_fork, or on the first request), never in a preloading master.
+    """
+    global _started_pid
+    if _started_pid == os.getpid():
         return
+    _started_pid = os.getpid()
+
+    worker_metrics.start()
+
+    # pick up deletions whose worker died, now and whenever one's lease lapses
+    jobs.resume("delete_account", run_account_deletion, lambda state: (state["user"],))
+
+
+@app.before_request
+def ensure_background_work():
+    start_background_work()
+
+
+def preload_heavy_imports():
+    # fork-safe imports only: no client, channel or thread is created
+    import groq  # noqa: F401
+    import requests  # noqa: F401
+    import feedparser  # noqa: F401
+    import duckduckgo_search  # noqa: F401
+    import google_auth_oauthlib.flow  # noqa: F401
+    import google.oauth2.id_token  # noqa: F401
+    from firebase_admin import firestore  # noqa: F401
+
+
+def create_app(preload: bool = False) -> Flask:
+    """
+    Application factory.
+
+        gunicorn 'app:create_app()'                 # lazy, fastest boot
+        gunicorn -c gunicorn.conf.py                # preloaded master
 
-    verified_context = get_verified_context(text)
+    With `preload`, the master imports the heavy libraries and compiles
+    every template once; forked workers share those pages copy-on-write
+    and still open their own Firestore/Groq connections on first use.
+    """
+    check_service_account()
+
+    if preload:
+        preload_heavy_imports()
+        # mapped once in the master, the table's pages are shared by workers
+        offline_table()
+        for name in app.jinja_env.list_templates():
+            app.jinja_env.get_template(name)
+    return app
+
+# =========================
+# STREAMING: GROQ ONLY
+# =========================
+def build_chat_messages(text: str, history: list | None = None, live: dict | None = None) -> list:
+    # one concurrent retrieval stage feeds both the guard and the question
+    if live is None:
+        live = retrieve_context(text)
+    verified_context = live.get("verified", "")
     guard_prompt = hallucination_guard(text, verified_context)
 
-    messages = [
+    return [
         {"role": "system", "content": guard_prompt},
-        {"role": "user", "content": text},
+        *(history or []),
+        {"role": "user", "content": inject_wikipedia_context(text, live)},
     ]
 
+
+def save_message(email: str, sender: str, text: str, convo: str):
+    # a reply still streaming when its account was deleted is not kept
+    if deleted_accounts.get(f"deleted:{email}"):
+        return
+
+    ts = datetime.utcnow()
+    first = conversations.is_new(email, convo)
+
+    message_sink.put({
+        "user": email,
+        "sender": sender,
+        "text": text,
+        "convo": convo,
+        "ts": ts,
+    })
+    # sidebar index entry rides in the same batch
+    message_sink.put(
+        index_update(text, ts, first),
+        ref=conversations_ref(db, email).document(convo),
+    )
+    conversations.record(email, convo, sender, text)
+
+
+def prepare_chat(text: str, history: list | None = None,
+                 user: str | None = None) -> tuple[list, str]:
+    """
+    -> (messages for Groq, response cache scope)
+    """
+    live = retrieve_context(text)
+    messages = build_chat_messages(text, history, live)
+    return messages, context_scope(GROQ_MODEL, live, history, user)
+
+
+def sse_retry(e: UpstreamBusy) -> str:
+    return f"event: retry\ndata: {json.dumps({'retry_after': e.retry_after, 'reason': e.reason})}\n\n"
+
+
+def groq_stream(text: str, full_reply_holder: list, history: list | None = None,
+                user: str | None = None):
+    if not groq_client:
+        print("Groq client not configured")
+        return
+
+    from groq import RateLimitError
+
+    with STAGE_SECONDS.time(stage="prepare"):
+        messages, scope = prepare_chat(text, history, user)
+
+    cached = response_cache.get(text, scope)
+    if cached:
+        STREAMS.inc(source="cache")
+        full_reply_holder[0] = cached
+        yield cached
+        return
+
+    # global cap on in-flight Groq calls, shared fairly between users
+    if not llm_governor.acquire(user or "anonymous"):
+        raise UpstreamBusy(2.0, "busy")
+
+    meter = TokenMeter()
     try:
         completion = groq_client.chat.completions.create(
             model=GROQ_MODEL,
@@ -871,60 +1251,125 @@ def groq_stream(text: str, full_reply_holder: list):
         for chunk in completion:
             delta = chunk.choices[0].delta
             if delta and delta.content:
+                meter.token()
                 full_reply_holder[0] += delta.content
                 yield delta.content   # ✅ THIS WAS MISSING
 
+        meter.finish()
+        STREAMS.inc(source="llm")
+
+        # only complete answers are cached
+        response_cache.set(
+            text, scope, full_reply_holder[0],
+            ttl=response_cache.ttl_for(classify_intents(text)),
+        )
+
+    except RateLimitError as e:
+        print("Groq rate limited:", e)
+        if not full_reply_holder[0]:
+            raise UpstreamBusy(retry_after_from(e), "rate_limited")
     except Exception as e:
         print("Groq stream error:", e)
+        STREAMS.inc(source="error")
         return
-    
+    finally:
+        llm_governor.release()
+
+
 @app.route("/stream", methods=["POST"])
 def stream_reply():
-    email = session.get("email")
+    email = session_user()
     if not email:
         return "Unauthorized", 401
 
-    body = request.json or {}
-    text = body.get("message", "")
-    convo = body.get("convo", "default")
+    # a dropped connection coming back: replay from the reply's buffer,
+    # the producer never stopped
+    last_event_id = request.headers.get("Last-Event-ID")
+    if last_event_id:
+        try:
+            log, after = replay_buffer.resume(email, last_event_id)
+        except StreamGone:
+            return jsonify({"error": "stream_gone"}), 410
+        return stream_response(log, after)
+
+    allowed, retry_after = stream_buckets.allow(email)
+    if not allowed:
+        return (
+            jsonify({"error": "rate_limited", "retry_after": round(retry_after, 1)}),
+            429,
+            {"Retry-After": str(math.ceil(retry_after))},
+        )
 
-    # 🔥 WIKIPEDIA CONTEXT (ADD HERE)
-    final_text =text
+    # every reply holds a producer thread until it finishes; the reply is
+    # produced on its own thread into a replay buffer, so it finishes
+    # (and is saved) even if this connection drops
+    log = replay_buffer.start(email)
+    if log is None:
+        return jsonify({"error": "busy", "retry_after": 2}), 503, {"Retry-After": "2"}
 
-    messages_col.add({
-        "user": email,
-        "sender": "user",
-        "text": text,              # original text saved
-        "convo": convo,
-        "ts": datetime.utcnow(),
-    })
+    try:
+        body = request.json or {}
+        text = body.get("message", "")
+        convo = body.get("convo", "default")
+
+        # 🔥 WIKIPEDIA CONTEXT (ADD HERE)
+        final_text =text
+
+        # earlier turns, read before this message joins the window
+        with STAGE_SECONDS.time(stage="history"):
+            history = conversations.context(email, convo)
 
-    def generate():
+        with STAGE_SECONDS.time(stage="save"):
+            save_message(email, "user", text, convo)  # original text saved
+
+        # 📚 verified fact tables answer without touching the LLM
+        fact_answer = fact_engine.answer(text)
+    except BaseException:
+        # no producer will run: free the slot
+        log.close()
+        raise
+
+    def produce():
         full_reply = [""]
 
         try:
-            for chunk in groq_stream(final_text, full_reply):  # AI uses enriched text
-                yield f"data: {json.dumps({'chunk': chunk})}\n\n"
+            if fact_answer:
+                STREAMS.inc(source="fact")
+                full_reply[0] = fact_answer
+                log.append(chunk_frame(fact_answer))
+            else:
+                # token deltas merged into fewer, pre-encoded frames
+                coalesce_into(groq_stream(final_text, full_reply, history, email), log.append)  # AI uses enriched text
+        except UpstreamBusy as e:
+            # tell the client when to retry instead of ending silently
+            STREAMS.inc(source="busy")
+            log.append(sse_retry(e).encode("utf-8"))
+            return
         except Exception as e:
+            print("Stream producer error:", e)
+            STREAMS.inc(source="error")
             err = "⚠️ AI backend error"
-            yield f"data: {json.dumps({'chunk': err})}\n\n"
+            log.append(chunk_frame(err))
             return
+        finally:
+            log.close()
 
-        messages_col.add({
-            "user": email,
-            "sender": "bot",
-            "text": full_reply[0],
-            "convo": convo,
-            "ts": datetime.utcnow(),
-        })
+        save_message(email, "bot", full_reply[0], convo)
+
+    threading.Thread(target=produce, name=f"stream-{log.id}", daemon=True).start()
+    return stream_response(log, 0)
 
-    return Response(generate(), mimetype="text/event-stream")
+def stream_response(log, after: int):
+    return Response(
+        count_sse(follow(log, after)),
+        mimetype="text/event-stream",
+        headers={"X-Stream-Id": log.id, "Cache-Control": "no-cache"},
+    )
 
-def create_chat_export_file(user_email, token):
-    os.makedirs("exports", exist_ok=True)
-    path = f"exports/{token}.txt"
-    with open(path, "w") as f:
-        f.write("Chat export coming soon.")
+def run_chat_export(job, user_email, token, fmt, notify_email):
+    result = write_export(job, messages_col, user_email, token, fmt)
+    send_download_email(notify_email, token)
+    return {**result, "download": f"/download/chat/{token}"}
 
 def send_download_email(email, token):
     print("Download link sent to", email)
@@ -935,4 +1380,4 @@ def send_verification_email(email, token):
 # MAIN RUN
 # =========================
 if __name__ == "__main__":
-    app.run(debug=True)
\ No newline at end of file
+    create_app().run(debug=True)
\ No newline at end of file
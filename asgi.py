@@ -0,0 +1,291 @@
+# asgi.py
+"""
+Async serving mode.
+
+    uvicorn asgi:application --workers 1
+
+POST /stream is handled natively on the event loop with the async Groq
+client, so an open chat stream costs a coroutine instead of a worker
+thread. Every other route is the unchanged Flask app, run through a2wsgi
+on its thread pool. `gunicorn app:app` keeps working as the sync mode.
+"""
+import asyncio
+import json
+import math
+from http.cookies import SimpleCookie
+
+from a2wsgi import WSGIMiddleware
+
+from app import (
+    create_app,
+    GROQ_API_KEY,
+    GROQ_MODEL,
+    prepare_chat,
+    save_message,
+    fact_engine,
+    conversations,
+    session_registry,
+    sse_retry,
+)
+from utils.intents import classify_intents
+from utils.lazy import Lazy
+from utils.sse import chunk_frame, coalesce_async
+from utils.replay import replay_buffer, follow_async, StreamGone
+from utils.response_cache import response_cache
+from utils.metrics import STAGE_SECONDS, STREAMS, SSE_BYTES, TokenMeter
+from utils.admission import stream_buckets, llm_governor, UpstreamBusy, retry_after_from
+
+
+
+def connect_async_groq():
+    from groq import AsyncGroq
+    return AsyncGroq(api_key=GROQ_API_KEY)
+
+
+async_groq_client = Lazy(connect_async_groq) if GROQ_API_KEY else None
+
+# running reply producers; the loop only keeps weak references to tasks
+_producers = set()
+
+app = create_app()
+flask_asgi = WSGIMiddleware(app)
+
+
+def header(scope, name: bytes) -> str:
+    for key, value in scope.get("headers", []):
+        if key == name:
+            return value.decode("latin-1")
+    return ""
+
+
+def load_session(scope) -> dict | None:
+    # decode the same signed cookie Flask issued at login
+    cookie = SimpleCookie()
+    cookie.load(header(scope, b"cookie"))
+    morsel = cookie.get(app.config.get("SESSION_COOKIE_NAME", "session"))
+    if not morsel:
+        return None
+
+    serializer = app.session_interface.get_signing_serializer(app)
+    if serializer is None:
+        return None
+    try:
+        data = serializer.loads(
+            morsel.value,
+            max_age=int(app.permanent_session_lifetime.total_seconds()),
+        )
+    except Exception:
+        return None
+    return data
+
+
+def session_email(session: dict | None) -> str | None:
+    if not session or not session.get("email"):
+        return None
+    # no sid: issued before sessions could be revoked, so not trusted
+    sid = session.get("sid")
+    if not sid or not session_registry.is_active(sid):
+        return None
+    return session["email"]
+
+
+async def read_body(receive) -> bytes:
+    body = b""
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            break
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            break
+    return body
+
+
+async def groq_stream_async(text: str, full_reply_holder: list, history: list | None = None,
+                            user: str | None = None):
+    if not async_groq_client:
+        print("Groq client not configured")
+        return
+
+    from groq import RateLimitError
+
+    # retrieval libraries are blocking; they get a pool thread only for
+    # the retrieval stage, never for the lifetime of the stream
+    with STAGE_SECONDS.time(stage="prepare"):
+        messages, scope = await asyncio.to_thread(prepare_chat, text, history, user)
+
+    cached = response_cache.get(text, scope)
+    if cached:
+        STREAMS.inc(source="cache")
+        full_reply_holder[0] = cached
+        yield cached
+        return
+
+    # same governor as the sync path; waiting for a slot parks a future,
+    # neither the event loop nor a pool thread
+    if not await llm_governor.acquire_async(user or "anonymous"):
+        raise UpstreamBusy(2.0, "busy")
+
+    meter = TokenMeter()
+    try:
+        completion = await async_groq_client.chat.completions.create(
+            model=GROQ_MODEL,
+            messages=messages,
+            stream=True,
+        )
+
+        async for chunk in completion:
+            delta = chunk.choices[0].delta
+            if delta and delta.content:
+                meter.token()
+                full_reply_holder[0] += delta.content
+                yield delta.content
+
+        meter.finish()
+        STREAMS.inc(source="llm")
+        response_cache.set(
+            text, scope, full_reply_holder[0],
+            ttl=response_cache.ttl_for(classify_intents(text)),
+        )
+
+    except RateLimitError as e:
+        print("Groq rate limited:", e)
+        if not full_reply_holder[0]:
+            raise UpstreamBusy(retry_after_from(e), "rate_limited")
+    except Exception as e:
+        print("Groq stream error:", e)
+        STREAMS.inc(source="error")
+        return
+    finally:
+        llm_governor.release()
+
+
+async def stream_reply_async(scope, receive, send):
+    email = await asyncio.to_thread(session_email, load_session(scope))
+    if not email:
+        await send({
+            "type": "http.response.start",
+            "status": 401,
+            "headers": [(b"content-type", b"text/plain; charset=utf-8")],
+        })
+        await send({"type": "http.response.body", "body": b"Unauthorized"})
+        return
+
+    # a dropped connection coming back: replay from the reply's buffer
+    last_event_id = header(scope, b"last-event-id")
+    if last_event_id:
+        try:
+            # may read the shared store: keep it off the loop
+            log, after = await asyncio.to_thread(replay_buffer.resume, email, last_event_id)
+        except StreamGone:
+            await send({
+                "type": "http.response.start",
+                "status": 410,
+                "headers": [(b"content-type", b"application/json")],
+            })
+            await send({"type": "http.response.body", "body": b'{"error": "stream_gone"}'})
+            return
+        await send_stream(send, log, after)
+        return
+
+    allowed, retry_after = stream_buckets.allow(email)
+    if not allowed:
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"retry-after", str(math.ceil(retry_after)).encode()),
+            ],
+        })
+        payload = {"error": "rate_limited", "retry_after": round(retry_after, 1)}
+        await send({"type": "http.response.body", "body": json.dumps(payload).encode()})
+        return
+
+    log = replay_buffer.start(email)
+    if log is None:
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [(b"content-type", b"application/json"), (b"retry-after", b"2")],
+        })
+        await send({"type": "http.response.body", "body": b'{"error": "busy", "retry_after": 2}'})
+        return
+
+    try:
+        try:
+            body = json.loads(await read_body(receive) or b"{}")
+        except ValueError:
+            body = {}
+        text = body.get("message", "")
+        convo = body.get("convo", "default")
+
+        with STAGE_SECONDS.time(stage="history"):
+            history = await asyncio.to_thread(conversations.context, email, convo)
+        with STAGE_SECONDS.time(stage="save"):
+            await asyncio.to_thread(save_message, email, "user", text, convo)
+
+        fact_answer = fact_engine.answer(text)
+    except BaseException:
+        # no producer will run: free the slot
+        log.close()
+        raise
+
+    async def produce():
+        full_reply = [""]
+        try:
+            if fact_answer:
+                STREAMS.inc(source="fact")
+                full_reply[0] = fact_answer
+                log.append(chunk_frame(fact_answer))
+            else:
+                async for data in coalesce_async(groq_stream_async(text, full_reply, history, email)):
+                    log.append(data)
+        except UpstreamBusy as e:
+            STREAMS.inc(source="busy")
+            log.append(sse_retry(e).encode("utf-8"))
+            return
+        except Exception as e:
+            print("Async stream error:", e)
+            STREAMS.inc(source="error")
+            log.append(chunk_frame("⚠️ AI backend error"))
+            return
+        finally:
+            log.close()
+
+        await asyncio.to_thread(save_message, email, "bot", full_reply[0], convo)
+
+    # runs to the end (and saves the reply) even if this client leaves
+    task = asyncio.ensure_future(produce())
+    _producers.add(task)
+    task.add_done_callback(_producers.discard)
+
+    await send_stream(send, log, 0)
+
+
+async def send_stream(send, log, after: int):
+    await send({
+        "type": "http.response.start",
+        "status": 200,
+        "headers": [
+            (b"content-type", b"text/event-stream; charset=utf-8"),
+            (b"cache-control", b"no-cache"),
+            (b"x-stream-id", log.id.encode()),
+        ],
+    })
+    async for data in follow_async(log, after):
+        SSE_BYTES.inc(len(data))
+        await send({"type": "http.response.body", "body": data, "more_body": True})
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def application(scope, receive, send):
+    if (
+        scope["type"] == "http"
+        and scope["path"] == "/stream"
+        and scope["method"] == "POST"
+    ):
+        await stream_reply_async(scope, receive, send)
+        return
+
+    await flask_asgi(scope, receive, send)
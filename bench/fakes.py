@@ -0,0 +1,398 @@
+# bench/fakes.py
+"""
+Local stand-ins for the app's remote services, for benchmarks:
+
+- FakeFirestore: in-memory implementation of the Firestore API subset
+  the app uses (collections, subcollections, where/order_by/start_after/
+  limit/select queries, batches, Increment/ArrayUnion), with optional
+  per-call latency to mimic the network.
+- FakeGroq: OpenAI-compatible streaming endpoint that emits tokens at a
+  fixed rate; point the Groq SDK at it with GROQ_BASE_URL.
+- canned_lookup: retrieval helper returning fixed text after a delay.
+
+The SMTP stand-in lives in bench/smtp_sink.py.
+"""
+import copy
+import itertools
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# =========================
+# FIRESTORE
+# =========================
+def _apply(current: dict, fields: dict) -> dict:
+    out = dict(current)
+    for key, value in fields.items():
+        kind = type(value).__name__
+        if kind == "Increment":
+            out[key] = out.get(key, 0) + value.value
+        elif kind == "ArrayUnion":
+            existing = list(out.get(key) or [])
+            out[key] = existing + [v for v in value.values if v not in existing]
+        elif kind == "ArrayRemove":
+            out[key] = [v for v in out.get(key) or [] if v not in value.values]
+        elif kind == "Sentinel" and "DELETE" in repr(value).upper():
+            out.pop(key, None)
+        else:
+            out[key] = copy.deepcopy(value)
+    return out
+
+
+class FakeSnapshot:
+    def __init__(self, ref, data, fields=None):
+        self.reference = ref
+        self.id = ref.id
+        self._data = data
+        self._fields = fields
+
+    @property
+    def exists(self) -> bool:
+        return self._data is not None
+
+    def to_dict(self):
+        if self._data is None:
+            return None
+        data = copy.deepcopy(self._data)
+        if self._fields is not None:
+            data = {k: v for k, v in data.items() if k in self._fields}
+        return data
+
+    def get(self, field):
+        return (self._data or {}).get(field)
+
+
+class FakeDocument:
+    def __init__(self, db, path: str):
+        self._db = db
+        self.path = path
+        self.id = path.rsplit("/", 1)[-1]
+
+    def collection(self, name: str):
+        return FakeCollection(self._db, f"{self.path}/{name}")
+
+    def get(self, transaction=None):
+        self._db.pause()
+        with self._db.lock:
+            data = self._db.docs.get(self.path)
+        return FakeSnapshot(self, data)
+
+    def _set(self, data: dict, merge: bool = False):
+        current = self._db.docs.get(self.path) if merge else None
+        self._db.docs[self.path] = _apply(current or {}, data)
+
+    def _update(self, fields: dict):
+        if self.path not in self._db.docs:
+            raise KeyError(f"No document to update: {self.path}")
+        self._db.docs[self.path] = _apply(self._db.docs[self.path], fields)
+
+    def set(self, data: dict, merge: bool = False):
+        self._db.pause()
+        with self._db.lock:
+            self._set(data, merge)
+
+    def create(self, data: dict):
+        self._db.pause()
+        with self._db.lock:
+            if self.path in self._db.docs:
+                from google.api_core.exceptions import AlreadyExists
+                raise AlreadyExists(f"Document already exists: {self.path}")
+            self._set(data)
+
+    def update(self, fields: dict):
+        self._db.pause()
+        with self._db.lock:
+            self._update(fields)
+
+    def delete(self):
+        self._db.pause()
+        with self._db.lock:
+            self._db.docs.pop(self.path, None)
+
+
+class FakeQuery:
+    _OPS = {
+        "==": lambda a, b: a == b,
+        "!=": lambda a, b: a != b,
+        "<": lambda a, b: a < b,
+        "<=": lambda a, b: a <= b,
+        ">": lambda a, b: a > b,
+        ">=": lambda a, b: a >= b,
+        "in": lambda a, b: a in b,
+        "not-in": lambda a, b: a not in b,
+        "array_contains": lambda a, b: b in (a or []),
+    }
+
+    def __init__(self, db, path, filters=(), orders=(), limit_n=None, after=None, fields=None):
+        self._db = db
+        self._path = path
+        self._filters = tuple(filters)
+        self._orders = tuple(orders)
+        self._limit = limit_n
+        self._after = after
+        self._fields = fields
+
+    def _copy(self, **changes):
+        state = {
+            "filters": self._filters,
+            "orders": self._orders,
+            "limit_n": self._limit,
+            "after": self._after,
+            "fields": self._fields,
+        }
+        state.update(changes)
+        return FakeQuery(self._db, self._path, **state)
+
+    def where(self, field=None, op=None, value=None, filter=None):
+        if filter is not None:
+            field, op, value = filter.field_path, filter.op_string, filter.value
+        return self._copy(filters=self._filters + ((field, op, value),))
+
+    def order_by(self, field, direction="ASCENDING"):
+        return self._copy(orders=self._orders + ((field, str(direction).upper().endswith("DESCENDING")),))
+
+    def limit(self, n: int):
+        return self._copy(limit_n=n)
+
+    def start_after(self, values):
+        if isinstance(values, FakeSnapshot):
+            values = dict(values._data or {}, __name__=values.id)
+        return self._copy(after=values)
+
+    def select(self, fields):
+        return self._copy(fields=set(fields))
+
+    def _matches(self, data: dict) -> bool:
+        for field, op, value in self._filters:
+            if field not in data or not self._OPS[op](data[field], value):
+                return False
+        # order_by also drops documents without the field
+        return all(field in data for field, _ in self._orders)
+
+    def _past(self, path: str, data: dict) -> bool:
+        # strictly beyond the start_after cursor, in query order
+        for field, desc in self._orders:
+            a, b = data.get(field), self._after.get(field)
+            if a != b:
+                return (a < b) if desc else (a > b)
+        name = self._after.get("__name__")
+        return name is not None and path.rsplit("/", 1)[-1] > name
+
+    def stream(self):
+        self._db.pause()
+        prefix = self._path + "/"
+        with self._db.lock:
+            rows = [
+                (path, copy.deepcopy(data)) for path, data in self._db.docs.items()
+                if path.startswith(prefix) and "/" not in path[len(prefix):] and self._matches(data)
+            ]
+
+        # by each order_by field, ties broken by document name
+        rows.sort(key=lambda r: r[0])
+        for field, desc in reversed(self._orders):
+            rows.sort(key=lambda r: r[1][field], reverse=desc)
+
+        if self._after is not None:
+            rows = [(path, data) for path, data in rows if self._past(path, data)]
+        if self._limit is not None:
+            rows = rows[:self._limit]
+
+        for path, data in rows:
+            yield FakeSnapshot(FakeDocument(self._db, path), data, self._fields)
+
+    def get(self):
+        return list(self.stream())
+
+
+class FakeCollection(FakeQuery):
+    def __init__(self, db, path: str):
+        super().__init__(db, path)
+        self.id = path.rsplit("/", 1)[-1]
+
+    def document(self, doc_id: str | None = None):
+        return FakeDocument(self._db, f"{self._path}/{doc_id or uuid.uuid4().hex[:20]}")
+
+    def add(self, data: dict):
+        ref = self.document()
+        ref.set(data)
+        return time.time(), ref
+
+
+class FakeBatch:
+    def __init__(self, db):
+        self._db = db
+        self._ops = []
+
+    def set(self, ref, data, merge=False):
+        self._ops.append(lambda: ref._set(data, merge))
+
+    def update(self, ref, fields):
+        self._ops.append(lambda: ref._update(fields))
+
+    def delete(self, ref):
+        self._ops.append(lambda: self._db.docs.pop(ref.path, None))
+
+    def commit(self):
+        self._db.pause()
+        with self._db.lock:
+            for op in self._ops:
+                op()
+        self._ops = []
+
+
+class FakeTransaction:
+    def __init__(self, db):
+        self._db = db
+        self._ops = []
+
+    def set(self, ref, data, merge=False):
+        self._ops.append(lambda: ref._set(data, merge))
+
+    def update(self, ref, fields):
+        self._ops.append(lambda: ref._update(fields))
+
+
+def transactional(fn):
+    """
+    Stand-in for firestore.transactional: the whole function runs under
+    the store lock, like a transaction that won on its first attempt.
+    """
+    def run(transaction, *args, **kwargs):
+        db = transaction._db
+        with db.lock:
+            result = fn(transaction, *args, **kwargs)
+            db.pause()
+            for op in transaction._ops:
+                op()
+            transaction._ops = []
+        return result
+    return run
+
+
+class FakeFirestore:
+    """
+    Drop-in for `firestore.client()`. Every call that would be a network
+    round trip sleeps `latency` seconds first.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.docs = {}  # "users/a@b.c" -> dict
+        self.lock = threading.RLock()
+        self.calls = itertools.count()
+
+    def pause(self):
+        next(self.calls)
+        if self.latency:
+            time.sleep(self.latency)
+
+    def collection(self, name: str):
+        return FakeCollection(self, name)
+
+    def batch(self):
+        return FakeBatch(self)
+
+    def transaction(self):
+        return FakeTransaction(self)
+
+
+def install_firebase(db: FakeFirestore):
+    """
+    Make firebase_admin hand out `db` instead of connecting. Call before
+    importing app.
+    """
+    import firebase_admin
+    from firebase_admin import credentials, firestore
+
+    credentials.Certificate = lambda *a, **k: None
+    firebase_admin.initialize_app = lambda *a, **k: None
+    firestore.client = lambda *a, **k: db
+    firestore.transactional = transactional
+
+
+# =========================
+# GROQ
+# =========================
+class FakeGroq(ThreadingHTTPServer):
+    """
+    Answers every POST with `tokens` streamed chat.completion.chunk
+    events, `rate` per second, then [DONE].
+    """
+
+    daemon_threads = True
+
+    def __init__(self, port: int = 0, tokens: int = 100, rate: float = 20.0):
+        super().__init__(("127.0.0.1", port), _GroqHandler)
+        self.tokens = tokens
+        self.delay = 1.0 / rate if rate > 0 else 0
+        self.requests = 0
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+class _GroqHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        self.rfile.read(length)
+        self.server.requests += 1
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+
+        for i in range(self.server.tokens):
+            chunk = {
+                "id": "bench",
+                "object": "chat.completion.chunk",
+                "created": 0,
+                "model": "fake",
+                "choices": [
+                    {"index": 0, "delta": {"content": f"tok{i} "}, "finish_reason": None}
+                ],
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.flush()
+            time.sleep(self.server.delay)
+
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+# =========================
+# RETRIEVAL
+# =========================
+CANNED = {
+    "wikipedia": (
+        "Python is a high-level, general-purpose programming language. "
+        "Python was created by Guido van Rossum and first released in 1991."
+    ),
+    "news": "- Python 3.14 released (Tue, 07 Oct 2025)\n  https://example.com/python-3-14",
+    "search": "- Python.org\n  The official home of the Python programming language.",
+}
+
+
+def canned_lookup(source: str, latency: float = 0.0):
+    text = CANNED[source]
+
+    def lookup(query: str) -> str:
+        if latency:
+            time.sleep(latency)
+        return text
+
+    lookup.__name__ = f"canned_{source}"
+    return lookup
@@ -0,0 +1,95 @@
+# bench/import_time.py
+"""
+Cold-start budget: how long `import app` takes in a fresh interpreter,
+broken down by top-level package from `python -X importtime`.
+
+    python bench/import_time.py                    # top 15 packages
+    python bench/import_time.py --budget-ms 400    # exit 1 when over
+    python bench/import_time.py --module asgi --top 25 --json out.json
+
+Nothing heavy (Firebase, Groq, Wikipedia, Google auth) should show up
+here any more; those load on first use or in a preloading master.
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# "import time:       123 |       4567 |   package.module"
+_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s+)(\S+)")
+
+
+def measure(module: str) -> tuple[float, list]:
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+    )
+    wall_ms = (time.perf_counter() - start) * 1000
+    if proc.returncode != 0:
+        sys.stderr.write(proc.stderr[-2000:])
+        raise SystemExit(f"import {module} failed")
+
+    rows = []
+    for line in proc.stderr.splitlines():
+        m = _LINE.match(line)
+        if m:
+            self_us, cumulative_us, indent, name = m.groups()
+            rows.append((len(indent), name, int(self_us), int(cumulative_us)))
+    return wall_ms, rows
+
+
+def by_package(rows: list) -> dict:
+    """
+    Self time summed per top-level package, so nested imports are
+    charged to whoever owns them (firebase_admin, google, grpc, ...).
+    """
+    totals = {}
+    for _, name, self_us, _ in rows:
+        top = name.split(".", 1)[0]
+        totals[top] = totals.get(top, 0) + self_us
+    return totals
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--module", default="app")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--budget-ms", type=float, help="fail if `import` exceeds this")
+    parser.add_argument("--json", help="also write the breakdown here")
+    args = parser.parse_args(argv)
+
+    wall_ms, rows = measure(args.module)
+    target = next((r for r in rows if r[1] == args.module), None)
+    import_ms = target[3] / 1000 if target else 0.0
+    packages = sorted(by_package(rows).items(), key=lambda kv: kv[1], reverse=True)
+
+    print(f"import {args.module}: {import_ms:.1f} ms (interpreter wall {wall_ms:.1f} ms, {len(rows)} modules)")
+    for name, us in packages[:args.top]:
+        print(f"  {us / 1000:9.1f} ms  {name}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                "module": args.module,
+                "import_ms": round(import_ms, 1),
+                "wall_ms": round(wall_ms, 1),
+                "modules": len(rows),
+                "packages_ms": {name: round(us / 1000, 1) for name, us in packages},
+            }, f, indent=2)
+
+    if args.budget_ms is not None and import_ms > args.budget_ms:
+        print(f"over budget: {import_ms:.1f} ms > {args.budget_ms:.1f} ms")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,121 @@
+# bench/intents_bench.py
+"""
+Micro-benchmark: the old four keyword scans vs the single-pass IntentEngine.
+
+    python bench/intents_bench.py [rounds]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.intents import intent_engine  # noqa: E402
+
+PROMPTS = [
+    "who is the prime minister of india",
+    "Who won the orange cap in IPL 2021?",
+    "what is python",
+    "What is Python?",
+    "explain quantum entanglement like I'm five",
+    "latest news on the chandrayaan mission",
+    "iphone 16 price in india today",
+    "how to reverse a linked list in python",
+    "react vs vue for a small dashboard",
+    "best library for pdf parsing in node",
+    "write me a haiku about rain",
+    "translate 'good morning' to japanese",
+    "when was the constitution of india adopted",
+    "history of the roman empire in 5 lines",
+    "can you fix this canvas drawing bug",
+    "give me a tutorial on docker compose",
+    "meaning of serendipity",
+    "breaking updates on the stock market",
+    "compare postgres and mysql for analytics",
+    "a whole paragraph about nothing in particular, please keep it short",
+    "when is the next solar eclipse visible from hyderabad",
+    "example of a python decorator with arguments",
+    "who is the president of india",
+    "summarise this email for me: hi team, the launch moved to friday",
+]
+
+
+# ---- the pre-IntentEngine implementations, kept verbatim for comparison ----
+def legacy_is_fact_query(text):
+    keywords = [
+        "who", "winner", "when", "year", "born",
+        "orange cap", "ipl", "score", "record",
+        "president", "prime minister"
+    ]
+    return any(k in text.lower() for k in keywords)
+
+
+def legacy_needs_wikipedia(text):
+    keywords = [
+        "who is", "what is", "explain", "define",
+        "history", "about", "meaning"
+    ]
+    t = text.lower()
+    return any(k in t for k in keywords)
+
+
+def legacy_needs_news(text):
+    keywords = [
+        "news", "latest", "today", "current",
+        "update", "updates", "breaking",
+        "price", "launch", "released"
+    ]
+    t = text.lower()
+    return any(k in t for k in keywords)
+
+
+def legacy_needs_search(text):
+    keywords = [
+        "how to", "best", "compare", "vs",
+        "tool", "library", "framework",
+        "alternative", "example", "tutorial",
+        "use case", "guide"
+    ]
+    t = text.lower()
+    return any(k in t for k in keywords)
+
+
+def legacy(text):
+    return {
+        "fact": legacy_is_fact_query(text),
+        "wikipedia": legacy_needs_wikipedia(text),
+        "news": legacy_needs_news(text),
+        "search": legacy_needs_search(text),
+    }
+
+
+def timed(fn, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for p in PROMPTS:
+            fn(p)
+    return time.perf_counter() - start
+
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    calls = rounds * len(PROMPTS)
+
+    old = timed(legacy, rounds)
+    new = timed(intent_engine.flags, rounds)
+
+    print(f"{calls} classifications")
+    print(f"legacy scans : {old * 1e6 / calls:7.2f} us/prompt")
+    print(f"IntentEngine : {new * 1e6 / calls:7.2f} us/prompt")
+    print(f"speedup      : {old / new:7.2f}x")
+
+    print("\nprompts where the flags differ (word boundaries):")
+    for p in PROMPTS:
+        a, b = legacy(p), intent_engine.flags(p)
+        if a != b:
+            diff = {k: f"{a[k]}->{b[k]}" for k in a if a[k] != b[k]}
+            print(f"  {p!r}: {diff}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,347 @@
+# bench/offline.py
+"""
+Offline benchmark: the real Flask app against local fakes (no Firebase
+credentials, Groq key, Wikipedia/News/DuckDuckGo or Gmail needed).
+
+1. Serve the app with in-memory Firestore, a fake streaming Groq, canned
+   retrieval and an SMTP sink, all in one process:
+
+    python bench/offline.py serve --port 8000 --firestore-ms 5 --groq-rate 200
+
+2. Or let `run` start that server itself and drive /login, /api/history
+   and /stream, writing a JSON baseline:
+
+    python bench/offline.py run --duration 10 --concurrency 16
+    python bench/offline.py run --out bench/baselines/before.json
+
+3. Compare two baselines:
+
+    python bench/offline.py compare bench/baselines/before.json bench/baselines/after.json
+
+Every scenario reports requests, errors, throughput and p50/p99 latency
+(plus time to first byte for /stream).
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fakes import FakeFirestore, FakeGroq, canned_lookup, install_firebase  # noqa: E402
+from smtp_sink import SMTPSink  # noqa: E402
+from stream_load import pct  # noqa: E402
+
+PASSWORD = "bench-password"
+CONVO = "bench"
+RETRIEVAL = {
+    "wikipedia": "wikipedia_lookup",
+    "news": "google_news_lookup",
+    "search": "duckduckgo_lookup",
+}
+
+
+def bench_email(i: int) -> str:
+    return f"bench{i}@example.com"
+
+
+# =========================
+# SERVER
+# =========================
+def seed(app_module, users: int, history: int):
+    pw_hash = app_module.hasher.hash(PASSWORD)
+    start = datetime.utcnow() - timedelta(days=1)
+    for i in range(users):
+        email = bench_email(i)
+        app_module.users_col.document(email).set({
+            "name": f"Bench {i}",
+            "email": email,
+            "password": pw_hash,
+            "photo": None,
+        })
+        for n in range(history):
+            app_module.messages_col.add({
+                "user": email,
+                "sender": "user" if n % 2 == 0 else "bot",
+                "text": f"seeded message {n}",
+                "convo": CONVO,
+                "ts": start + timedelta(seconds=n),
+            })
+
+
+def serve(args):
+    tmp = tempfile.mkdtemp(prefix="ghost-bench-")
+    service_account = os.path.join(tmp, "service-account.json")
+    with open(service_account, "w") as f:
+        f.write("{}")
+
+    groq = FakeGroq(0, args.groq_tokens, args.groq_rate).start()
+    smtp = SMTPSink(("127.0.0.1", 0)).start()
+
+    os.environ.update({
+        "SERVICE_ACCOUNT": service_account,
+        "FLASK_SECRET": "bench",
+        "GROQ_API_KEY": "bench",
+        "GROQ_BASE_URL": groq.url,
+        "SMTP_HOST": "127.0.0.1",
+        "SMTP_PORT": str(smtp.server_address[1]),
+        "SMTP_SSL": "0",
+        "EMAIL_ADDRESS": "bench@example.com",
+        "EMAIL_PASSWORD": "bench",
+        "KV_BACKEND": "memory",
+    })
+    if not args.rate_limits:
+        os.environ.setdefault("STREAM_RATE", "1000")
+        os.environ.setdefault("STREAM_BURST", "1000")
+    if not args.response_cache:
+        os.environ["RESPONSE_CACHE_TTL"] = "0"
+        os.environ["RESPONSE_CACHE_NEWS_TTL"] = "0"
+
+    db = FakeFirestore(latency=args.firestore_ms / 1000)
+    install_firebase(db)
+
+    import app as app_module
+    from utils.cache import cached_lookup
+
+    for source, name in RETRIEVAL.items():
+        lookup = canned_lookup(source, args.retrieval_ms / 1000)
+        setattr(app_module, name, cached_lookup(source)(lookup))
+
+    seed(app_module, args.users, args.history)
+
+    import logging
+    from werkzeug.serving import make_server
+
+    # a log line per request would be part of what we measure
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    server = make_server("127.0.0.1", args.port, app_module.app, threaded=True)
+    print(f"ready http://127.0.0.1:{args.port} (groq {groq.url}, smtp :{smtp.server_address[1]})", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+# =========================
+# LOAD GENERATOR
+# =========================
+async def login(client, i: int):
+    start = time.perf_counter()
+    r = await client.post("/login", data={"email": bench_email(i), "password": PASSWORD})
+    ok = r.status_code == 302 and r.headers.get("location", "").endswith("/chat")
+    return time.perf_counter() - start, None, None if ok else r.status_code
+
+
+async def history(client, i: int):
+    start = time.perf_counter()
+    r = await client.get("/api/history", params={"convo": CONVO, "limit": 20})
+    return time.perf_counter() - start, None, None if r.status_code == 200 else r.status_code
+
+
+async def stream(client, i: int, n: int, repeat: bool):
+    message = "what is python" if repeat else f"what is python, take {i}-{n}"
+    start = time.perf_counter()
+    ttfb = None
+    async with client.stream("POST", "/stream", json={"message": message, "convo": CONVO}) as r:
+        if r.status_code != 200:
+            await r.aread()
+            return time.perf_counter() - start, None, r.status_code
+        async for _ in r.aiter_bytes():
+            if ttfb is None:
+                ttfb = time.perf_counter() - start
+    return time.perf_counter() - start, ttfb, None
+
+
+async def worker(client, i, scenario, deadline, latencies, ttfbs, errors, repeat):
+    n = 0
+    while time.perf_counter() < deadline:
+        n += 1
+        try:
+            if scenario == "login":
+                elapsed, ttfb, error = await login(client, i)
+            elif scenario == "history":
+                elapsed, ttfb, error = await history(client, i)
+            else:
+                elapsed, ttfb, error = await stream(client, i, n, repeat)
+        except Exception as e:
+            errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+            continue
+
+        if error is not None:
+            errors[str(error)] = errors.get(str(error), 0) + 1
+            continue
+        latencies.append(elapsed)
+        if ttfb is not None:
+            ttfbs.append(ttfb)
+
+
+async def run_scenario(url, scenario, concurrency, duration, users, repeat):
+    import httpx
+
+    clients = []
+    for i in range(concurrency):
+        client = httpx.AsyncClient(base_url=url, timeout=60, follow_redirects=False)
+        if scenario != "login":
+            # every virtual user has its own session
+            _, _, error = await login(client, i % users)
+            if error is not None:
+                raise SystemExit(f"setup login failed with {error}")
+        clients.append(client)
+
+    latencies, ttfbs, errors = [], [], {}
+    start = time.perf_counter()
+    deadline = start + duration
+    await asyncio.gather(*(
+        worker(c, i % users, scenario, deadline, latencies, ttfbs, errors, repeat)
+        for i, c in enumerate(clients)
+    ))
+    wall = time.perf_counter() - start
+    for c in clients:
+        await c.aclose()
+
+    result = {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / wall, 2),
+        "p50_ms": round(pct(latencies, 50) * 1000, 1),
+        "p99_ms": round(pct(latencies, 99) * 1000, 1),
+    }
+    if ttfbs:
+        result["ttfb_p50_ms"] = round(pct(ttfbs, 50) * 1000, 1)
+        result["ttfb_p99_ms"] = round(pct(ttfbs, 99) * 1000, 1)
+    return result
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True
+        ).strip()
+    except Exception:
+        return "unknown"
+
+
+def server_args(args) -> list:
+    return [
+        "--port", str(args.port),
+        "--users", str(args.users),
+        "--history", str(args.history),
+        "--firestore-ms", str(args.firestore_ms),
+        "--retrieval-ms", str(args.retrieval_ms),
+        "--groq-tokens", str(args.groq_tokens),
+        "--groq-rate", str(args.groq_rate),
+        *(["--response-cache"] if args.response_cache else []),
+        *(["--rate-limits"] if args.rate_limits else []),
+    ]
+
+
+def run(args):
+    proc = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "serve", *server_args(args)],
+        cwd=ROOT,
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    try:
+        line = proc.stdout.readline()
+        if not line.startswith("ready"):
+            raise SystemExit("bench server failed to start")
+
+        url = f"http://127.0.0.1:{args.port}"
+        scenarios = {}
+        for scenario in args.scenarios.split(","):
+            scenarios[scenario] = asyncio.run(run_scenario(
+                url, scenario, args.concurrency, args.duration,
+                min(args.users, args.concurrency), args.repeat_prompts,
+            ))
+            print(f"{scenario}: {json.dumps(scenarios[scenario])}", flush=True)
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+    baseline = {
+        "commit": git_commit(),
+        "created": datetime.utcnow().isoformat() + "Z",
+        "python": platform.python_version(),
+        "params": {
+            "concurrency": args.concurrency,
+            "duration_s": args.duration,
+            "firestore_ms": args.firestore_ms,
+            "retrieval_ms": args.retrieval_ms,
+            "groq_tokens": args.groq_tokens,
+            "groq_rate": args.groq_rate,
+            "response_cache": args.response_cache,
+            "repeat_prompts": args.repeat_prompts,
+        },
+        "scenarios": scenarios,
+    }
+
+    out = args.out or os.path.join(ROOT, "bench", "baselines", f"{baseline['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(baseline, f, indent=2)
+    print(f"baseline written to {out}")
+
+
+def compare(args):
+    with open(args.old) as f:
+        old = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+
+    print(f"{old['commit']} -> {new['commit']}")
+    for scenario, after in new["scenarios"].items():
+        before = old["scenarios"].get(scenario)
+        if not before:
+            continue
+        print(f"\n{scenario}")
+        for key, value in after.items():
+            if key == "errors" or key not in before:
+                continue
+            was = before[key]
+            delta = f"{(value - was) / was * 100:+.1f}%" if was else "n/a"
+            print(f"  {key:<16} {was:>10} -> {value:>10}  {delta}")
+        if after["errors"] or before["errors"]:
+            print(f"  {'errors':<16} {before['errors']} -> {after['errors']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    for name in ("serve", "run"):
+        p = sub.add_parser(name)
+        p.add_argument("--port", type=int, default=8000)
+        p.add_argument("--users", type=int, default=64)
+        p.add_argument("--history", type=int, default=60, help="seeded messages per user")
+        p.add_argument("--firestore-ms", type=float, default=5.0, help="latency per Firestore call")
+        p.add_argument("--retrieval-ms", type=float, default=50.0, help="latency per retrieval source")
+        p.add_argument("--groq-tokens", type=int, default=50)
+        p.add_argument("--groq-rate", type=float, default=200.0, help="tokens per second")
+        p.add_argument("--response-cache", action="store_true", help="keep the LLM response cache on")
+        p.add_argument("--rate-limits", action="store_true", help="keep per-user stream rate limits")
+
+    r = sub.choices["run"]
+    r.add_argument("--scenarios", default="login,history,stream")
+    r.add_argument("--concurrency", type=int, default=16)
+    r.add_argument("--duration", type=float, default=10.0, help="seconds per scenario")
+    r.add_argument("--repeat-prompts", action="store_true", help="send the same prompt every time")
+    r.add_argument("--out", help="default: bench/baselines/<commit>.json")
+
+    c = sub.add_parser("compare")
+    c.add_argument("old")
+    c.add_argument("new")
+
+    args = parser.parse_args(argv)
+    {"serve": serve, "run": run, "compare": compare}[args.cmd](args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,98 @@
+# bench/smtp_sink.py
+"""
+Local stand-in SMTP server: accepts any login and keeps every message
+in memory (or prints it), so mail can be exercised without Gmail.
+Recipients listed in `reject` are refused with a permanent 550.
+
+    python bench/smtp_sink.py --port 1025
+    SMTP_HOST=127.0.0.1 SMTP_PORT=1025 SMTP_SSL=0 python app.py
+"""
+import argparse
+import socketserver
+import threading
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, addr, verbose=False, reject=()):
+        super().__init__(addr, _Handler)
+        self.verbose = verbose
+        self.reject = set(reject)
+        self.messages = []  # (mail_from, [rcpt], data)
+        self.logins = 0
+        self.lock = threading.Lock()
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def reply(self, line: str):
+        self.wfile.write((line + "\r\n").encode())
+
+    def handle(self):
+        self.reply("220 ghost-sink ESMTP")
+        mail_from, rcpts = None, []
+        while True:
+            raw = self.rfile.readline()
+            if not raw:
+                return
+            line = raw.decode(errors="replace").rstrip("\r\n")
+            cmd = line.split(" ", 1)[0].upper()
+
+            if cmd == "EHLO":
+                self.reply("250-ghost-sink")
+                self.reply("250-AUTH PLAIN")
+                self.reply("250 8BITMIME")
+            elif cmd == "HELO":
+                self.reply("250 ghost-sink")
+            elif cmd == "AUTH":
+                with self.server.lock:
+                    self.server.logins += 1
+                self.reply("235 2.7.0 Authentication successful")
+            elif cmd == "MAIL":
+                mail_from, rcpts = line[10:].strip("<> "), []
+                self.reply("250 OK")
+            elif cmd == "RCPT":
+                rcpt = line[8:].strip("<> ")
+                if rcpt in self.server.reject:
+                    self.reply("550 5.1.1 No such user")
+                    continue
+                rcpts.append(rcpt)
+                self.reply("250 OK")
+            elif cmd == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                lines = []
+                while True:
+                    chunk = self.rfile.readline()
+                    if not chunk or chunk in (b".\r\n", b".\n"):
+                        break
+                    lines.append(chunk.decode(errors="replace"))
+                data = "".join(lines)
+                with self.server.lock:
+                    self.server.messages.append((mail_from, rcpts, data))
+                if self.server.verbose:
+                    print(f"--- mail from {mail_from} to {rcpts}\n{data[:500]}")
+                self.reply("250 OK queued")
+            elif cmd in ("RSET", "NOOP"):
+                self.reply("250 OK")
+            elif cmd == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=1025)
+    args = parser.parse_args()
+    print(f"SMTP sink on 127.0.0.1:{args.port}")
+    SMTPSink(("127.0.0.1", args.port), verbose=True).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+# bench/sse_bench.py
+"""
+SSE framing cost: one frame per token (the old /stream) versus frames
+coalesced by utils.sse.Coalescer, for a simulated reply at several token
+rates. Uses a virtual clock, so it measures framing work only, not
+sleeping.
+
+    python bench/sse_bench.py
+    python bench/sse_bench.py --tokens 400 --rates 20,100,500,2000 --streams 200
+
+Reports, per rate: frames and bytes per reply, and CPU microseconds per
+stream (time.process_time) for each framing.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from utils.sse import Coalescer  # noqa: E402
+
+WORDS = "the quick brown fox jumps over a lazy dog while ghost explains it all".split()
+
+
+def reply_tokens(n: int) -> list:
+    return [("" if i == 0 else " ") + WORDS[i % len(WORDS)] for i in range(n)]
+
+
+class VirtualClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def per_token(tokens):
+    for t in tokens:
+        yield f"data: {json.dumps({'chunk': t})}\n\n".encode("utf-8")
+
+
+def coalesced(tokens, coalescer, clock, step):
+    # what the flush timer does, replayed on the virtual clock: held text
+    # goes out when due, before the next token arrives
+    for t in tokens:
+        due = coalescer.due_in()
+        if due is not None and due <= step:
+            clock.now += due
+            frame = coalescer.flush()
+            if frame:
+                yield frame
+            clock.now += step - due
+        else:
+            clock.now += step
+        frame = coalescer.add(t)
+        if frame:
+            yield frame
+    tail = coalescer.flush()
+    if tail:
+        yield tail
+
+
+def measure(tokens, rate, streams, args):
+    step = 1.0 / rate
+
+    start = time.process_time()
+    for _ in range(streams):
+        old = list(per_token(tokens))
+    old_cpu = (time.process_time() - start) / streams
+
+    start = time.process_time()
+    for _ in range(streams):
+        clock = VirtualClock()
+        coalescer = Coalescer(args.max_bytes, args.interval_ms / 1000, clock)
+        new = list(coalesced(tokens, coalescer, clock, step))
+    new_cpu = (time.process_time() - start) / streams
+
+    return {
+        "rate": rate,
+        "old_frames": len(old),
+        "new_frames": len(new),
+        "old_bytes": sum(map(len, old)),
+        "new_bytes": sum(map(len, new)),
+        "old_cpu_us": old_cpu * 1e6,
+        "new_cpu_us": new_cpu * 1e6,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--tokens", type=int, default=300, help="tokens per reply")
+    parser.add_argument("--rates", default="20,100,500,2000", help="tokens per second")
+    parser.add_argument("--streams", type=int, default=200, help="replies per measurement")
+    parser.add_argument("--max-bytes", type=int, default=256)
+    parser.add_argument("--interval-ms", type=float, default=10.0)
+    args = parser.parse_args(argv)
+
+    tokens = reply_tokens(args.tokens)
+    print(f"{args.tokens} tokens per reply, flush at {args.max_bytes} B or {args.interval_ms} ms\n")
+    print(f"{'tok/s':>6}  {'frames':>13}  {'bytes':>15}  {'cpu us/stream':>17}")
+    for rate in (float(r) for r in args.rates.split(",")):
+        r = measure(tokens, rate, args.streams, args)
+        print(
+            f"{rate:>6.0f}  {r['old_frames']:>5} -> {r['new_frames']:<5}"
+            f"  {r['old_bytes']:>6} -> {r['new_bytes']:<6}"
+            f"  {r['old_cpu_us']:>7.0f} -> {r['new_cpu_us']:<7.0f}"
+        )
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,143 @@
+# bench/stream_load.py
+"""
+Concurrent /stream load test for the sync (WSGI) and async (ASGI) modes.
+
+1. Fake Groq that streams tokens slowly (OpenAI-compatible SSE):
+
+    python bench/stream_load.py fake-groq --port 8099 --tokens 100 --rate 20
+
+2. Run the app against it in either mode, with the admission limits and
+   the response cache out of the way (they would turn most streams into
+   429s or cache hits instead of open upstream streams):
+
+    export GROQ_API_KEY=x GROQ_BASE_URL=http://127.0.0.1:8099 \\
+        STREAM_RATE=1000 STREAM_BURST=1000 GROQ_CONCURRENCY=1000 \\
+        SSE_MAX_PRODUCERS=1000 RESPONSE_CACHE_TTL=0 RESPONSE_CACHE_NEWS_TTL=0
+    gunicorn -w 1 --threads 16 -b 127.0.0.1:8000 app:app          # sync
+    uvicorn --workers 1 --port 8000 asgi:application              # async
+
+3. Drive it with logged-in session cookies (repeat --cookie to spread
+   the streams over several users); every stream sends its own prompt:
+
+    python bench/stream_load.py load --url http://127.0.0.1:8000 \\
+        --cookie "session=..." --cookie "session=..." --concurrency 16,64,256
+
+For each level it reports how many streams were open at the same time,
+time to first byte and total duration. In sync mode the peak is capped
+by the thread count; in async mode it tracks the requested concurrency.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+from fakes import FakeGroq
+
+
+# =========================
+# FAKE GROQ
+# =========================
+def fake_groq(port: int, tokens: int, rate: float):
+    server = FakeGroq(port, tokens, rate)
+    print(f"fake groq on {server.url} ({tokens} tokens @ {rate}/s)")
+    server.serve_forever()
+
+
+# =========================
+# LOAD GENERATOR
+# =========================
+def pct(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+async def one_stream(client, url, cookie, message, state, ttfb, total, errors):
+    start = time.perf_counter()
+    first = True
+    try:
+        async with client.stream(
+            "POST",
+            f"{url}/stream",
+            json={"message": message, "convo": "bench"},
+            headers={"Cookie": cookie},
+        ) as r:
+            if r.status_code != 200:
+                errors.append(r.status_code)
+                return
+            async for _ in r.aiter_bytes():
+                if first:
+                    first = False
+                    ttfb.append(time.perf_counter() - start)
+                    state["open"] += 1
+                    state["peak"] = max(state["peak"], state["open"])
+    except Exception as e:
+        errors.append(type(e).__name__)
+    finally:
+        if not first:
+            state["open"] -= 1
+        total.append(time.perf_counter() - start)
+
+
+async def run_level(url, cookies, concurrency, timeout):
+    import httpx
+
+    state = {"open": 0, "peak": 0}
+    ttfb, total, errors = [], [], []
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=0)
+    async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            one_stream(
+                client, url, cookies[i % len(cookies)],
+                f"write a long story, take {concurrency}-{i}",  # no cache hits
+                state, ttfb, total, errors,
+            )
+            for i in range(concurrency)
+        ))
+        wall = time.perf_counter() - start
+
+    return {
+        "concurrency": concurrency,
+        "peak_open_streams": state["peak"],
+        "completed": len(total) - len(errors),
+        "errors": len(errors),
+        "ttfb_p50_ms": round(pct(ttfb, 50) * 1000, 1),
+        "ttfb_p99_ms": round(pct(ttfb, 99) * 1000, 1),
+        "duration_p50_s": round(pct(total, 50), 2),
+        "wall_s": round(wall, 2),
+    }
+
+
+def load(url, cookies, levels, timeout):
+    results = [asyncio.run(run_level(url, cookies, c, timeout)) for c in levels]
+    print(json.dumps(results, indent=2))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    g = sub.add_parser("fake-groq")
+    g.add_argument("--port", type=int, default=8099)
+    g.add_argument("--tokens", type=int, default=100)
+    g.add_argument("--rate", type=float, default=20.0, help="tokens per second")
+
+    l = sub.add_parser("load")
+    l.add_argument("--url", default="http://127.0.0.1:8000")
+    l.add_argument("--cookie", required=True, action="append", help="repeat for more users")
+    l.add_argument("--concurrency", default="16,64,256")
+    l.add_argument("--timeout", type=float, default=120.0)
+
+    args = parser.parse_args(argv)
+    if args.cmd == "fake-groq":
+        fake_groq(args.port, args.tokens, args.rate)
+    else:
+        levels = [int(c) for c in args.concurrency.split(",")]
+        load(args.url.rstrip("/"), args.cookie, levels, args.timeout)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,31 @@
+# gunicorn.conf.py
+"""
+    gunicorn -c gunicorn.conf.py
+
+The master builds the app once with create_app(preload=True): heavy
+libraries imported, templates compiled. Workers fork from it and share
+those pages; each one opens its own Firestore/Groq connections on first
+use and starts its own background work right after the fork.
+
+Workers on one host share OTPs and resumable /stream events through the
+SQLite KV store (KV_PATH). They publish their metrics there too, so one
+scrape of /metrics (bearer METRICS_TOKEN) returns every worker's series,
+labelled by worker pid. With more than one host behind a balancer,
+route each user to one host (sticky sessions) so a reconnect finds its
+stream.
+"""
+import os
+
+wsgi_app = "app:create_app(preload=True)"
+preload_app = True
+
+bind = os.getenv("BIND", "127.0.0.1:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+# SSE streams hold a thread each
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "16"))
+
+
+def post_fork(server, worker):
+    from app import start_background_work
+    start_background_work()
@@ -14,6 +14,29 @@ function addBubble(cls, txt) {
     messages.scrollTop = messages.scrollHeight;
 }
 
+/* ----------------------------------------
+   HISTORY (paged per conversation, ETag-revalidated)
+------------------------------------------- */
+let currentConvo = "default";
+
+function fetchHistory(convo, cursor) {
+    const params = new URLSearchParams();
+    if (convo) params.set("convo", convo);
+    if (cursor) params.set("cursor", cursor);
+    const qs = params.toString();
+
+    // the browser cache sends If-None-Match and reuses the body on 304
+    return fetch("/api/history" + (qs ? "?" + qs : ""), { cache: "no-cache" })
+        .then(r => r.json());
+}
+
+function renderHistory(page) {
+    const messages = document.getElementById("messages");
+    messages.innerHTML = "";
+    // pages come newest first
+    page.messages.slice().reverse().forEach(m => addBubble(m.sender, m.text));
+}
+
 /* ----------------------------------------
    SMALL TYPING BUBBLE
 ------------------------------------------- */
@@ -59,57 +82,159 @@ async function sendStreamingMessage(text) {
     messages.appendChild(botEl);
     messages.scrollTop = messages.scrollHeight;
 
-    const res = await fetch("/stream", {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ message: text, convo: "default" })
-    });
+    // one text node, appended to at most once per animation frame
+    const textNode = document.createTextNode("");
+    botEl.appendChild(textNode);
+    let pending = "";
+    let scheduled = false;
+    let first = true;
 
-    if (!res.ok) {
-        hideTyping();
-        botEl.textContent = "⚠️ Streaming error";
-        return;
-    }
+    const render = () => {
+        scheduled = false;
+        textNode.appendData(pending);
+        pending = "";
+        messages.scrollTop = messages.scrollHeight;
+    };
+
+    // where to resume from if the connection drops mid-reply
+    let streamId = null;
+    let lastEventId = null;
+    let finished = false;
+
+    const handleEvent = (raw) => {
+        const ev = parseSseEvent(raw);
+        if (!ev) return;
+        if (ev.id) lastEventId = ev.id;
+
+        if (ev.event === "done") {
+            finished = true;
+            return;
+        }
 
-    const reader = res.body.getReader();
-    const decoder = new TextDecoder();
+        if (ev.event === "retry") {
+            // server is busy upstream; nothing was generated
+            hideTyping();
+            const info = JSON.parse(ev.data || "{}");
+            const wait = Math.ceil(info.retry_after || 2);
+            botEl.textContent = `⏳ The AI is busy right now. Try again in ${wait} seconds.`;
+            return;
+        }
 
-    let fullText = "";
-    let first = true;
+        try {
+            const obj = JSON.parse(ev.data);
+            if (!obj.chunk) return;
 
-    while (true) {
-        const { done, value } = await reader.read();
-        if (done) break;
+            if (first) {
+                hideTyping();
+                first = false;
+            }
 
-        const chunk = decoder.decode(value);
-        const parts = chunk.split("\n\n");
+            pending += obj.chunk;
+            if (!scheduled) {
+                scheduled = true;
+                requestAnimationFrame(render);
+            }
+        } catch (e) {
+            console.log("JSON parse error", e);
+        }
+    };
+
+    const readEvents = async (res) => {
+        const reader = res.body.getReader();
+        const decoder = new TextDecoder();
+
+        // frames can be split across reads: keep the unfinished tail
+        let buffer = "";
+        while (true) {
+            const { done, value } = await reader.read();
+            if (done) break;
+
+            buffer += decoder.decode(value, { stream: true });
+            const events = buffer.split("\n\n");
+            buffer = events.pop();
+            events.forEach(handleEvent);
+        }
+        if (buffer.trim()) handleEvent(buffer);
+    };
+
+    for (let attempt = 0; ; attempt++) {
+        const headers = { "Content-Type": "application/json" };
+        if (streamId) {
+            // the server is still producing this reply; don't start another
+            headers["Last-Event-ID"] = lastEventId || `${streamId}-0`;
+        }
 
-        for (let part of parts) {
-            part = part.trim();
-            if (!part.startsWith("data:")) continue;
+        try {
+            const res = await fetch("/stream", {
+                method: "POST",
+                headers,
+                body: JSON.stringify({ message: text, convo: currentConvo })
+            });
 
-            try {
-                const obj = JSON.parse(part.replace("data:", "").trim());
-                if (!obj.chunk) continue;
+            if (res.status === 429) {
+                hideTyping();
+                const wait = res.headers.get("Retry-After") || "a few";
+                botEl.textContent = `⏳ You're sending messages too fast. Try again in ${wait} seconds.`;
+                return;
+            }
 
-                if (first) {
-                    hideTyping();
-                    first = false;
-                }
+            if (res.status === 503 && !streamId) {
+                hideTyping();
+                const wait = res.headers.get("Retry-After") || "a few";
+                botEl.textContent = `⏳ The AI is busy right now. Try again in ${wait} seconds.`;
+                return;
+            }
 
-                fullText += obj.chunk;
-                botEl.textContent = fullText;
-                messages.scrollTop = messages.scrollHeight;
+            if (res.status === 410) {
+                pending += "\n⚠️ Connection lost and the reply expired. Please resend.";
+                break;
+            }
 
-            } catch (e) {
-                console.log("JSON parse error", e);
+            if (!res.ok) {
+                if (streamId) throw new Error(`resume failed: ${res.status}`);
+                hideTyping();
+                botEl.textContent = "⚠️ Streaming error";
+                return;
             }
+
+            streamId = res.headers.get("X-Stream-Id") || streamId;
+            await readEvents(res);
+            if (finished || !streamId) break;
+        } catch (e) {
+            console.log("Stream interrupted", e);
+        }
+
+        if (!streamId || attempt >= 5) {
+            pending += "\n⚠️ Connection lost.";
+            break;
         }
+        await new Promise((r) => setTimeout(r, 1000 * (attempt + 1)));
     }
 
+    if (pending) render();
     hideTyping();
 }
 
+function parseSseEvent(raw) {
+    const ev = { event: "message", data: "", id: null };
+    let hasData = false;
+    for (const line of raw.split("\n")) {
+        const i = line.indexOf(":");
+        if (i <= 0) continue;
+        const field = line.slice(0, i);
+        const value = line.slice(i + 1).replace(/^ /, "");
+        if (field === "data") {
+            ev.data += (hasData ? "\n" : "") + value;
+            hasData = true;
+        } else if (field === "event") {
+            ev.event = value;
+        } else if (field === "id") {
+            ev.id = value;
+        }
+    }
+    return hasData ? ev : null;
+}
+
 /* ----------------------------------------
    PAGE LOAD
 ------------------------------------------- */
@@ -127,32 +252,22 @@ document.addEventListener("DOMContentLoaded", () => {
         });
     }
 
-    fetch("/api/history")
-        .then(r => r.json())
-        .then(arr => {
-            const messages = document.getElementById("messages");
-            messages.innerHTML = "";
-            arr.forEach(m => addBubble(m.sender, m.text));
-        })
+    fetchHistory(currentConvo)
+        .then(renderHistory)
         .catch(err => console.log("History load error:", err));
 
     const chatListBox = document.getElementById("chatList");
     if (chatListBox) {
-        fetch("/api/history")
+        fetch("/api/conversations")
             .then(res => res.json())
-            .then(chats => {
+            .then(page => {
                 chatListBox.innerHTML = "";
-                let grouped = {};
-                chats.forEach(c => {
-                    grouped[c.convo] = grouped[c.convo] || [];
-                    grouped[c.convo].push(c);
-                });
-
-                Object.keys(grouped).forEach(convo => {
+                page.conversations.forEach(c => {
                     let div = document.createElement("div");
                     div.className = "chat-item";
-                    div.textContent = grouped[convo][0].text.slice(0, 30) + "...";
-                    div.onclick = () => loadConversation(convo);
+                    div.textContent = c.title.slice(0, 30) + "...";
+                    div.title = c.preview;
+                    div.onclick = () => loadConversation(c.convo);
                     chatListBox.appendChild(div);
                 });
             });
@@ -163,14 +278,8 @@ document.addEventListener("DOMContentLoaded", () => {
    LOAD CONVERSATION
 ------------------------------------------- */
 function loadConversation(id) {
-    fetch("/api/history")
-        .then(r => r.json())
-        .then(arr => {
-            const messages = document.getElementById("messages");
-            messages.innerHTML = "";
-            arr.filter(m => m.convo === id)
-               .forEach(m => addBubble(m.sender, m.text));
-        });
+    currentConvo = id;
+    fetchHistory(id).then(renderHistory);
 }
 
 /* ----------------------------------------
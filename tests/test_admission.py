@@ -0,0 +1,53 @@
+# tests/test_admission.py
+import asyncio
+import threading
+
+from utils.admission import FairGovernor
+
+
+def test_async_waiters_hold_no_threads_and_are_woken_by_release():
+    governor = FairGovernor(limit=1)
+    assert governor.acquire("a")
+
+    async def main():
+        before = threading.active_count()
+        waiters = [asyncio.ensure_future(governor.acquire_async(f"u{i}", timeout=2)) for i in range(20)]
+        await asyncio.sleep(0.05)
+        assert threading.active_count() == before
+        assert governor.stats()["waiting"] == 20
+
+        # released from another thread, as the sync path does
+        threading.Thread(target=governor.release).start()
+        done, _ = await asyncio.wait(waiters, timeout=1, return_when=asyncio.FIRST_COMPLETED)
+        assert [t.result() for t in done] == [True]
+        for t in waiters:
+            t.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+
+    asyncio.run(main())
+    stats = governor.stats()
+    assert stats["waiting"] == 0
+    # the woken waiter holds the slot until it releases it
+    assert stats["active"] == 1
+
+
+def test_async_waiter_times_out():
+    governor = FairGovernor(limit=1)
+    assert governor.acquire("a")
+    assert asyncio.run(governor.acquire_async("b", timeout=0.05)) is False
+    assert governor.stats()["waiting"] == 0
+
+
+def test_cancelled_waiter_does_not_leak_a_granted_slot():
+    governor = FairGovernor(limit=1)
+    assert governor.acquire("a")
+
+    async def main():
+        task = asyncio.ensure_future(governor.acquire_async("b", timeout=5))
+        await asyncio.sleep(0.01)
+        governor.release()          # slot handed to b...
+        task.cancel()               # ...which leaves before it runs
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(main())
+    assert governor.stats()["active"] == 0
@@ -0,0 +1,133 @@
+import itertools
+import threading
+import time
+from datetime import datetime, timedelta
+
+from bench.fakes import FakeFirestore
+from utils.conversation import ConversationStore, ConversationWindow, estimate_tokens
+from utils.kvstore import MemoryStore
+from utils.message_sink import MessageSink
+
+T0 = datetime(2026, 1, 1)
+TICKS = itertools.count()
+
+
+def test_window_is_trimmed_to_the_token_budget():
+    window = ConversationWindow()
+    for i in range(10):
+        window.add("user", "x" * 40 + str(i), budget=25, summary_budget=1000)
+
+    assert window.tokens <= 25
+    assert [t[1][-1] for t in window.turns] == ["8", "9"]
+    assert len(window.summary) == 8
+
+
+def test_oldest_turns_are_folded_into_a_bounded_summary():
+    window = ConversationWindow()
+    for i in range(20):
+        window.add("user", f"question number {i} " + "y" * 200, budget=60, summary_budget=100)
+
+    messages = window.messages()
+    assert messages[0]["role"] == "system"
+    assert messages[0]["content"].startswith("Summary of earlier turns")
+    assert "…" in messages[0]["content"]
+    assert window.summary_tokens <= 100
+    # the newest folded turn survives, the oldest ones are gone
+    assert "question number 18" in messages[0]["content"]
+    assert "question number 0 " not in messages[0]["content"]
+    assert window.summary_tokens == sum(estimate_tokens(line) for line, _ in window.summary)
+
+
+def test_lru_keeps_at_most_maxsize_conversations():
+    db = FakeFirestore()
+    store = ConversationStore(db.collection("messages"), MemoryStore(), maxsize=2)
+    for convo in ("c1", "c2", "c3"):
+        store.record("a@x.com", convo, "user", f"hi from {convo}")
+    store.context("a@x.com", "c2")
+    store.record("a@x.com", "c4", "user", "hi")
+
+    assert list(store._windows) == [("a@x.com", "c2"), ("a@x.com", "c4")]
+
+
+class Worker:
+    """
+    One app worker: its own conversation windows and its own
+    write-behind sink, committing into the shared Firestore.
+    """
+
+    def __init__(self, db, kv):
+        self.conversations = ConversationStore(db.collection("messages"), kv)
+        self.sink = MessageSink(db, db.collection("messages"), flush_interval=0.01,
+                                on_commit=self.conversations.committed)
+
+    def save(self, sender, text):
+        self.sink.put({"user": "a@x.com", "convo": "c1", "sender": sender, "text": text,
+                       "ts": T0 + timedelta(seconds=next(TICKS))})
+        self.conversations.record("a@x.com", "c1", sender, text)
+
+    def context(self):
+        return [m["content"] for m in self.conversations.context("a@x.com", "c1")]
+
+
+class GatedFirestore(FakeFirestore):
+    # batch commits wait until the gate opens
+    def __init__(self):
+        super().__init__()
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def batch(self):
+        self.gate.wait(5)
+        return super().batch()
+
+
+def test_turns_recorded_by_another_worker_are_seen():
+    db = FakeFirestore()
+    kv = MemoryStore()
+    worker_a, worker_b = Worker(db, kv), Worker(db, kv)
+
+    worker_a.save("user", "first question")
+    worker_a.sink.flush()
+    assert worker_a.context() == ["first question"]
+
+    # the next turn lands on worker B
+    worker_b.save("bot", "first answer")
+    worker_b.sink.flush()
+
+    assert worker_a.context() == ["first question", "first answer"]
+
+
+def test_no_reload_before_the_other_workers_batch_commits():
+    db = GatedFirestore()
+    kv = MemoryStore()
+    worker_a, worker_b = Worker(db, kv), Worker(db, kv)
+    worker_a.save("user", "first question")
+    worker_a.sink.flush()
+    assert worker_b.context() == ["first question"]
+    own = worker_a.conversations._windows[("a@x.com", "c1")]
+
+    # A's next turn is still queued in its sink
+    db.gate.clear()
+    worker_a.save("bot", "first answer")
+    time.sleep(0.05)
+    assert worker_b.context() == ["first question"]
+
+    db.gate.set()
+    worker_a.sink.flush()
+    # B's window was never marked current without the turn: it reloads now
+    assert worker_b.context() == ["first question", "first answer"]
+    # and A's own window stayed current without a reload
+    assert worker_a.context() == ["first question", "first answer"]
+    assert worker_a.conversations._windows[("a@x.com", "c1")] is own
+
+
+def test_own_turns_keep_the_window_current():
+    db = FakeFirestore()
+    store = ConversationStore(db.collection("messages"), MemoryStore())
+    store.record("a@x.com", "c1", "user", "hello")
+    window = store._windows[("a@x.com", "c1")]
+    store.record("a@x.com", "c1", "bot", "hi there")
+
+    # not reloaded from Firestore, where nothing was written
+    assert store._windows[("a@x.com", "c1")] is window
+    assert [m["content"] for m in store.context("a@x.com", "c1")] == ["hello", "hi there"]
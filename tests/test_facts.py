@@ -0,0 +1,38 @@
+# tests/test_facts.py
+import pytest
+
+from utils.facts import FactEngine
+
+
+@pytest.fixture(scope="module")
+def engine():
+    return FactEngine.from_file()
+
+
+@pytest.mark.parametrize("question, answer", [
+    ("who is the prime minister of india", "The current Prime Minister of India is Narendra Modi."),
+    ("Who is the President of India?", "The current President of India is Droupadi Murmu."),
+    ("who won the orange cap in 2019", "The 2019 IPL Orange Cap winner was David Warner."),
+    ("current prime minister of india", "The current Prime Minister of India is Narendra Modi."),
+    ("name of the president of india", "The current President of India is Droupadi Murmu."),
+    ("orange cap winner 2021", "The 2021 IPL Orange Cap winner was Ruturaj Gaikwad."),
+])
+def test_current_facts_are_answered(engine, question, answer):
+    assert engine.answer(question) == answer
+
+
+@pytest.mark.parametrize("question", [
+    "who was the first prime minister of india",
+    "who was the vice president of india in 2010",
+    "orange cap in 2019 world cup",
+    "list all former presidents of india",
+    "who was the prime minister of india in 1990",
+    "how is the president of india elected",
+    "what are the powers of the prime minister of india",
+    "salary of the prime minister of india",
+    "write an essay on the president of india",
+    "who is eligible to become president of india",
+    "how is the orange cap decided",
+])
+def test_questions_the_tables_cannot_answer_go_to_the_llm(engine, question):
+    assert engine.answer(question) is None
@@ -0,0 +1,46 @@
+# tests/test_history.py
+from bench.fakes import FakeFirestore
+from utils.history import HistoryVersions
+from utils.kvstore import SQLiteStore
+from utils.message_sink import MessageSink
+
+
+def test_etag_is_shared_by_workers(tmp_path):
+    path = str(tmp_path / "kv.sqlite3")
+    worker_a = HistoryVersions(SQLiteStore(path))
+    worker_b = HistoryVersions(SQLiteStore(path))
+
+    before = worker_b.etag("a@x.com", "c1", None, 20)
+    assert worker_a.etag("a@x.com", "c1", None, 20) == before
+
+    worker_a.bump("a@x.com", "c1")
+    after = worker_b.etag("a@x.com", "c1", None, 20)
+    assert after != before
+    assert worker_b.etag("a@x.com", None, None, 20) != worker_a.etag("b@x.com", None, None, 20)
+
+
+def test_version_moves_only_after_the_batch_commits(tmp_path):
+    db = FakeFirestore()
+    versions = HistoryVersions(SQLiteStore(str(tmp_path / "kv.sqlite3")))
+    committed = []
+
+    def on_commit(docs):
+        committed.extend(docs)
+        for doc in docs:
+            versions.bump(doc["user"], doc["convo"])
+
+    sink = MessageSink(db, db.collection("messages"), flush_interval=0.01, on_commit=on_commit)
+    queued = versions.etag("a@x.com", "c1", None, 20)
+    sink._queue.put((None, {"user": "a@x.com", "convo": "c1", "text": "hi"}))
+    assert versions.etag("a@x.com", "c1", None, 20) == queued
+
+    sink.flush()
+    assert [d["text"] for d in committed] == ["hi"]
+    assert versions.etag("a@x.com", "c1", None, 20) != queued
+
+
+def test_forget_user_changes_every_etag(tmp_path):
+    versions = HistoryVersions(SQLiteStore(str(tmp_path / "kv.sqlite3")))
+    before = versions.etag("a@x.com", "c1", None, 20)
+    versions.forget_user("a@x.com")
+    assert versions.etag("a@x.com", "c1", None, 20) != before
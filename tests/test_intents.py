@@ -0,0 +1,44 @@
+import pytest
+
+from utils.intents import IntentEngine, classify_intents, intent_engine
+
+
+@pytest.mark.parametrize("text, intent", [
+    ("stock prices", "news"),
+    ("latest updates on the election", "news"),
+    ("python libraries for pdf", "search"),
+    ("tools for devops", "search"),
+    ("examples of recursion", "search"),
+    ("react vs vue", "search"),
+    ("yesterday cricket scores", "fact"),
+    ("who won the orange cap", "fact"),
+    ("What is Python?", "wikipedia"),
+])
+def test_keywords_and_their_plurals_are_found(text, intent):
+    assert intent in classify_intents(text)
+
+
+@pytest.mark.parametrize("text", [
+    "draw a circle on a canvas",
+    "the whole thing crashed",
+    "scoreboard",
+    "a dataset of whosoever",
+])
+def test_keywords_inside_other_words_are_ignored(text):
+    assert classify_intents(text) == frozenset()
+
+
+def test_a_phrase_implies_the_keywords_it_contains():
+    assert classify_intents("who is the prime minister") == {"fact", "wikipedia"}
+
+
+def test_flags_lists_every_intent():
+    flags = intent_engine.flags("breaking news")
+    assert set(flags) == set(intent_engine.intents)
+    assert flags["news"] and not flags["search"]
+
+
+def test_rules_are_data():
+    engine = IntentEngine({"greeting": ["hello", "good morning"]})
+    assert engine.classify("Good Mornings, hellos!") == {"greeting"}
+    assert engine.classify("othello") == frozenset()
@@ -0,0 +1,83 @@
+import threading
+import time
+
+import pytest
+
+from bench import fakes
+from bench.fakes import FakeFirestore
+from utils.jobs import JobRunner
+
+
+@pytest.fixture
+def db(monkeypatch):
+    firestore = pytest.importorskip("firebase_admin.firestore")
+    monkeypatch.setattr(firestore, "transactional", fakes.transactional, raising=False)
+    return FakeFirestore()
+
+
+def abandoned(db, job_id, lease_until):
+    db.collection("jobs").document(job_id).set({
+        "id": job_id, "kind": "delete_account", "user": "a@x.com",
+        "status": "running", "owner": "gone:1", "lease_until": lease_until,
+    })
+
+
+def test_abandoned_job_is_resumed_by_exactly_one_worker(db):
+    abandoned(db, "job1", time.time() - 1)
+    runs = []
+    finished = threading.Event()
+
+    def run(job, user):
+        runs.append(user)
+        finished.set()
+
+    workers = [JobRunner(db, lease=30) for _ in range(4)]
+    start = threading.Barrier(len(workers))
+
+    def resume(runner):
+        start.wait()
+        runner._resume("delete_account", run, lambda state: (state["user"],))
+
+    threads = [threading.Thread(target=resume, args=(w,)) for w in workers]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert finished.wait(5)
+    time.sleep(0.1)
+    assert runs == ["a@x.com"]
+
+
+def test_job_with_a_live_lease_is_left_alone(db):
+    abandoned(db, "job1", time.time() + 30)
+    runner = JobRunner(db, lease=30)
+
+    assert runner.unfinished("delete_account") == []
+    assert runner._claim("job1") is None
+
+
+def test_status_hides_lease_fields(db):
+    runner = JobRunner(db, lease=30)
+    done = threading.Event()
+    job_id = runner.submit("export", "a@x.com", lambda job: done.wait(5))
+
+    assert "owner" in db.docs[f"jobs/{job_id}"]
+    assert "owner" not in runner.status(job_id)
+    assert "lease_until" not in runner.status(job_id)
+    done.set()
+
+
+def test_finished_jobs_are_dropped_from_memory(db):
+    runner = JobRunner(db, lease=30, keep_finished=0)
+    first = runner.submit("export", "a@x.com", lambda job: {"rows": 1})
+    for _ in range(100):
+        if runner._jobs[first].finished is not None:
+            break
+        time.sleep(0.01)
+
+    runner.submit("export", "a@x.com", lambda job: None)
+    assert first not in runner._jobs
+    # still answered, from Firestore
+    assert runner.status(first)["status"] == "done"
+    assert runner.status(first)["rows"] == 1
@@ -0,0 +1,61 @@
+# tests/test_kvstore.py
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from utils import kvstore
+from utils.kvstore import MemoryStore, SQLiteStore
+from utils.lazy import Lazy
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return MemoryStore()
+    return SQLiteStore(str(tmp_path / "kv.sqlite3"))
+
+
+def test_incr_returns_the_updated_record(store):
+    store.set("otp:a", {"otp": "123456", "attempts": 0}, ttl=60)
+    assert store.incr("otp:a", "attempts") == {"otp": "123456", "attempts": 1}
+    assert store.get("otp:a")["attempts"] == 1
+    assert store.incr("otp:missing", "attempts") is None
+
+
+def test_parallel_increments_each_see_a_distinct_count(store):
+    store.set("otp:a", {"otp": "123456", "attempts": 0}, ttl=60)
+    with ThreadPoolExecutor(max_workers=40) as pool:
+        counts = list(pool.map(lambda _: store.incr("otp:a", "attempts")["attempts"], range(40)))
+
+    assert sorted(counts) == list(range(1, 41))
+    # with a cap of 5, exactly 5 guesses get compared
+    assert sum(1 for n in counts if n <= 5) == 5
+
+
+def test_items_returns_live_records_under_a_prefix(store):
+    store.set("metrics:1", {"a": 1}, ttl=60)
+    store.set("metrics:2", {"a": 2}, ttl=60)
+    store.set("metrics:3", {"a": 3}, ttl=-1)
+    store.set("metricsx", {"a": 4}, ttl=60)
+    store.set("otp:a", {"otp": "1"}, ttl=60)
+
+    assert store.items("metrics:") == {"metrics:1": {"a": 1}, "metrics:2": {"a": 2}}
+
+
+def test_set_many_writes_every_record(store):
+    store.set_many([("a", {"n": 1}, 60), ("b", {"n": 2}, 60), ("c", {"n": 3}, -1)])
+    assert store.get("a") == {"n": 1}
+    assert store.get("b") == {"n": 2}
+    assert store.get("c") is None
+
+
+def test_lazy_store_opens_on_first_use_and_keeps_the_store_api(monkeypatch, tmp_path):
+    path = tmp_path / "kv.sqlite3"
+    monkeypatch.setattr(kvstore, "KV_PATH", str(path))
+    store = Lazy(kvstore.create_store)
+    assert not path.exists()
+
+    assert store.get("otp:a") is None
+    store.set("otp:a", {"attempts": 0}, ttl=60)
+    assert store.get("otp:a") == {"attempts": 0}
+    assert path.exists()
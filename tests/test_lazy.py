@@ -0,0 +1,37 @@
+# tests/test_lazy.py
+import threading
+
+from utils.lazy import BackgroundThread
+
+
+def test_concurrent_callers_start_one_thread():
+    started = []
+    release = threading.Event()
+    worker = BackgroundThread(lambda: release.wait(5), "test-worker", on_start=lambda: started.append(1))
+    barrier = threading.Barrier(10)
+
+    def ensure():
+        barrier.wait()
+        worker.ensure()
+
+    threads = [threading.Thread(target=ensure) for _ in range(10)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert started == [1]
+    assert worker.running
+    release.set()
+
+
+def test_a_dead_thread_is_restarted():
+    runs = []
+    worker = BackgroundThread(lambda: runs.append(1), "test-worker")
+    worker.ensure()
+    worker._thread.join()
+    assert not worker.running
+
+    worker.ensure()
+    worker._thread.join()
+    assert runs == [1, 1]
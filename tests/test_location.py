@@ -0,0 +1,17 @@
+from utils import location
+
+
+def test_table_is_built_on_first_lookup_not_on_import(tmp_path, monkeypatch):
+    csv = tmp_path / "geoip.csv"
+    csv.write_text("# cidr,label\n203.0.113.0/24,Springfield, Testland\n")
+    out = tmp_path / "instance" / "geoip.bin"
+    monkeypatch.setattr(location, "GEOIP_CSV", str(csv))
+    monkeypatch.setattr(location, "GEOIP_PATH", str(out))
+    monkeypatch.setattr(location, "_offline", None)
+    monkeypatch.setattr(location, "_offline_loaded", False)
+    monkeypatch.setattr(location, "_cache", location.TTLCache())
+
+    assert not out.exists()
+    assert location.detect_location("203.0.113.7") == "Springfield, Testland"
+    assert out.exists()
+
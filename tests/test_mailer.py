@@ -0,0 +1,53 @@
+import time
+from email.mime.text import MIMEText
+
+import pytest
+
+from bench.smtp_sink import SMTPSink
+from utils.mailer import Mailer
+
+
+@pytest.fixture
+def sink(monkeypatch):
+    server = SMTPSink(("127.0.0.1", 0), reject={"nobody@x.com"}).start()
+    monkeypatch.setenv("SMTP_HOST", "127.0.0.1")
+    monkeypatch.setenv("SMTP_PORT", str(server.server_address[1]))
+    monkeypatch.setenv("SMTP_SSL", "0")
+    monkeypatch.setenv("EMAIL_ADDRESS", "ghost@x.com")
+    monkeypatch.setenv("EMAIL_PASSWORD", "secret")
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def message(to: str, body: str):
+    msg = MIMEText(body)
+    msg["Subject"] = "Your OTP"
+    msg["To"] = to
+    return msg
+
+
+def test_messages_share_one_connection(sink):
+    mailer = Mailer()
+    for i in range(3):
+        assert mailer.send("a@x.com", message("a@x.com", f"code {i}"))
+    mailer.flush()
+
+    assert [m[1] for m in sink.messages] == [["a@x.com"]] * 3
+    assert "code 2" in sink.messages[2][2]
+    assert sink.logins == 1
+    assert mailer.stats()["sent"] == 3
+
+
+def test_refused_recipient_is_not_retried(sink):
+    mailer = Mailer()
+    start = time.monotonic()
+    mailer.send("nobody@x.com", message("nobody@x.com", "lost"))
+    mailer.send("a@x.com", message("a@x.com", "otp 123456"))
+    mailer.flush()
+
+    # no backoff sleeps: the OTP behind the bad address goes out at once
+    assert time.monotonic() - start < 0.5
+    assert [m[1] for m in sink.messages] == [["a@x.com"]]
+    assert mailer.stats()["failed"] == 1
+    assert mailer.stats()["sent"] == 1
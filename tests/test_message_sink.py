@@ -0,0 +1,99 @@
+import threading
+import time
+
+import pytest
+
+from bench.fakes import FakeBatch, FakeFirestore
+from utils.message_sink import MessageSink
+
+
+class FlakyFirestore(FakeFirestore):
+    def __init__(self, failures: int):
+        super().__init__()
+        self.failures = failures
+
+    def batch(self):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("unavailable")
+        return super().batch()
+
+
+def test_batch_is_retried_until_firestore_recovers():
+    db = FlakyFirestore(failures=6)
+    sink = MessageSink(db, db.collection("messages"), flush_interval=0.01, max_backoff=0.02)
+    sink.put({"user": "a@x.com", "convo": "c1", "text": "hi"})
+    sink.flush(timeout=5)
+
+    assert [d.to_dict()["text"] for d in db.collection("messages").stream()] == ["hi"]
+    assert sink.stats()["dropped"] == 0
+
+
+def test_shutdown_flush_counts_what_it_gives_up_on():
+    db = FlakyFirestore(failures=10 ** 6)
+    sink = MessageSink(db, db.collection("messages"), flush_interval=0.01, max_backoff=0.02)
+    sink._queue.put((None, {"user": "a@x.com", "convo": "c1", "text": "hi"}))
+    sink.flush(timeout=0.2)
+
+    assert sink.stats()["dropped"] == 1
+
+
+def test_a_bad_document_is_dropped_and_later_messages_still_commit():
+    exceptions = pytest.importorskip("google.api_core.exceptions")
+
+    class StrictBatch(FakeBatch):
+        def set(self, ref, data, merge=False):
+            if data.get("text") == "bad":
+                self._ops.append(None)
+            super().set(ref, data, merge)
+
+        def commit(self):
+            if None in self._ops:
+                raise exceptions.InvalidArgument("invalid field value")
+            self._ops = [op for op in self._ops if op is not None]
+            super().commit()
+
+    class StrictFirestore(FakeFirestore):
+        def batch(self):
+            return StrictBatch(self)
+
+    db = StrictFirestore()
+    sink = MessageSink(db, db.collection("messages"), flush_interval=0.01, max_backoff=0.02)
+    for text in ("one", "bad", "two"):
+        sink.put({"user": "a@x.com", "convo": "c1", "text": text})
+    sink.flush(timeout=5)
+    sink.put({"user": "a@x.com", "convo": "c1", "text": "three"})
+    sink.flush(timeout=5)
+
+    texts = sorted(d.to_dict()["text"] for d in db.collection("messages").stream())
+    assert texts == ["one", "three", "two"]
+    assert sink.stats()["dropped"] == 1
+
+
+def test_barrier_waits_only_for_earlier_messages():
+    db = FakeFirestore()
+    sink = MessageSink(db, db.collection("messages"), flush_interval=0.01)
+    for i in range(3):
+        sink.put({"user": "a@x.com", "convo": "c1", "text": f"m{i}"})
+
+    stop = threading.Event()
+
+    def chatter():
+        # other users keep the queue busy the whole time
+        while not stop.is_set():
+            sink.put({"user": "b@x.com", "convo": "c1", "text": "busy"})
+            time.sleep(0.001)
+
+    t = threading.Thread(target=chatter)
+    t.start()
+    try:
+        start = time.monotonic()
+        assert sink.barrier(timeout=5)
+        assert time.monotonic() - start < 1
+    finally:
+        stop.set()
+        t.join()
+
+    mine = db.collection("messages").where("user", "==", "a@x.com").stream()
+    assert sorted(d.to_dict()["text"] for d in mine) == ["m0", "m1", "m2"]
+    assert sink.stats()["dropped"] == 0
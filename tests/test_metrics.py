@@ -0,0 +1,49 @@
+import os
+import threading
+
+import pytest
+
+from utils.kvstore import MemoryStore
+from utils.metrics import Counter, Histogram, WorkerMetrics, _Metric, render_metrics, snapshot
+
+TURNS = Counter("test_turns_total", "Turns.", ("source",))
+LATENCY = Histogram("test_latency_seconds", "Latency.", buckets=(0.1, 1.0))
+
+
+def test_metric_base_is_abstract():
+    with pytest.raises(TypeError):
+        _Metric("test_abstract", "Abstract.")
+
+
+def test_shards_of_all_threads_are_summed():
+    before = TURNS.collect().get(("llm",), 0)
+    threads = [threading.Thread(target=TURNS.inc, kwargs={"source": "llm"}) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    TURNS.inc(source="llm")
+
+    assert TURNS.collect()[("llm",)] == before + 9
+
+
+def test_render_labels_each_worker():
+    LATENCY.observe(0.05)
+    snap = snapshot()
+    text = render_metrics({"101": snap, "102": snap})
+
+    assert 'test_latency_seconds_bucket{worker="101",le="0.1"}' in text
+    assert 'test_latency_seconds_count{worker="102"}' in text
+    assert text.count("# TYPE test_latency_seconds histogram") == 1
+
+
+def test_scrape_includes_workers_that_published():
+    store = MemoryStore()
+    other = snapshot()
+    store.set("metrics:99999", other, 60)
+    TURNS.inc(source="cache")
+
+    text = WorkerMetrics(store, interval=60).render()
+
+    assert f'test_turns_total{{source="cache",worker="{os.getpid()}"}}' in text
+    assert 'worker="99999"' in text
@@ -0,0 +1,138 @@
+# tests/test_replay.py
+import threading
+import time
+
+import pytest
+
+from utils.kvstore import SQLiteStore
+from utils.replay import ReplayBuffer, SharedWriter, StreamGone, follow
+from utils.sse import chunk_frame
+
+
+@pytest.fixture
+def shared(tmp_path):
+    return SQLiteStore(str(tmp_path / "kv.sqlite3"))
+
+
+def event_ids(events):
+    return [e.split(b"\n", 1)[0].decode()[4:] for e in events]
+
+
+def test_resume_on_the_producing_worker(shared):
+    buffer = ReplayBuffer(shared=shared)
+    log = buffer.start("a@x.com")
+    for i in range(5):
+        log.append(chunk_frame(f"t{i} "))
+    log.close()
+
+    resumed, after = buffer.resume("a@x.com", f"{log.id}-2")
+    assert event_ids(follow(resumed, after)) == [f"{log.id}-{n}" for n in range(3, 7)]
+
+
+def test_resume_on_another_worker_follows_the_live_stream(shared):
+    worker_a = ReplayBuffer(shared=shared)
+    worker_b = ReplayBuffer(shared=shared)
+    log = worker_a.start("a@x.com")
+    log.append(chunk_frame("first "))
+    worker_a.flush()
+
+    remote, after = worker_b.resume("a@x.com", f"{log.id}-1")
+
+    def produce():
+        for i in range(3):
+            log.append(chunk_frame(f"t{i} "))
+        log.close()
+
+    threading.Timer(0.1, produce).start()
+    events = list(follow(remote, after, heartbeat=1))
+    assert event_ids(events) == [f"{log.id}-{n}" for n in range(2, 6)]
+    assert events[-1].endswith(b"event: done\ndata: {}\n\n")
+
+
+def test_other_users_and_unknown_streams_are_gone(shared):
+    worker_a = ReplayBuffer(shared=shared)
+    worker_b = ReplayBuffer(shared=shared)
+    log = worker_a.start("a@x.com")
+    log.append(chunk_frame("hi"))
+    worker_a.flush()
+
+    for buffer in (worker_a, worker_b):
+        with pytest.raises(StreamGone):
+            buffer.resume("b@x.com", f"{log.id}-1")
+        with pytest.raises(StreamGone):
+            buffer.resume("a@x.com", "0123456789abcdef-1")
+
+
+def test_producers_are_capped():
+    buffer = ReplayBuffer(max_running=2)
+    first = buffer.start("a@x.com")
+    buffer.start("a@x.com")
+    assert buffer.start("a@x.com") is None
+    first.close()
+    assert buffer.start("a@x.com") is not None
+    assert buffer.stats()["refused"] == 1
+
+
+def test_concurrent_starts_never_exceed_the_cap():
+    buffer = ReplayBuffer(max_running=5)
+    barrier = threading.Barrier(20)
+    logs = []
+
+    def start():
+        barrier.wait()
+        logs.append(buffer.start("a@x.com"))
+
+    threads = [threading.Thread(target=start) for _ in range(20)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert sum(log is not None for log in logs) == 5
+    assert buffer.stats()["running"] == 5
+
+
+def test_append_does_not_wait_on_the_shared_store(shared):
+    class SlowStore:
+        def __init__(self, store):
+            self.store = store
+
+        def set_many(self, items):
+            time.sleep(0.2)
+            self.store.set_many(items)
+
+        def get(self, key):
+            return self.store.get(key)
+
+    buffer = ReplayBuffer(shared=SlowStore(shared))
+    start = time.monotonic()
+    log = buffer.start("a@x.com")
+    for i in range(20):
+        log.append(chunk_frame(f"t{i} "))
+    log.close()
+    assert time.monotonic() - start < 0.1
+
+    buffer.flush()
+    assert shared.get(f"replay:{log.id}")["last"] == 21
+
+
+def test_shared_writer_drops_events_past_its_queue_bound(shared):
+    gate = threading.Event()
+
+    class StuckStore:
+        def set_many(self, items):
+            gate.wait(5)
+            shared.set_many(items)
+
+    writer = SharedWriter(StuckStore(), max_batch=1, maxsize=3)
+    writer.put("k0", {"i": 0}, 60)
+    while writer._queue.qsize():
+        time.sleep(0.001)
+    for i in range(1, 10):
+        writer.put(f"k{i}", {"i": i}, 60)
+    gate.set()
+    writer.flush()
+
+    # one batch was in flight, three more queued behind it
+    assert writer.dropped == 6
+    assert writer.written == 4
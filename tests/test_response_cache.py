@@ -0,0 +1,105 @@
+# tests/test_response_cache.py
+from utils.response_cache import ResponseCache, context_scope
+
+MODEL = "llama-3.1-8b-instant"
+
+
+def near_cache():
+    # near-duplicate matching is opt-in; these run with it switched on
+    return ResponseCache(threshold=0.9)
+
+
+def test_near_duplicates_are_off_by_default():
+    cache = ResponseCache()
+    scope = context_scope(MODEL, {}, [], "a@x.com")
+    cache.set("explain how photosynthesis works in plants", scope, "answer")
+    assert cache.get("explain how photosynthesis works in plant", scope) is None
+    assert cache.get("Explain how photosynthesis works in plants?", scope) == "answer"
+
+
+def test_inflected_prompt_is_a_near_hit_when_enabled():
+    cache = near_cache()
+    scope = context_scope(MODEL, {}, [], "a@x.com")
+    cache.set("explain how photosynthesis works in plants", scope, "answer")
+    assert cache.get("explain how photosynthesis works in plant", scope) == "answer"
+
+
+def test_first_turn_answers_are_shared_but_not_across_names():
+    cache = near_cache()
+    prompt = (
+        "my name is alice johnson and my email is alice@corp.com please "
+        "write a formal resignation letter to my manager"
+    )
+    alice = context_scope(MODEL, {}, [], "alice@corp.com")
+    alina = context_scope(MODEL, {}, [], "alina@corp.com")
+    cache.set(prompt, alice, "Dear manager, ... Alice Johnson")
+
+    # the same words get the same answer, whoever types them
+    assert alice == alina
+    assert cache.get(prompt, alina) == "Dear manager, ... Alice Johnson"
+    assert cache.get(prompt.replace("alice", "alina"), alina) is None
+
+
+def test_follow_up_answers_are_not_shared_across_users():
+    cache = near_cache()
+    history = [{"role": "user", "content": "my name is alice johnson"}]
+    alice = context_scope(MODEL, {}, history, "alice@corp.com")
+    alina = context_scope(MODEL, {}, history, "alina@corp.com")
+    cache.set("write my resignation letter", alice, "Dear manager, ... Alice Johnson")
+
+    assert cache.get("write my resignation letter", alice) == "Dear manager, ... Alice Johnson"
+    assert cache.get("write my resignation letter", alina) is None
+
+
+def test_scope_follows_the_retrieved_context():
+    assert context_scope(MODEL, {"news": "a"}, []) != context_scope(MODEL, {"news": "b"}, [])
+    assert context_scope(MODEL, {}, []) != context_scope("other-model", {}, [])
+
+
+def test_other_name_in_the_same_scope_is_a_miss():
+    cache = near_cache()
+    scope = context_scope(MODEL, {}, [], "a@x.com")
+    prompt = (
+        "my name is alice johnson and my email is alice@corp.com please "
+        "write a formal resignation letter to my manager"
+    )
+    cache.set(prompt, scope, "Dear manager, ... Alice Johnson")
+    assert cache.get(prompt.replace("alice", "alina"), scope) is None
+
+
+def test_opposite_sort_order_is_a_miss():
+    cache = near_cache()
+    scope = context_scope(MODEL, {}, [], "a@x.com")
+    cache.set(
+        "write a sql query that sorts the rows in descending order by date",
+        scope, "ORDER BY date DESC",
+    )
+    assert cache.get(
+        "write a sql query that sorts the rows in ascending order by date", scope
+    ) is None
+
+
+def test_negated_prompt_is_a_miss():
+    cache = near_cache()
+    scope = context_scope(MODEL, {}, [], "a@x.com")
+    cache.set("when to use a linked list instead of an array", scope, "when ...")
+    assert cache.get("when not to use a linked list instead of an array", scope) is None
+
+
+def test_operators_are_part_of_the_key():
+    cache = ResponseCache()
+    scope = context_scope(MODEL, {}, [], "a@x.com")
+    cache.set("what is 3+2", scope, "5")
+    assert cache.get("what is 3+2?", scope) == "5"
+    for other in ("what is 3*2", "what is 3-2", "what is 3/2", "what is 3 2"):
+        assert cache.get(other, scope) is None
+
+
+def test_language_names_are_part_of_the_key():
+    cache = ResponseCache()
+    scope = context_scope(MODEL, {}, [], "a@x.com")
+    cache.set("what is C++", scope, "C++ is ...")
+    cache.set("what is C#", scope, "C# is ...")
+    assert cache.get("What is c++?", scope) == "C++ is ..."
+    assert cache.get("what is c#", scope) == "C# is ..."
+    assert cache.get("what is c", scope) is None
@@ -0,0 +1,75 @@
+import threading
+
+from utils import retrieval, sources
+from utils.cache import TTLCache, cached_lookup, retrieval_caches
+
+
+def test_full_pool_skips_instead_of_queueing(monkeypatch):
+    monkeypatch.setattr(retrieval, "RETRIEVAL_WORKERS", 1)
+    release = threading.Event()
+
+    def slow(query):
+        release.wait(5)
+        return "late"
+
+    # the first source misses its deadline but keeps the only slot
+    assert retrieval.fan_out({"search": slow}, "q", budget=0.05) == {}
+    assert retrieval.fan_out({"news": lambda q: "fresh"}, "q", budget=0.5) == {}
+
+    release.set()
+    for _ in range(100):
+        if retrieval._inflight == 0:
+            break
+        threading.Event().wait(0.01)
+    assert retrieval.fan_out({"news": lambda q: "fresh"}, "q", budget=0.5) == {"news": "fresh"}
+
+
+def test_wiki_summary_skips_disambiguation_pages(monkeypatch):
+    calls = []
+
+    class Resp:
+        def json(self):
+            return {"query": {"pages": {
+                "1": {"index": 1, "pageprops": {"disambiguation": ""}, "extract": "Mercury may refer to:"},
+                "2": {"index": 2, "extract": "Mercury is the first planet from the Sun."},
+            }}}
+
+    def fake_get(url, params, timeout):
+        calls.append(timeout)
+        return Resp()
+
+    monkeypatch.setattr(sources, "_get", fake_get)
+    assert sources.wiki_summary("mercury", 4, timeout=2.5) == "Mercury is the first planet from the Sun."
+    assert calls == [2.5]
+
+
+def test_retrieval_cache_keeps_operators_apart(monkeypatch):
+    monkeypatch.setitem(retrieval_caches, "search", TTLCache())
+    lookup = cached_lookup("search")(lambda q: f"result for {q}")
+    assert lookup("C++ tutorial") == "result for C++ tutorial"
+    assert lookup("c# tutorial") == "result for c# tutorial"
+    assert lookup("C++ Tutorial?") == "result for C++ tutorial"
+
+
+def test_cache_hits_are_served_while_the_pool_is_full(monkeypatch):
+    monkeypatch.setitem(retrieval_caches, "news", TTLCache())
+    monkeypatch.setattr(retrieval, "RETRIEVAL_WORKERS", 0)
+    calls = []
+
+    @cached_lookup("news")
+    def news(query):
+        calls.append(query)
+        return "headlines"
+
+    news("markets today")
+    assert retrieval.fan_out({"news": news}, "Markets today?", budget=0.5) == {"news": "headlines"}
+    assert retrieval.fan_out({"news": news}, "markets tomorrow", budget=0.5) == {}
+    assert calls == ["markets today"]
+
+
+def test_split_sentences_shares_one_extract():
+    text = "Mercury is a planet. It is small! Is it hot? Yes. It has no moons."
+    head, rest = sources.split_sentences(text, 4)
+    assert head == "Mercury is a planet. It is small! Is it hot? Yes."
+    assert rest == "It has no moons."
+    assert sources.split_sentences("One sentence.", 4) == ("One sentence.", "")
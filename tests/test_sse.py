@@ -0,0 +1,36 @@
+# tests/test_sse.py
+import json
+import time
+
+from utils.sse import Coalescer, chunk_frame, coalesce_into
+
+
+def test_chunk_frame_matches_json_dumps():
+    text = 'say "hi" ⚠️\n'
+    assert chunk_frame(text) == f"data: {json.dumps({'chunk': text})}\n\n".encode("utf-8")
+
+
+def test_held_text_is_flushed_on_time_while_the_next_delta_is_slow():
+    start = time.monotonic()
+    frames = []
+
+    def deltas():
+        yield "Hello"
+        time.sleep(0.002)
+        yield " world"
+        time.sleep(0.5)
+        yield "!"
+
+    coalesce_into(deltas(), lambda f: frames.append((time.monotonic() - start, f)))
+
+    assert [f for _, f in frames] == [chunk_frame("Hello"), chunk_frame(" world"), chunk_frame("!")]
+    # " world" went out on the 10 ms timer, not with "!" half a second later
+    assert frames[1][0] < 0.2
+
+
+def test_max_bytes_counts_utf8_bytes():
+    clock = lambda: 0.0  # noqa: E731 - time stands still, only size flushes
+    coalescer = Coalescer(max_bytes=8, interval=1.0, clock=clock)
+    assert coalescer.add("a") is not None       # the first delta goes at once
+    assert coalescer.add("é") is None           # 2 bytes held
+    assert coalescer.add("ééé") is not None     # 8 bytes: flush
@@ -0,0 +1,48 @@
+# tests/test_users.py
+import time
+
+import pytest
+
+from bench.fakes import FakeFirestore
+from utils.users import NEGATIVE_TTL, UserExists, UserRepository
+
+
+def test_signup_on_another_worker_is_seen_quickly():
+    db = FakeFirestore()
+    worker_a = UserRepository(db.collection("users"))
+    worker_b = UserRepository(db.collection("users"))
+
+    assert worker_b.get("new@x.com") is None      # cached as missing on B
+    worker_a.create("new@x.com", {"name": "New"})
+
+    time.sleep(NEGATIVE_TTL + 0.1)
+    assert worker_b.get("new@x.com") == {"name": "New"}
+
+
+def test_create_never_overwrites_an_existing_account():
+    pytest.importorskip("google.api_core")
+    db = FakeFirestore()
+    worker_a = UserRepository(db.collection("users"))
+    worker_b = UserRepository(db.collection("users"))
+
+    assert worker_b.get("a@x.com") is None        # stale negative entry on B
+    worker_a.create("a@x.com", {"password": "original"})
+
+    with pytest.raises(UserExists):
+        worker_b.create("a@x.com", {"password": "attacker"})
+    assert db.collection("users").document("a@x.com").get().to_dict() == {"password": "original"}
+
+
+def test_fresh_read_sees_a_password_change_on_another_worker():
+    db = FakeFirestore()
+    worker_a = UserRepository(db.collection("users"))
+    worker_b = UserRepository(db.collection("users"))
+    worker_a.create("a@x.com", {"password": "old"})
+
+    assert worker_b.get("a@x.com") == {"password": "old"}   # now cached on B
+    worker_a.update("a@x.com", {"password": "new"})
+    assert worker_b.get("a@x.com", fresh=True) == {"password": "new"}
+
+    worker_a.delete("a@x.com")
+    assert worker_b.get("a@x.com", fresh=True) is None
+    assert worker_b.get("a@x.com") is None
@@ -0,0 +1,222 @@
+# utils/admission.py
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+STREAM_RATE = float(os.getenv("STREAM_RATE", "0.2"))  # refill, requests/sec per user
+STREAM_BURST = float(os.getenv("STREAM_BURST", "5"))
+GROQ_CONCURRENCY = int(os.getenv("GROQ_CONCURRENCY", "8"))
+GROQ_QUEUE_TIMEOUT = float(os.getenv("GROQ_QUEUE_TIMEOUT", "10"))
+
+
+class UpstreamBusy(Exception):
+    """
+    The LLM call could not start: our own queue timed out or Groq
+    rate-limited us. Surfaced to the client as an SSE `retry` event.
+    """
+
+    def __init__(self, retry_after: float, reason: str):
+        super().__init__(reason)
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+def retry_after_from(error, default: float = 2.0) -> float:
+    # Groq's 429 carries a retry-after header on its response
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after", default))
+    except (TypeError, ValueError):
+        return default
+
+
+class TokenBuckets:
+    """
+    One token bucket per user: `burst` requests at once, refilled at
+    `rate` per second. Idle buckets are dropped once they are full again.
+    """
+
+    def __init__(self, rate=STREAM_RATE, burst=STREAM_BURST, maxsize=100000):
+        self.rate = rate
+        self.burst = burst
+        self.maxsize = maxsize
+        self._buckets = {}  # user -> (tokens, last)
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    def allow(self, user: str) -> tuple[bool, float]:
+        """
+        -> (allowed, seconds until the next token)
+        """
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.get(user, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+
+            if tokens >= 1:
+                self._buckets[user] = (tokens - 1, now)
+                if len(self._buckets) > self.maxsize:
+                    self._prune(now)
+                return True, 0.0
+
+            self._buckets[user] = (tokens, now)
+            self.rejected += 1
+            return False, (1 - tokens) / self.rate
+
+    def _prune(self, now):
+        full_after = self.burst / self.rate
+        for user in [u for u, (_, last) in self._buckets.items() if now - last > full_after]:
+            del self._buckets[user]
+
+
+class _AsyncWaiter:
+    """
+    Queue entry for an event-loop caller: parks on a future instead of a
+    thread, and is woken from whichever thread releases the slot.
+    """
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.future = loop.create_future()
+        self._set = False
+
+    def set(self):
+        self._set = True
+        self.loop.call_soon_threadsafe(_resolve, self.future)
+
+    def is_set(self) -> bool:
+        return self._set
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class FairGovernor:
+    """
+    Global cap on concurrent upstream LLM calls. When all slots are busy,
+    waiters queue per user and slots are handed out round-robin across
+    users, so one user's burst can't starve everyone else.
+    """
+
+    def __init__(self, limit=GROQ_CONCURRENCY):
+        self.limit = limit
+        self.active = 0
+        self._waiting = OrderedDict()  # user -> deque[Event]
+        self._lock = threading.Lock()
+
+        self.admitted = 0
+        self.timeouts = 0
+        self.queued = 0
+        self.wait_ms_total = 0.0
+        self.wait_ms_max = 0.0
+
+    def _record_wait(self, start):
+        ms = (time.perf_counter() - start) * 1000
+        self.admitted += 1
+        self.wait_ms_total += ms
+        self.wait_ms_max = max(self.wait_ms_max, ms)
+
+    def _enqueue(self, user: str, waiter, start) -> bool:
+        # under the lock: True if a slot was free, else `waiter` queues
+        if self.active < self.limit and not self._waiting:
+            self.active += 1
+            self._record_wait(start)
+            return True
+        self._waiting.setdefault(user, deque()).append(waiter)
+        self.queued += 1
+        return False
+
+    def _settle(self, user: str, waiter, start) -> bool:
+        # under the lock, after waiting: granted, or withdraw from the queue
+        if waiter.is_set():
+            # release() handed its slot straight to us
+            self._record_wait(start)
+            return True
+
+        waiters = self._waiting.get(user)
+        if waiters is not None:
+            try:
+                waiters.remove(waiter)
+            except ValueError:
+                pass
+            if not waiters:
+                del self._waiting[user]
+        self.timeouts += 1
+        return False
+
+    def acquire(self, user: str, timeout: float = GROQ_QUEUE_TIMEOUT) -> bool:
+        start = time.perf_counter()
+        event = threading.Event()
+        with self._lock:
+            if self._enqueue(user, event, start):
+                return True
+
+        event.wait(timeout)
+
+        with self._lock:
+            return self._settle(user, event, start)
+
+    async def acquire_async(self, user: str, timeout: float = GROQ_QUEUE_TIMEOUT) -> bool:
+        """
+        acquire() for the event loop: a waiting stream costs a future, not
+        a thread from the default executor.
+        """
+        start = time.perf_counter()
+        waiter = _AsyncWaiter(asyncio.get_running_loop())
+        with self._lock:
+            if self._enqueue(user, waiter, start):
+                return True
+
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), timeout)
+        except asyncio.TimeoutError:
+            pass
+        except asyncio.CancelledError:
+            # the client left while queued; don't leak a slot handed to us
+            with self._lock:
+                granted = self._settle(user, waiter, start)
+            if granted:
+                self.release()
+            raise
+
+        with self._lock:
+            return self._settle(user, waiter, start)
+
+    def release(self):
+        with self._lock:
+            while self._waiting:
+                user, waiters = next(iter(self._waiting.items()))
+                waiter = waiters.popleft()
+                if waiters:
+                    self._waiting.move_to_end(user)  # next user's turn
+                else:
+                    del self._waiting[user]
+                try:
+                    waiter.set()
+                    return
+                except RuntimeError:
+                    # its event loop is gone; hand the slot to the next one
+                    continue
+            self.active -= 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            waiting = sum(len(w) for w in self._waiting.values())
+            return {
+                "limit": self.limit,
+                "active": self.active,
+                "waiting": waiting,
+                "admitted": self.admitted,
+                "queued": self.queued,
+                "timeouts": self.timeouts,
+                "avg_wait_ms": round(self.wait_ms_total / self.admitted, 2) if self.admitted else 0.0,
+                "max_wait_ms": round(self.wait_ms_max, 2),
+            }
+
+
+stream_buckets = TokenBuckets()
+llm_governor = FairGovernor()
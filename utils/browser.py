@@ -1,13 +1,5 @@
-def browser_name(agent: str) -> str:
-    agent = agent.lower()
+from utils.useragent import parse_user_agent
 
-    if "edg" in agent:
-        return "Edge"
-    if "chrome" in agent and "safari" in agent:
-        return "Chrome"
-    if "safari" in agent and "chrome" not in agent:
-        return "Safari"
-    if "firefox" in agent:
-        return "Firefox"
 
-    return "Unknown"
\ No newline at end of file
+def browser_name(agent: str) -> str:
+    return parse_user_agent(agent).browser
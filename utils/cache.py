@@ -0,0 +1,144 @@
+# utils/cache.py
+import re
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+_MISSING = object()
+_SPACES = re.compile(r"\s+")
+_TRAILING = re.compile(r"[\s?.!]+$")
+
+
+def normalize_query(text: str) -> str:
+    """
+    "Who is the  Prime Minister of India?" -> "who is the prime minister of india"
+
+    Lossless apart from case, spacing and trailing "?.!": "3+2" and "3*2",
+    or "C++" and "C#", must stay different keys.
+    """
+    t = _SPACES.sub(" ", (text or "").casefold()).strip()
+    return _TRAILING.sub("", t)
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache where every entry expires after `ttl` seconds.
+    Empty results are cached too (for `negative_ttl` seconds) so a source
+    that is down or has nothing to say is not hammered on every turn.
+    """
+
+    def __init__(self, maxsize=1024, ttl=300, negative_ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING:
+                self.misses += 1
+                return default
+
+            expires, value = item
+            if expires <= now:
+                del self._data[key]
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        if ttl is None:
+            ttl = self.ttl if value else self.negative_ttl
+
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = len(self._data)
+        total = self.hits + self.misses
+        return {
+            "size": size,
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+        }
+
+
+# =========================
+# RETRIEVAL CACHE
+# =========================
+# seconds: news goes stale fast, encyclopedia text barely changes
+RETRIEVAL_TTLS = {
+    "news": 120,
+    "search": 900,
+    "wikipedia": 6 * 3600,
+}
+
+retrieval_caches = {
+    source: TTLCache(maxsize=2048, ttl=ttl, negative_ttl=min(ttl, 60))
+    for source, ttl in RETRIEVAL_TTLS.items()
+}
+
+
+def cached_lookup(source: str):
+    """
+    Decorator for `fn(query) -> str` retrieval helpers. Queries are
+    normalized so "What is Python?" and "what is python" share one entry,
+    while "C++ tutorial" and "C# tutorial" do not.
+
+    `wrapper.cached(query)` answers from the cache alone (None on a miss)
+    and `wrapper.fill(query)` runs the lookup and stores it, so a caller
+    can serve hits itself and hand only misses to a worker pool.
+    """
+    cache = retrieval_caches[source]
+
+    def decorator(fn):
+        def cached(query: str):
+            hit = cache.get(normalize_query(query), _MISSING)
+            return None if hit is _MISSING else hit
+
+        def fill(query: str) -> str:
+            value = fn(query)
+            cache.set(normalize_query(query), value or "")
+            return value
+
+        @wraps(fn)
+        def wrapper(query: str) -> str:
+            hit = cached(query)
+            return fill(query) if hit is None else hit
+
+        wrapper.cache = cache
+        wrapper.cached = cached
+        wrapper.fill = fill
+        return wrapper
+
+    return decorator
+
+
+def retrieval_cache_stats() -> dict:
+    return {source: c.stats() for source, c in retrieval_caches.items()}
@@ -0,0 +1,208 @@
+# utils/conversation.py
+import os
+import threading
+from collections import OrderedDict, deque
+
+from utils.metrics import FIRESTORE_SECONDS
+
+# a conversation nobody has touched for this long is reloaded anyway
+CONVERSATION_VERSION_TTL = 24 * 3600
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "1500"))
+SUMMARY_TOKEN_BUDGET = int(os.getenv("SUMMARY_TOKEN_BUDGET", "400"))
+MAX_CONVERSATIONS = int(os.getenv("MAX_CONVERSATIONS", "5000"))
+LOAD_LIMIT = 40
+SUMMARY_LINE_CHARS = 160
+
+ROLES = {"user": "user", "bot": "assistant"}
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 chars per token is close enough for budgeting English prompts
+    return len(text or "") // 4 + 1
+
+
+class ConversationWindow:
+    def __init__(self, stamp=None):
+        # (epoch, version) of the shared counter this window is current with
+        self.stamp = stamp
+        # turns recorded here that haven't reached Firestore yet
+        self.uncommitted = 0
+        self.turns = deque()  # (role, text, tokens)
+        self.tokens = 0
+        self.summary = deque()  # (line, tokens)
+        self.summary_tokens = 0
+
+    def add(self, role: str, text: str, budget: int, summary_budget: int):
+        n = estimate_tokens(text)
+        self.turns.append((role, text, n))
+        self.tokens += n
+
+        # fold the oldest turns into the summary until the window fits
+        while self.tokens > budget and len(self.turns) > 1:
+            old_role, old_text, old_n = self.turns.popleft()
+            self.tokens -= old_n
+            self._fold(old_role, old_text, summary_budget)
+
+    def _fold(self, role: str, text: str, summary_budget: int):
+        snippet = " ".join(text.split())
+        if len(snippet) > SUMMARY_LINE_CHARS:
+            snippet = snippet[:SUMMARY_LINE_CHARS].rstrip() + "…"
+        line = f"- {role}: {snippet}"
+        n = estimate_tokens(line)
+        self.summary.append((line, n))
+        self.summary_tokens += n
+
+        while self.summary_tokens > summary_budget and len(self.summary) > 1:
+            _, dropped = self.summary.popleft()
+            self.summary_tokens -= dropped
+
+    def messages(self) -> list:
+        out = []
+        if self.summary:
+            lines = "\n".join(line for line, _ in self.summary)
+            out.append({
+                "role": "system",
+                "content": f"Summary of earlier turns in this conversation:\n{lines}",
+            })
+        for role, text, _ in self.turns:
+            out.append({"role": role, "content": text})
+        return out
+
+
+class ConversationStore:
+    """
+    Per-conversation history kept in a bounded LRU. A conversation is read
+    from Firestore when this process first sees it; after that every turn
+    updates the in-memory window, which is trimmed to a token budget with
+    older turns folded into a rolling summary. Prompt size stays flat
+    however long the conversation grows.
+
+    Once a turn's message is committed to Firestore (the message sink's
+    on_commit, see committed()), a counter per conversation is bumped in
+    the KV store all workers share. A window remembers the counter it is
+    current with; once another worker's turn has landed the counters
+    differ and the window is read from Firestore again, which by then
+    has that turn. Bumping any earlier would let another worker reload
+    before the commit and keep a window without the turn as current.
+    """
+
+    def __init__(self, messages_col, store, budget=HISTORY_TOKEN_BUDGET,
+                 summary_budget=SUMMARY_TOKEN_BUDGET, maxsize=MAX_CONVERSATIONS):
+        self.messages_col = messages_col
+        self.store = store
+        self.budget = budget
+        self.summary_budget = summary_budget
+        self.maxsize = maxsize
+        self._windows = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(email: str, convo: str) -> str:
+        return f"convo:{email}:{convo}"
+
+    @staticmethod
+    def _stamp(record: dict | None):
+        return (record["epoch"], record["version"]) if record else None
+
+    def _bump(self, email: str, convo: str):
+        key = self._key(email, convo)
+        record = self.store.incr(key, "version")
+        if record is None:
+            record = {"version": 1, "epoch": os.urandom(4).hex()}
+            self.store.set(key, record, CONVERSATION_VERSION_TTL)
+        return self._stamp(record)
+
+    def _load(self, email: str, convo: str, stamp) -> ConversationWindow:
+        window = ConversationWindow(stamp)
+        try:
+            with FIRESTORE_SECONDS.time(op="conversation_load"):
+                docs = (
+                    self.messages_col
+                    .where("user", "==", email)
+                    .where("convo", "==", convo)
+                    .order_by("ts", direction="DESCENDING")
+                    .limit(LOAD_LIMIT)
+                    .stream()
+                )
+                rows = [d.to_dict() for d in docs]
+        except Exception as e:
+            print("Conversation load error:", e)
+            rows = []
+
+        for x in reversed(rows):
+            role = ROLES.get(x.get("sender"))
+            if role and x.get("text"):
+                window.add(role, x["text"], self.budget, self.summary_budget)
+        return window
+
+    def _window(self, email: str, convo: str) -> ConversationWindow:
+        key = (email, convo)
+        # read before loading, so a turn recorded mid-load shows up next time
+        stamp = self._stamp(self.store.get(self._key(email, convo)))
+        with self._lock:
+            window = self._windows.get(key)
+            if window is not None and window.stamp == stamp:
+                self._windows.move_to_end(key)
+                return window
+
+        window = self._load(email, convo, stamp)
+
+        with self._lock:
+            # another request may have loaded it meanwhile
+            existing = self._windows.get(key)
+            if existing is not None and existing.stamp == stamp:
+                return existing
+            self._windows[key] = window
+            self._windows.move_to_end(key)
+            while len(self._windows) > self.maxsize:
+                self._windows.popitem(last=False)
+        return window
+
+    def context(self, email: str, convo: str) -> list:
+        window = self._window(email, convo)
+        with self._lock:
+            return window.messages()
+
+    def record(self, email: str, convo: str, sender: str, text: str):
+        role = ROLES.get(sender)
+        if not role or not text:
+            return
+        window = self._window(email, convo)
+        with self._lock:
+            window.add(role, text, self.budget, self.summary_budget)
+            window.uncommitted += 1
+
+    def committed(self, docs: list):
+        """
+        Message sink on_commit: `docs` are in Firestore now, so bump their
+        conversations' counters for every other worker.
+        """
+        counts = {}
+        for doc in docs:
+            key = (doc["user"], doc["convo"])
+            counts[key] = counts.get(key, 0) + 1
+
+        for (email, convo), n in counts.items():
+            stamp = self._bump(email, convo)
+            previous = (stamp[0], stamp[1] - 1) if stamp[1] > 1 else None
+            with self._lock:
+                window = self._windows.get((email, convo))
+                if window is None:
+                    continue
+                # still current if nobody else's turn landed in between and
+                # these turns were recorded into this very window
+                if window.stamp == previous and window.uncommitted >= n:
+                    window.stamp = stamp
+                    window.uncommitted -= n
+                else:
+                    del self._windows[(email, convo)]
+
+    def is_new(self, email: str, convo: str) -> bool:
+        window = self._window(email, convo)
+        with self._lock:
+            return not window.turns and not window.summary
+
+    def forget_user(self, email: str):
+        with self._lock:
+            for key in [k for k in self._windows if k[0] == email]:
+                del self._windows[key]
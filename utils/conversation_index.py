@@ -0,0 +1,33 @@
+# utils/conversation_index.py
+TITLE_CHARS = 60
+PREVIEW_CHARS = 120
+
+
+def _clip(text: str, n: int) -> str:
+    text = " ".join((text or "").split())
+    return text if len(text) <= n else text[:n].rstrip() + "…"
+
+
+def conversations_ref(db, email: str):
+    # users/{email}/conversations/{convo}: one small doc per conversation
+    return db.collection("users").document(email).collection("conversations")
+
+
+def index_update(text: str, ts, first: bool) -> dict:
+    """
+    Merge-set payload for one persisted message. Title and preview are
+    only written for the first message of a conversation.
+    """
+    from firebase_admin import firestore
+
+    doc = {
+        "last_ts": ts,
+        "message_count": firestore.Increment(1),
+    }
+    if first:
+        doc.update({
+            "title": _clip(text, TITLE_CHARS),
+            "preview": _clip(text, PREVIEW_CHARS),
+            "created": ts,
+        })
+    return doc
@@ -0,0 +1,56 @@
+# utils/deletion.py
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.message_sink import FIRESTORE_BATCH_LIMIT
+from utils.metrics import FIRESTORE_SECONDS
+
+DELETE_WORKERS = 4
+
+_pool = ThreadPoolExecutor(max_workers=DELETE_WORKERS, thread_name_prefix="delete")
+
+
+def _commit_deletes(db, refs) -> int:
+    batch = db.batch()
+    for ref in refs:
+        batch.delete(ref)
+    with FIRESTORE_SECONDS.time(op="delete_commit"):
+        batch.commit()
+    return len(refs)
+
+
+def delete_query(db, query, on_progress=None, page_size=FIRESTORE_BATCH_LIMIT) -> int:
+    """
+    Delete every document matched by `query` in batched writes of up to
+    `page_size` docs, with up to DELETE_WORKERS batches committing at once.
+    Only document refs are fetched. Safe to re-run: documents already
+    gone simply stop matching.
+    """
+    deleted = 0
+    last = None
+    pending = []
+
+    while True:
+        page = query.select([]).limit(page_size)
+        if last is not None:
+            page = page.start_after(last)
+        with FIRESTORE_SECONDS.time(op="delete_page"):
+            docs = list(page.stream())
+        if not docs:
+            break
+        last = docs[-1]
+        pending.append(_pool.submit(_commit_deletes, db, [d.reference for d in docs]))
+
+        # keep at most DELETE_WORKERS batches in flight
+        while len(pending) >= DELETE_WORKERS:
+            deleted += pending.pop(0).result()
+            if on_progress:
+                on_progress(deleted)
+
+        if len(docs) < page_size:
+            break
+
+    for fut in pending:
+        deleted += fut.result()
+    if on_progress:
+        on_progress(deleted)
+    return deleted
@@ -1,15 +1,10 @@
 # utils/email_alerts.py
-import smtplib
 from email.mime.text import MIMEText
 import os
 
-EMAIL_ADDRESS = os.getenv("EMAIL_ADDRESS")
-EMAIL_PASSWORD = os.getenv("EMAIL_PASSWORD")
+from utils.mailer import mailer
 
 def send_new_device_alert(email, device, browser, location):
-    if not EMAIL_ADDRESS or not EMAIL_PASSWORD:
-        return
-
     html = f"""
     <html>
       <body style="background:#0d0d0d;color:#fff;font-family:Arial;padding:20px">
@@ -29,18 +24,8 @@ def send_new_device_alert(email, device, browser, location):
 
     msg = MIMEText(html, "html")
     msg["Subject"] = "🔐 GHost AI – New Device Login"
-    msg["From"] = EMAIL_ADDRESS
+    msg["From"] = os.getenv("EMAIL_ADDRESS")
     msg["To"] = email
 
-    with smtplib.SMTP_SSL("smtp.gmail.com", 465) as s:
-        s.login(EMAIL_ADDRESS, EMAIL_PASSWORD)
-        s.sendmail(EMAIL_ADDRESS, email, msg.as_string())
-        
-def send_new_device_alert(email, device, browser, location):
-    print(
-        f"[SECURITY ALERT] New login\n"
-        f"Email: {email}\n"
-        f"Device: {device}\n"
-        f"Browser: {browser}\n"
-        f"Location: {location}"
-    )
\ No newline at end of file
+    print(f"[SECURITY ALERT] New login for {email}: {device} {browser} {location}")
+    return mailer.send(email, msg)
\ No newline at end of file
@@ -0,0 +1,95 @@
+# utils/export.py
+import gzip
+import json
+import os
+import re
+
+EXPORT_DIR = os.path.abspath(os.getenv("EXPORT_DIR", "exports"))
+EXPORT_PAGE_SIZE = 500
+EXPORT_FORMATS = {"jsonl": "jsonl", "md": "md", "markdown": "md"}
+
+_TOKEN_RE = re.compile(r"^[A-Za-z0-9_-]+$")
+
+
+def export_path(token: str, fmt: str) -> str:
+    return os.path.join(EXPORT_DIR, f"{token}.{fmt}.gz")
+
+
+def find_export(token: str) -> str | None:
+    # tokens come from URLs: never let them escape EXPORT_DIR
+    if not _TOKEN_RE.match(token or ""):
+        return None
+    for fmt in set(EXPORT_FORMATS.values()):
+        path = export_path(token, fmt)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def iter_messages(messages_col, email: str, page_size=EXPORT_PAGE_SIZE):
+    """
+    Yield every message of `email` oldest first, one Firestore page at a
+    time (start_after the last snapshot), so memory stays at one page.
+    """
+    last = None
+    while True:
+        query = (
+            messages_col
+            .where("user", "==", email)
+            .order_by("ts")
+            .limit(page_size)
+        )
+        if last is not None:
+            query = query.start_after(last)
+
+        count = 0
+        for doc in query.stream():
+            count += 1
+            last = doc
+            yield doc.to_dict()
+
+        if count < page_size:
+            return
+
+
+def _ts(x) -> str:
+    ts = x.get("ts")
+    return ts.isoformat() if ts else ""
+
+
+def write_export(job, messages_col, email: str, token: str, fmt: str) -> dict:
+    """
+    Job body: stream the user's history into a gzip'd JSONL or Markdown
+    file. Written to a temp name and renamed, so a half-written export is
+    never served.
+    """
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    path = export_path(token, fmt)
+    tmp = path + ".part"
+
+    count = 0
+    convo = None
+    with gzip.open(tmp, "wt", encoding="utf-8") as f:
+        if fmt == "md":
+            f.write(f"# GHost AI chat export\n\n_{email}_\n")
+
+        for x in iter_messages(messages_col, email):
+            if fmt == "jsonl":
+                f.write(json.dumps({
+                    "ts": _ts(x),
+                    "convo": x.get("convo", "default"),
+                    "sender": x.get("sender"),
+                    "text": x.get("text"),
+                }, ensure_ascii=False) + "\n")
+            else:
+                if x.get("convo", "default") != convo:
+                    convo = x.get("convo", "default")
+                    f.write(f"\n## {convo}\n\n")
+                f.write(f"**{x.get('sender')}** ({_ts(x)}):\n\n{x.get('text', '')}\n\n")
+
+            count += 1
+            if count % EXPORT_PAGE_SIZE == 0:
+                job.update(progress=count)
+
+    os.replace(tmp, path)
+    return {"progress": count, "messages": count, "bytes": os.path.getsize(path)}
@@ -0,0 +1,162 @@
+# utils/facts.py
+import json
+import os
+import re
+import threading
+
+DEFAULT_FACTS_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "facts.json"
+)
+
+
+def _phrase_regex(phrases):
+    alternation = "|".join(
+        re.escape(p) for p in sorted(phrases, key=len, reverse=True)
+    )
+    return re.compile(rf"\b(?:{alternation})\b")
+
+
+class FactResolver:
+    """
+    One fact table from data/facts.json. A resolver either maps each
+    trigger straight to an answer, or uses its trigger to select the
+    table and an entity in the question ("2021") to pick the row.
+
+    Only questions that ask for the fact itself are answered: each
+    `asks` regex has a `{trigger}` placeholder, e.g. "who is the
+    {trigger}" or "{trigger} winner". "how is the president of india
+    elected" contains the trigger but asks something else, so it is
+    left to the LLM, as are questions matching an `unless` phrase (or
+    the optional `unless_pattern` regex), e.g. "first prime minister
+    of india" against a table of current office holders.
+    """
+
+    def __init__(self, spec: dict):
+        self.name = spec["name"]
+        triggers = spec["triggers"]
+        if isinstance(triggers, dict):
+            self.triggers = {k.lower(): v for k, v in triggers.items()}
+        else:
+            self.triggers = {k.lower(): None for k in triggers}
+
+        self.template = spec.get("template", "{value}")
+        self.entities = {k.lower(): v for k, v in spec.get("entities", {}).items()}
+        self.fallback = spec.get("fallback")
+        self._entity_re = _phrase_regex(self.entities) if self.entities else None
+
+        self._asks = {
+            trigger: re.compile("|".join(
+                a.replace("{trigger}", re.escape(trigger)) for a in spec["asks"]
+            ))
+            for trigger in self.triggers
+        }
+
+        unless = [k.lower() for k in spec.get("unless", [])]
+        self._unless_re = _phrase_regex(unless) if unless else None
+        pattern = spec.get("unless_pattern")
+        self._unless_pattern = re.compile(pattern) if pattern else None
+
+    def excluded(self, text: str) -> bool:
+        return bool(
+            (self._unless_re and self._unless_re.search(text))
+            or (self._unless_pattern and self._unless_pattern.search(text))
+        )
+
+    def resolve(self, text: str, trigger: str):
+        """
+        -> (answer, confident) or (None, False)
+        """
+        if self.excluded(text) or not self._asks[trigger].search(text):
+            return None, False
+
+        direct = self.triggers.get(trigger)
+        if direct:
+            return direct, True
+
+        if self._entity_re:
+            m = self._entity_re.search(text)
+            if m:
+                key = m.group(0)
+                return self.template.format(entity=key, value=self.entities[key]), True
+
+        if self.fallback:
+            return self.fallback, False
+        return None, False
+
+
+class FactEngine:
+    """
+    All resolver triggers are indexed into one regex, so a question only
+    reaches the resolvers whose trigger phrase it actually contains.
+    """
+
+    def __init__(self, resolvers):
+        self.resolvers = list(resolvers)
+        self._by_trigger = {}
+        for r in self.resolvers:
+            for trigger in r.triggers:
+                self._by_trigger.setdefault(trigger, []).append(r)
+        self._trigger_re = _phrase_regex(self._by_trigger) if self._by_trigger else None
+
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.answered = 0
+        self.unconfident = 0
+
+    @classmethod
+    def from_file(cls, path: str | None = None):
+        path = path or os.getenv("FACTS_PATH", DEFAULT_FACTS_PATH)
+        with open(path) as f:
+            data = json.load(f)
+        return cls(FactResolver(spec) for spec in data.get("resolvers", []))
+
+    def resolve(self, text: str):
+        """
+        -> (answer, confident); (None, False) when no resolver applies.
+        """
+        if not self._trigger_re:
+            return None, False
+
+        t = (text or "").lower()
+        fallback = None
+        seen = set()
+        for m in self._trigger_re.finditer(t):
+            trigger = m.group(0)
+            for r in self._by_trigger[trigger]:
+                if (r.name, trigger) in seen:
+                    continue
+                seen.add((r.name, trigger))
+
+                answer, confident = r.resolve(t, trigger)
+                if confident:
+                    return answer, True
+                if answer and fallback is None:
+                    fallback = answer
+
+        return fallback, False
+
+    def answer(self, text: str) -> str | None:
+        """
+        Confident answer that can be sent without calling the LLM, else None.
+        """
+        answer, confident = self.resolve(text)
+        with self._lock:
+            self.lookups += 1
+            if confident:
+                self.answered += 1
+            elif answer:
+                self.unconfident += 1
+        return answer if confident else None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "resolvers": len(self.resolvers),
+                "lookups": self.lookups,
+                "llm_calls_saved": self.answered,
+                "unconfident": self.unconfident,
+                "hit_rate": round(self.answered / self.lookups, 3) if self.lookups else 0.0,
+            }
+
+
+fact_engine = FactEngine.from_file()
@@ -0,0 +1,157 @@
+# utils/hashing.py
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+
+import bcrypt
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+# hashes allowed to be running or waiting at once; beyond that we shed load
+HASH_MAX_INFLIGHT = int(os.getenv("HASH_MAX_INFLIGHT", str(HASH_WORKERS * 4)))
+HASH_TIMEOUT = 10.0
+
+
+class HashingBusy(Exception):
+    """Raised when the hashing pool is saturated; the app answers 429."""
+
+
+# ---- run inside the pool processes ----
+def _secret(password: str) -> bytes:
+    # bcrypt only ever used the first 72 bytes; newer releases refuse more
+    return password.encode("utf-8")[:72]
+
+
+def _hash(password: str, rounds: int) -> str:
+    return bcrypt.hashpw(_secret(password), bcrypt.gensalt(rounds)).decode("utf-8")
+
+
+def _check(pw_hash: str, password: str) -> bool:
+    try:
+        return bcrypt.checkpw(_secret(password), pw_hash.encode("utf-8"))
+    except ValueError:
+        return False
+
+
+class PasswordHasher:
+    """
+    bcrypt on a dedicated process pool so a burst of logins can't hold
+    request threads (and the GIL) for ~250 ms each. Admission is bounded:
+    when HASH_MAX_INFLIGHT hashes are queued or running, new ones fail
+    fast with HashingBusy instead of piling up.
+    """
+
+    def __init__(self, workers=HASH_WORKERS, max_inflight=HASH_MAX_INFLIGHT, rounds=BCRYPT_ROUNDS):
+        self.workers = workers
+        self.rounds = rounds
+        self._slots = threading.BoundedSemaphore(max_inflight)
+        self._pool = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+        self.count = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def _executor(self):
+        # created lazily, and again after a fork
+        with self._lock:
+            if self._pool is None or self._pid != os.getpid():
+                # forkserver, not fork: forking a worker that already runs
+                # sink, mailer and job threads could hand the children
+                # locks held mid-operation
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("forkserver"),
+                )
+                self._pid = os.getpid()
+            return self._pool
+
+    def _record(self, start):
+        ms = (time.perf_counter() - start) * 1000
+        with self._lock:
+            self.count += 1
+            self.total_ms += ms
+            self.max_ms = max(self.max_ms, ms)
+
+    def _submit(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise HashingBusy()
+
+        start = time.perf_counter()
+        try:
+            fut = self._executor().submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+
+        def done(_):
+            self._slots.release()
+            self._record(start)
+
+        fut.add_done_callback(done)
+        return fut
+
+    def _result(self, fut):
+        try:
+            return fut.result(timeout=HASH_TIMEOUT)
+        except FutureTimeout:
+            # as overloaded as a full queue: same 429, not a 500
+            fut.cancel()
+            with self._lock:
+                self.timeouts += 1
+            raise HashingBusy()
+
+    def hash(self, password: str) -> str:
+        return self._result(self._submit(_hash, password, self.rounds))
+
+    def check(self, pw_hash: str, password: str) -> bool:
+        if not pw_hash:
+            return False
+        return self._result(self._submit(_check, pw_hash, password))
+
+    def needs_rehash(self, pw_hash: str) -> bool:
+        # "$2b$12$..." -> 12
+        try:
+            return int(pw_hash.split("$")[2]) != self.rounds
+        except (IndexError, ValueError):
+            return False
+
+    def rehash_later(self, password: str, on_done):
+        """
+        Re-hash at the current cost without making the caller wait;
+        `on_done(new_hash)` runs when it finishes. Skipped when busy.
+        """
+        try:
+            fut = self._submit(_hash, password, self.rounds)
+        except HashingBusy:
+            return
+
+        def callback(f):
+            try:
+                on_done(f.result())
+            except Exception as e:
+                print("Password rehash failed:", e)
+
+        fut.add_done_callback(callback)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "rounds": self.rounds,
+                "hashes": self.count,
+                "rejected": self.rejected,
+                "timeouts": self.timeouts,
+                "avg_ms": round(self.total_ms / self.count, 2) if self.count else 0.0,
+                "max_ms": round(self.max_ms, 2),
+            }
+
+
+hasher = PasswordHasher()
@@ -0,0 +1,78 @@
+# utils/history.py
+import base64
+import hashlib
+import json
+import os
+import time
+from datetime import datetime
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+# a 304 is only trusted for this long, a safety net for writes that
+# bypass the version counters (e.g. edits made straight in Firestore)
+HISTORY_ETAG_TTL = int(os.getenv("HISTORY_ETAG_TTL", "30"))
+# version records outlive any cached page that could still be revalidated
+HISTORY_VERSION_TTL = 7 * 24 * 3600
+
+
+def encode_cursor(ts: datetime) -> str:
+    raw = json.dumps({"ts": ts.isoformat()}).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str | None) -> datetime | None:
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        return datetime.fromisoformat(json.loads(raw)["ts"])
+    except Exception:
+        return None
+
+
+def page_size(value, default=DEFAULT_PAGE_SIZE) -> int:
+    try:
+        n = int(value)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(n, MAX_PAGE_SIZE))
+
+
+class HistoryVersions:
+    """
+    Change counter per (user, convo), kept in the KV store every worker
+    shares, so an ETag built from it can be checked without reading a
+    single Firestore document and is the same on every worker. Bumped
+    only once a message has been committed, so a page read in between
+    can't be cached under the new version.
+
+    Each record carries a random epoch, so a counter that expired and
+    started again at 1 never reproduces an old ETag.
+    """
+
+    def __init__(self, store):
+        self.store = store
+
+    def _incr(self, key: str):
+        if self.store.incr(key, "version") is None:
+            self.store.set(key, {"version": 1, "epoch": os.urandom(4).hex()}, HISTORY_VERSION_TTL)
+
+    def _get(self, key: str) -> str:
+        record = self.store.get(key) or {}
+        return f"{record.get('epoch')}:{record.get('version', 0)}"
+
+    def bump(self, email: str, convo: str):
+        self._incr(f"history:{email}:{convo}")
+        self._incr(f"history:{email}:*")
+
+    def forget_user(self, email: str):
+        # every ETag of the user includes this generation
+        self._incr(f"history:{email}")
+
+    def etag(self, email: str, convo: str | None, cursor: str | None, limit: int) -> str:
+        generation = self._get(f"history:{email}")
+        version = self._get(f"history:{email}:{convo or '*'}")
+        bucket = int(time.time() // HISTORY_ETAG_TTL)
+        token = f"{generation}|{email}|{convo}|{version}|{cursor}|{limit}|{bucket}"
+        return hashlib.sha1(token.encode()).hexdigest()
@@ -0,0 +1,106 @@
+# utils/intents.py
+import json
+import os
+import re
+
+DEFAULT_RULES_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "intents.json"
+)
+
+
+def load_rules(path: str | None = None) -> dict:
+    path = path or os.getenv("INTENT_RULES", DEFAULT_RULES_PATH)
+    with open(path) as f:
+        return json.load(f)
+
+
+def _forms(keyword: str) -> tuple:
+    # "vs", "who", "ipl" stay exact: a suffix would only add false hits
+    if len(keyword) <= 3:
+        return (keyword,)
+    if re.search(r"[^aeiou]y$", keyword):
+        return keyword, keyword[:-1] + "ies"
+    return keyword, keyword + "s", keyword + "es"
+
+
+def _trie_pattern(words) -> str:
+    """
+    One alternation with common prefixes factored out ("pri(?:ce|me
+    minister)"), so the regex engine tests each prefix once instead of
+    trying every keyword in turn at every position.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def build(node) -> str:
+        alts = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not alts:
+            return ""
+        body = alts[0] if len(alts) == 1 else "(?:" + "|".join(alts) + ")"
+        if "" in node:
+            # greedy: the longer keyword is tried first
+            return f"(?:{body})?" if len(alts) == 1 else body + "?"
+        return body
+
+    return build(trie)
+
+
+class IntentEngine:
+    """
+    Compiles every keyword of every intent into ONE word-boundary regex,
+    so a message is lowercased and scanned once and all intent flags come
+    out of the same pass.
+
+    "vs" no longer fires inside "canvas", nor "who" inside "whole".
+    Keywords longer than three letters also match their plurals and
+    third-person forms ("stock prices", "python libraries", "tools").
+    """
+
+    def __init__(self, rules: dict):
+        self.intents = tuple(rules)
+        keywords = {}
+        for intent, words in rules.items():
+            for w in words:
+                keywords.setdefault(w.lower().strip(), set()).add(intent)
+
+        # a phrase like "who is" also implies every shorter keyword it
+        # contains ("who"), because the regex only reports the longest one
+        self._owners = {}
+        for phrase in keywords:
+            owners = set()
+            for kw, intents in keywords.items():
+                if re.search(rf"\b{re.escape(kw)}\b", phrase):
+                    owners |= intents
+            self._owners[phrase] = frozenset(owners)
+
+        # every surface form maps straight to its keyword's intents
+        self._by_form = {}
+        for kw in keywords:
+            for form in _forms(kw):
+                self._by_form.setdefault(form, set()).update(self._owners[kw])
+
+        # greedy, so "prime minister" wins over "prime"
+        self._pattern = re.compile(rf"\b(?:{_trie_pattern(self._by_form)})\b")
+
+    def classify(self, text: str) -> frozenset:
+        found = set()
+        for m in self._pattern.finditer((text or "").lower()):
+            found |= self._by_form[m.group(0)]
+            if len(found) == len(self.intents):
+                break
+        return frozenset(found)
+
+    def flags(self, text: str) -> dict:
+        hit = self.classify(text)
+        return {intent: intent in hit for intent in self.intents}
+
+
+intent_engine = IntentEngine(load_rules())
+
+
+def classify_intents(text: str) -> frozenset:
+    return intent_engine.classify(text)
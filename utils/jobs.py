@@ -0,0 +1,229 @@
+# utils/jobs.py
+import os
+import secrets
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from utils.lazy import BackgroundThread
+
+PROGRESS_WRITE_INTERVAL = 1.0  # seconds between Firestore progress writes
+
+# a worker owns a queued/running job until `lease_until` (epoch seconds)
+# and renews it every JOB_LEASE / 3; once it lapses, another worker may
+# claim the job and resume it
+JOB_LEASE = float(os.getenv("JOB_LEASE", "60"))
+# finished jobs stay in memory this long; status() then reads Firestore
+JOB_KEEP_FINISHED = float(os.getenv("JOB_KEEP_FINISHED", "60"))
+
+
+def _public(state: dict) -> dict:
+    # which worker holds the lease is nobody's business but the runners'
+    state = dict(state)
+    state.pop("owner", None)
+    state.pop("lease_until", None)
+    return state
+
+
+class Job:
+    """
+    Handle passed to a job function so it can report progress. State is
+    mirrored to Firestore (jobs/{id}) so any worker can answer a poll.
+    """
+
+    def __init__(self, runner, job_id: str, kind: str, user: str, state: dict):
+        self.runner = runner
+        self.id = job_id
+        self.kind = kind
+        self.user = user
+        self.state = state
+        self.finished = None  # monotonic time the job ended
+        self._last_write = 0.0
+        # the job's thread and the lease renewer both write; in order, so
+        # a renewal never lands after (and undoes) the final status
+        self._lock = threading.Lock()
+
+    def update(self, force=False, **fields):
+        with self._lock:
+            self.state.update(fields)
+            self.state["updated"] = datetime.utcnow()
+            now = time.monotonic()
+            if force or now - self._last_write >= PROGRESS_WRITE_INTERVAL:
+                self._last_write = now
+                self.runner._persist(self)
+
+
+class JobRunner:
+    """
+    Small background job system for long account-level work (exports,
+    deletions). Runs on a bounded thread pool; status is kept in memory
+    (finished jobs only for `keep_finished` seconds) and in Firestore.
+
+    Each unfinished job carries an `owner` and a lease. A background
+    thread renews the leases of this worker's jobs and, for kinds passed
+    to resume(), claims jobs whose lease has lapsed (their worker died)
+    in a Firestore transaction, so exactly one worker resumes each.
+    """
+
+    def __init__(self, db, max_workers=2, lease=JOB_LEASE, keep_finished=JOB_KEEP_FINISHED):
+        self.db = db
+        self.lease = lease
+        self.keep_finished = keep_finished
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="jobs")
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._resumable = {}  # kind -> (fn, args_from_state)
+        self._leaser = BackgroundThread(self._lease_loop, "job-leases")
+
+    @property
+    def owner(self) -> str:
+        # per process: forked workers must not share an identity
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+    def _ref(self, job_id: str):
+        return self.db.collection("jobs").document(job_id)
+
+    def _persist(self, job: Job):
+        if job.state.get("status") in ("queued", "running"):
+            job.state["owner"] = self.owner
+            job.state["lease_until"] = time.time() + self.lease
+        try:
+            self._ref(job.id).set(dict(job.state), merge=True)
+        except Exception as e:
+            print(f"Job {job.id} state write failed:", e)
+
+    def submit(self, kind: str, user: str, fn, *args, job_id: str | None = None, **params) -> str:
+        """
+        Run `fn(job, *args)` in the background. Passing an existing
+        `job_id` resumes that job; `fn` is expected to be idempotent.
+        """
+        job_id = job_id or secrets.token_urlsafe(16)
+        state = {
+            "id": job_id,
+            "kind": kind,
+            "user": user,
+            "status": "queued",
+            "progress": 0,
+            "created": datetime.utcnow(),
+            **params,
+        }
+        job = Job(self, job_id, kind, user, state)
+        with self._lock:
+            self._prune(time.monotonic())
+            self._jobs[job_id] = job
+        job.update(force=True)
+        self._leaser.ensure()
+
+        self._executor.submit(self._run, job, fn, args)
+        return job_id
+
+    def _run(self, job: Job, fn, args):
+        job.update(status="running", force=True)
+        try:
+            result = fn(job, *args) or {}
+        except Exception as e:
+            print(f"Job {job.id} ({job.kind}) failed:", e)
+            job.update(status="failed", error=str(e), force=True)
+        else:
+            job.update(status="done", **result, force=True)
+        job.finished = time.monotonic()
+
+    def _prune(self, now: float):
+        # caller holds self._lock
+        for job_id in [
+            i for i, j in self._jobs.items()
+            if j.finished is not None and now - j.finished > self.keep_finished
+        ]:
+            del self._jobs[job_id]
+
+    def status(self, job_id: str) -> dict | None:
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job:
+            return _public(job.state)
+
+        doc = self._ref(job_id).get()
+        return _public(doc.to_dict()) if doc.exists else None
+
+    def unfinished(self, kind: str) -> list:
+        """
+        Jobs of `kind` left queued or running whose lease has lapsed:
+        their worker is gone.
+        """
+        docs = (
+            self.db.collection("jobs")
+            .where("kind", "==", kind)
+            .where("status", "in", ["queued", "running"])
+            .stream()
+        )
+        with self._lock:
+            local = set(self._jobs)
+        states = [d.to_dict() for d in docs if d.id not in local]
+        now = time.time()
+        return [s for s in states if (s.get("lease_until") or 0) <= now]
+
+    def _claim(self, job_id: str) -> dict | None:
+        """
+        Take over an abandoned job. The read and the lease write are one
+        transaction, so of several workers trying at once exactly one
+        gets the state back; the others get None.
+        """
+        from firebase_admin import firestore
+
+        ref = self._ref(job_id)
+
+        @firestore.transactional
+        def claim(transaction):
+            snap = ref.get(transaction=transaction)
+            if not snap.exists:
+                return None
+            state = snap.to_dict()
+            if state.get("status") not in ("queued", "running"):
+                return None
+            if (state.get("lease_until") or 0) > time.time():
+                return None
+            transaction.update(ref, {"owner": self.owner, "lease_until": time.time() + self.lease})
+            return state
+
+        return claim(self.db.transaction())
+
+    def resume(self, kind: str, fn, args_from_state):
+        """
+        Re-submit unfinished `kind` jobs whose worker is gone, under their
+        original ids: now, and whenever another lease lapses later. Runs
+        off the request path so startup never waits.
+        """
+        with self._lock:
+            self._resumable[kind] = (fn, args_from_state)
+        self._leaser.ensure()
+
+    def _resume(self, kind: str, fn, args_from_state):
+        try:
+            states = self.unfinished(kind)
+        except Exception as e:
+            print(f"Could not look up unfinished {kind} jobs:", e)
+            return
+        for state in states:
+            try:
+                claimed = self._claim(state["id"])
+            except Exception as e:
+                print(f"Could not claim {kind} job {state['id']}:", e)
+                continue
+            if claimed is None:
+                continue  # another worker got it first
+            print(f"Resuming {kind} job {state['id']}")
+            self.submit(kind, claimed["user"], fn, *args_from_state(claimed), job_id=state["id"])
+
+    def _lease_loop(self):
+        while True:
+            with self._lock:
+                self._prune(time.monotonic())
+                live = [j for j in self._jobs.values() if j.state.get("status") in ("queued", "running")]
+                kinds = list(self._resumable.items())
+            for job in live:
+                job.update(force=True)
+            for kind, (fn, args_from_state) in kinds:
+                self._resume(kind, fn, args_from_state)
+            time.sleep(self.lease / 3)
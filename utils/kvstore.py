@@ -0,0 +1,217 @@
+# utils/kvstore.py
+import heapq
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from utils.lazy import BackgroundThread
+
+SWEEP_INTERVAL = 30  # seconds
+
+# the repo root, so the default path does not depend on the working directory
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+KV_PATH = os.getenv("KV_PATH", os.path.join(_ROOT, "instance", "kv.sqlite3"))
+
+
+class MemoryStore:
+    """
+    Per-process TTL store. Expiries sit in a min-heap so the sweeper only
+    touches keys that are actually due, instead of scanning everything.
+    Only suitable for a single worker.
+    """
+
+    def __init__(self, sweep_interval=SWEEP_INTERVAL):
+        self._data = {}  # key -> (expires, value)
+        self._heap = []  # (expires, key)
+        self._lock = threading.Lock()
+        self._sweep_interval = sweep_interval
+        self._sweeper = BackgroundThread(self._sweep_loop, "kv-sweeper")
+
+    def _sweep_loop(self):
+        while True:
+            time.sleep(self._sweep_interval)
+            self.sweep()
+
+    def sweep(self) -> int:
+        now = time.time()
+        removed = 0
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                expires, key = heapq.heappop(self._heap)
+                item = self._data.get(key)
+                # stale heap entries (key was re-set later) are skipped
+                if item and item[0] == expires:
+                    del self._data[key]
+                    removed += 1
+        return removed
+
+    def get(self, key: str):
+        with self._lock:
+            item = self._data.get(key)
+            if not item:
+                return None
+            if item[0] <= time.time():
+                del self._data[key]
+                return None
+            return dict(item[1])
+
+    def set(self, key: str, value: dict, ttl: float):
+        self._sweeper.ensure()
+        expires = time.time() + ttl
+        with self._lock:
+            self._data[key] = (expires, dict(value))
+            heapq.heappush(self._heap, (expires, key))
+
+    def set_many(self, items):
+        """
+        set() for each (key, value, ttl) in `items`.
+        """
+        for key, value, ttl in items:
+            self.set(key, value, ttl)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def items(self, prefix: str) -> dict:
+        """
+        Every live record whose key starts with `prefix`, by key.
+        """
+        now = time.time()
+        with self._lock:
+            return {
+                k: dict(v) for k, (exp, v) in self._data.items()
+                if k.startswith(prefix) and exp > now
+            }
+
+    def incr(self, key: str, field: str, amount: int = 1) -> dict | None:
+        """
+        Bump `field` of the record at `key`, keeping its expiry, and
+        return the updated record; None if the key is missing or expired.
+        Atomic, so concurrent callers each see a distinct count.
+        """
+        with self._lock:
+            item = self._data.get(key)
+            if not item or item[0] <= time.time():
+                return None
+            item[1][field] = item[1].get(field, 0) + amount
+            return dict(item[1])
+
+
+class SQLiteStore:
+    """
+    TTL store shared by every worker on the host: one SQLite file in WAL
+    mode, so readers never block the writer. Each thread gets its own
+    connection; expired rows are swept periodically by whoever writes.
+    """
+
+    def __init__(self, path: str, sweep_interval=SWEEP_INTERVAL):
+        self.path = os.path.abspath(path)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._local = threading.local()
+        self._sweep_interval = sweep_interval
+        self._next_sweep = 0.0
+
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS kv ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " expires REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS kv_expires ON kv (expires)")
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _maybe_sweep(self, conn):
+        now = time.time()
+        if now >= self._next_sweep:
+            self._next_sweep = now + self._sweep_interval
+            conn.execute("DELETE FROM kv WHERE expires <= ?", (now,))
+
+    def sweep(self) -> int:
+        cur = self._conn().execute("DELETE FROM kv WHERE expires <= ?", (time.time(),))
+        return cur.rowcount
+
+    def get(self, key: str):
+        row = self._conn().execute(
+            "SELECT value FROM kv WHERE key = ? AND expires > ?", (key, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, key: str, value: dict, ttl: float):
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO kv (key, value, expires) VALUES (?, ?, ?)",
+            (key, json.dumps(value), time.time() + ttl),
+        )
+        self._maybe_sweep(conn)
+
+    def set_many(self, items):
+        # one transaction, so one WAL commit for the whole batch
+        conn = self._conn()
+        now = time.time()
+        rows = [(key, json.dumps(value), now + ttl) for key, value, ttl in items]
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT OR REPLACE INTO kv (key, value, expires) VALUES (?, ?, ?)", rows
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        self._maybe_sweep(conn)
+
+    def delete(self, key: str):
+        self._conn().execute("DELETE FROM kv WHERE key = ?", (key,))
+
+    def items(self, prefix: str) -> dict:
+        # a key range, so the primary key index does the prefix match
+        rows = self._conn().execute(
+            "SELECT key, value FROM kv WHERE key >= ? AND key < ? AND expires > ?",
+            (prefix, prefix + "\U0010ffff", time.time()),
+        ).fetchall()
+        return {key: json.loads(value) for key, value in rows}
+
+    def incr(self, key: str, field: str, amount: int = 1) -> dict | None:
+        # BEGIN IMMEDIATE takes the write lock before the read, so the
+        # read-modify-write can't interleave with another worker's
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT value FROM kv WHERE key = ? AND expires > ?", (key, time.time())
+            ).fetchone()
+            if not row:
+                conn.execute("COMMIT")
+                return None
+            value = json.loads(row[0])
+            value[field] = value.get(field, 0) + amount
+            conn.execute("UPDATE kv SET value = ? WHERE key = ?", (json.dumps(value), key))
+            conn.execute("COMMIT")
+            return value
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+
+def create_store():
+    """
+    KV_BACKEND=memory (single worker) or sqlite (default; shared by all
+    workers on the host through KV_PATH).
+    """
+    backend = os.getenv("KV_BACKEND", "sqlite").lower()
+    if backend == "memory":
+        return MemoryStore()
+    return SQLiteStore(KV_PATH)
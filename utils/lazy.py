@@ -0,0 +1,77 @@
+# utils/lazy.py
+import os
+import threading
+
+
+class Lazy:
+    """
+    Stands in for an expensive object (a network client, a parsed
+    secrets file) and builds it on first attribute access, once per
+    process. Importing the app therefore connects to nothing, and a
+    preloaded gunicorn master never hands its forked workers a client
+    it opened itself.
+
+        db = Lazy(connect_firestore)
+        db.collection("users")   # connects here, in this process
+
+    Every attribute, `get` included, is the wrapped object's, so a lazy
+    KV store is used exactly like the store itself.
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._obj = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _resolve(self):
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._obj = self._factory()
+                    self._pid = os.getpid()
+        return self._obj
+
+    @property
+    def loaded(self) -> bool:
+        return self._pid == os.getpid()
+
+    def __getattr__(self, name):
+        return getattr(self._resolve(), name)
+
+
+class BackgroundThread:
+    """
+    A daemon thread running `target`, started by the first ensure() in
+    each process. A forked gunicorn worker inherits the object but not
+    the thread, so it starts its own; a thread that died is restarted.
+    `on_start`, if given, runs under the lock just before each start, to
+    reset state the previous thread (or process) left behind.
+
+        self._worker = BackgroundThread(self._run, "mailer")
+        self._worker.ensure()   # in every method that queues work
+    """
+
+    def __init__(self, target, name: str, on_start=None):
+        self._target = target
+        self.name = name
+        self._on_start = on_start
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive() and self._pid == os.getpid()
+
+    def ensure(self):
+        if self.running:
+            return
+        with self._lock:
+            if self.running:
+                return
+            if self._on_start is not None:
+                self._on_start()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._target, name=self.name, daemon=True)
+            self._thread.start()
@@ -1,20 +1,238 @@
 # utils/location.py
-import requests
+import ipaddress
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor
 
-def detect_location(ip: str):
+from utils.cache import TTLCache
+
+UNKNOWN = "Unknown location"
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GEOIP_PATH = os.getenv("GEOIP_PATH", os.path.join(_ROOT, "instance", "geoip.bin"))
+GEOIP_CSV = os.getenv("GEOIP_CSV", os.path.join(_ROOT, "data", "geoip.csv"))
+
+# one entry per /24: neighbours on the same prefix share a location
+_cache = TTLCache(maxsize=20000, ttl=24 * 3600, negative_ttl=600)
+_remote = ThreadPoolExecutor(max_workers=2, thread_name_prefix="geoip")
+_inflight = {}  # cache key -> callbacks waiting on its remote lookup
+_inflight_lock = threading.Lock()
+_backoff_until = 0.0
+
+
+def cache_key(ip: str) -> str:
     try:
-        if ip.startswith("127.") or ip == "0.0.0.0":
-            return "Localhost"
+        addr = ipaddress.ip_address(ip)
+    except ValueError:
+        return ip
+    if addr.version == 4:
+        return str(ipaddress.ip_network(f"{ip}/24", strict=False))
+    return str(ipaddress.ip_network(f"{ip}/48", strict=False))
+
+
+# =========================
+# OFFLINE TABLE
+# =========================
+_HEADER = struct.Struct("<4sII")  # magic, count, labels offset
+_MAGIC = b"GEO1"
+
+
+def build_geoip_index(csv_path: str | None = None, out_path: str | None = None) -> int:
+    """
+    data/geoip.csv (cidr,label per line) -> a binary table of sorted
+    IPv4 ranges that OfflineGeoIP can mmap. Returns the range count.
+    """
+    csv_path = csv_path or GEOIP_CSV
+    out_path = out_path or GEOIP_PATH
+    labels, index, rows = [], {}, []
+    with open(csv_path) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            cidr, label = line.split(",", 1)
+            net = ipaddress.ip_network(cidr.strip(), strict=False)
+            if net.version != 4:
+                continue
+            label = label.strip()
+            if label not in index:
+                index[label] = len(labels)
+                labels.append(label)
+            rows.append((int(net.network_address), int(net.broadcast_address), index[label]))
+
+    rows.sort()
+    n = len(rows)
+    body = b"".join((
+        struct.pack(f"<{n}I", *(r[0] for r in rows)),
+        struct.pack(f"<{n}I", *(r[1] for r in rows)),
+        struct.pack(f"<{n}I", *(r[2] for r in rows)),
+    ))
+    labels_offset = _HEADER.size + len(body)
+
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+    # per process: two workers may build it at once
+    tmp = f"{out_path}.{os.getpid()}.part"
+    with open(tmp, "wb") as f:
+        f.write(_HEADER.pack(_MAGIC, n, labels_offset))
+        f.write(body)
+        f.write(json.dumps(labels).encode())
+    os.replace(tmp, out_path)
+    return n
+
+
+class OfflineGeoIP:
+    """
+    Memory-mapped range table: starts[], ends[] and label ids as packed
+    uint32 arrays, searched with bisect. The pages are shared between
+    forked workers and nothing is parsed per lookup.
+    """
+
+    def __init__(self, path: str):
+        self._file = open(path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, n, labels_offset = _HEADER.unpack_from(self._mm, 0)
+        if magic != _MAGIC:
+            raise ValueError(f"{path} is not a geoip table")
+
+        view = memoryview(self._mm)
+        off = _HEADER.size
+        self.starts = view[off:off + 4 * n].cast("I")
+        self.ends = view[off + 4 * n:off + 8 * n].cast("I")
+        self.label_ids = view[off + 8 * n:off + 12 * n].cast("I")
+        self.labels = json.loads(bytes(self._mm[labels_offset:]))
+
+    def lookup(self, ip: str) -> str | None:
+        try:
+            addr = ipaddress.ip_address(ip)
+        except ValueError:
+            return None
+        if addr.version != 4:
+            return None
+
+        value = int(addr)
+        i = bisect_right(self.starts, value) - 1
+        if i >= 0 and value <= self.ends[i]:
+            return self.labels[self.label_ids[i]]
+        return None
+
 
-        res = requests.get(f"https://ipapi.co/{ip}/json/", timeout=3).json()
-        city = res.get("city")
-        country = res.get("country_name")
+_offline = None
+_offline_loaded = False
+_offline_lock = threading.Lock()
 
-        if city and country:
-            return f"{city}, {country}"
-        if country:
-            return country
 
-        return "Unknown location"
+def offline_table() -> OfflineGeoIP | None:
+    """
+    The offline table, built from GEOIP_CSV on first use if GEOIP_PATH
+    doesn't exist yet (or ahead of time: python -m utils.location).
+    None when neither file is there.
+    """
+    global _offline, _offline_loaded
+    if _offline_loaded:
+        return _offline
+    with _offline_lock:
+        if not _offline_loaded:
+            try:
+                if not os.path.exists(GEOIP_PATH) and os.path.exists(GEOIP_CSV):
+                    build_geoip_index()
+                if os.path.exists(GEOIP_PATH):
+                    _offline = OfflineGeoIP(GEOIP_PATH)
+                else:
+                    print(f"GeoIP table unavailable: no {GEOIP_PATH} or {GEOIP_CSV}")
+            except Exception as e:
+                print("GeoIP table unavailable:", e)
+            _offline_loaded = True
+    return _offline
+
+
+# =========================
+# REMOTE ENRICHMENT
+# =========================
+def remote_lookup(ip: str) -> str:
+    global _backoff_until
+    if time.monotonic() < _backoff_until:
+        return UNKNOWN
+
+    import requests  # only needed off the offline path
+
+    try:
+        r = requests.get(f"https://ipapi.co/{ip}/json/", timeout=3)
+        if r.status_code == 429:
+            # rate-limited: stop asking for a while instead of failing every login
+            _backoff_until = time.monotonic() + 300
+            return UNKNOWN
+        res = r.json()
     except Exception:
-        return "Unknown location"
\ No newline at end of file
+        return UNKNOWN
+
+    city = res.get("city")
+    country = res.get("country_name")
+    if city and country:
+        return f"{city}, {country}"
+    if country:
+        return country
+    return UNKNOWN
+
+
+def _enrich(ip: str, key: str):
+    location = UNKNOWN
+    try:
+        location = remote_lookup(ip)
+        _cache.set(key, location if location != UNKNOWN else "")
+    except Exception as e:
+        print("GeoIP enrichment error:", e)
+    finally:
+        with _inflight_lock:
+            callbacks = _inflight.pop(key, [])
+
+    if location == UNKNOWN:
+        return
+    for on_resolved in callbacks:
+        try:
+            on_resolved(location)
+        except Exception as e:
+            print("GeoIP callback error:", e)
+
+
+def detect_location(ip: str, on_resolved=None) -> str:
+    """
+    Never blocks on the network: answers from the cache or the offline
+    table, otherwise returns "Unknown location" and looks the IP up in
+    the background, calling `on_resolved(location)` if that finds one.
+    """
+    if ip.startswith("127.") or ip == "0.0.0.0" or ip == "::1":
+        return "Localhost"
+
+    key = cache_key(ip)
+    cached = _cache.get(key)
+    if cached is not None:
+        return cached or UNKNOWN
+
+    table = offline_table()
+    if table:
+        found = table.lookup(ip)
+        if found:
+            _cache.set(key, found)
+            return found
+
+    # one lookup per prefix at a time; later logins wait on the same one
+    with _inflight_lock:
+        waiting = _inflight.get(key)
+        if waiting is None:
+            waiting = _inflight[key] = []
+            start = True
+        else:
+            start = False
+        if on_resolved:
+            waiting.append(on_resolved)
+    if start:
+        _remote.submit(_enrich, ip, key)
+    return UNKNOWN
+
+
+if __name__ == "__main__":
+    print(f"{build_geoip_index()} ranges -> {GEOIP_PATH}")
@@ -0,0 +1,152 @@
+# utils/mailer.py
+import atexit
+import os
+import queue
+import smtplib
+import time
+
+from utils.lazy import BackgroundThread
+from utils.metrics import SMTP_SECONDS
+
+MAIL_QUEUE_SIZE = 1000
+MAIL_RETRIES = 4
+IDLE_CLOSE_AFTER = 60  # seconds; Gmail drops idle connections anyway
+
+
+def smtp_settings() -> dict:
+    # read on use: app.py loads .env after this module is imported
+    return {
+        "host": os.getenv("SMTP_HOST", "smtp.gmail.com"),
+        "port": int(os.getenv("SMTP_PORT", "465")),
+        "ssl": os.getenv("SMTP_SSL", "1") != "0",
+        "user": os.getenv("EMAIL_ADDRESS"),
+        "password": os.getenv("EMAIL_PASSWORD"),
+    }
+
+
+def is_permanent(e: Exception) -> bool:
+    # 5xx: the server has said no for good; 4xx and dropped connections may pass later
+    if isinstance(e, smtplib.SMTPRecipientsRefused):
+        return True
+    if isinstance(e, smtplib.SMTPResponseException):
+        return e.smtp_code >= 500
+    return False
+
+
+class Mailer:
+    """
+    Outbound mail queue. Request handlers call `send()`, which only
+    enqueues; one background worker keeps an authenticated SMTP
+    connection open across messages, reconnects when it drops, and
+    retries failed sends with exponential backoff. Permanent failures
+    (a refused recipient, any 5xx reply) are not retried: they would
+    fail again and hold up every message queued behind them.
+    """
+
+    def __init__(self, maxsize=MAIL_QUEUE_SIZE, retries=MAIL_RETRIES):
+        self._queue = queue.Queue(maxsize=maxsize)
+        self.retries = retries
+        self._smtp = None
+        self._worker = BackgroundThread(self._run, "mailer", on_start=self._forget_connection)
+
+        self.sent = 0
+        self.failed = 0
+        self.connects = 0
+
+    def configured(self) -> bool:
+        cfg = smtp_settings()
+        return bool(cfg["user"] and cfg["password"])
+
+    def _forget_connection(self):
+        # a connection opened by the parent process or a dead thread
+        self._smtp = None
+
+    def send(self, to: str, msg) -> bool:
+        """
+        Queue `msg` (an email.message.Message) for `to`. Returns False if
+        mail is not configured or the queue is full.
+        """
+        if not self.configured():
+            print("Missing email credentials")
+            return False
+
+        self._worker.ensure()
+        try:
+            self._queue.put_nowait((to, msg.as_string()))
+        except queue.Full:
+            print("Mail queue full, dropping message to", to)
+            return False
+        return True
+
+    def _connect(self):
+        cfg = smtp_settings()
+        if cfg["ssl"]:
+            smtp = smtplib.SMTP_SSL(cfg["host"], cfg["port"], timeout=15)
+        else:
+            smtp = smtplib.SMTP(cfg["host"], cfg["port"], timeout=15)
+        smtp.login(cfg["user"], cfg["password"])
+        self.connects += 1
+        return smtp
+
+    def _close(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except Exception:
+                pass
+            self._smtp = None
+
+    def _deliver(self, to: str, raw: str):
+        if self._smtp is None:
+            self._smtp = self._connect()
+        self._smtp.sendmail(smtp_settings()["user"], to, raw)
+
+    def _run(self):
+        while True:
+            try:
+                to, raw = self._queue.get(timeout=IDLE_CLOSE_AFTER)
+            except queue.Empty:
+                self._close()
+                continue
+
+            for attempt in range(self.retries):
+                start = time.perf_counter()
+                try:
+                    self._deliver(to, raw)
+                    SMTP_SECONDS.observe(time.perf_counter() - start, result="ok")
+                    self.sent += 1
+                    break
+                except Exception as e:
+                    SMTP_SECONDS.observe(time.perf_counter() - start, result="error")
+                    print(f"Mail to {to} failed (attempt {attempt + 1}):", e)
+                    if is_permanent(e):
+                        # smtplib has reset the session; the connection is fine
+                        self.failed += 1
+                        break
+                    # the connection is suspect after any other error
+                    self._close()
+                    if attempt + 1 < self.retries:
+                        time.sleep(min(30, 0.5 * 2 ** attempt))
+            else:
+                self.failed += 1
+
+            self._queue.task_done()
+
+    def flush(self, timeout: float = 10.0):
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            if not self._worker.running:
+                break
+            time.sleep(0.05)
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self._queue.qsize(),
+            "sent": self.sent,
+            "failed": self.failed,
+            "connects": self.connects,
+        }
+
+
+mailer = Mailer()
+atexit.register(mailer.flush)
@@ -0,0 +1,270 @@
+# utils/message_sink.py
+import atexit
+import os
+import queue
+import threading
+import time
+
+from utils.lazy import BackgroundThread
+from utils.metrics import FIRESTORE_SECONDS, SINK_DROPPED
+
+# most writes Firestore accepts in one batch; every batched writer uses it
+FIRESTORE_BATCH_LIMIT = 500
+
+# queue entry (_BARRIER, event): set once everything queued before it is written
+_BARRIER = object()
+
+
+def is_transient(e: Exception) -> bool:
+    # worth retrying as is; anything else (InvalidArgument, a document
+    # over the size limit) fails the same way every time
+    if isinstance(e, (ConnectionError, TimeoutError)):
+        return True
+    try:
+        from google.api_core import exceptions
+    except ImportError:
+        return False
+    return isinstance(e, (
+        exceptions.ServiceUnavailable,
+        exceptions.DeadlineExceeded,
+        exceptions.Aborted,
+        exceptions.ResourceExhausted,
+    ))
+
+
+class MessageSink:
+    """
+    Write-behind buffer for chat messages.
+
+    `put()` only enqueues; a background worker drains the queue into
+    Firestore batch writes whenever `max_batch` docs are waiting or
+    `flush_interval` seconds have passed. The queue is bounded: when it
+    is full, callers block for up to `put_timeout` seconds and then write
+    their doc synchronously, so memory stays capped.
+
+    A batch failing with a transient error (Firestore unavailable,
+    overloaded, timing out) is retried with backoff, capped at
+    `max_backoff` seconds, until Firestore takes it; meanwhile the queue
+    fills up and backpressure pushes callers onto synchronous writes.
+    Any other error is permanent: the batch's documents are retried one
+    by one and those that still fail are dropped. Drops, and messages
+    still unwritten when a shutdown `flush()` times out, are counted in
+    `dropped` and in ghost_message_sink_dropped_total.
+
+    `on_commit(docs)` is called with the new message docs once they are
+    actually in Firestore.
+    """
+
+    def __init__(self, db, collection, max_batch=200, flush_interval=0.25,
+                 max_queue=10000, put_timeout=1.0, max_backoff=5.0, on_commit=None):
+        self.db = db
+        self.collection = collection
+        self.on_commit = on_commit
+        self.max_batch = min(max_batch, FIRESTORE_BATCH_LIMIT)
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.max_backoff = max_backoff
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        # started on first use so a forked gunicorn worker gets its own thread
+        self._worker = BackgroundThread(self._run, "message-sink")
+        self._stats_lock = threading.Lock()
+
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.sync_writes = 0
+        self.flushes = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self._flush_ms_total = 0.0
+
+    def put(self, doc: dict, ref=None):
+        """
+        Queue `doc` as a new message, or, with `ref`, as a merge-set on
+        that document (e.g. a conversation index entry) in the same batch.
+        """
+        self._worker.ensure()
+        try:
+            self._queue.put((ref, doc), timeout=self.put_timeout)
+        except queue.Full:
+            # backpressure: the caller pays for its own write
+            with FIRESTORE_SECONDS.time(op="sync_write"):
+                if ref is None:
+                    self.collection.add(doc)
+                else:
+                    ref.set(doc, merge=True)
+            with self._stats_lock:
+                self.sync_writes += 1
+                self.written += 1
+            self._committed([(ref, doc)])
+            return
+        with self._stats_lock:
+            self.enqueued += 1
+
+    def _drain(self, first=None) -> list:
+        items = [] if first is None else [first]
+        deadline = time.monotonic() + self.flush_interval
+        while len(items) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    items.append(self._queue.get_nowait())
+                else:
+                    items.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return items
+
+    def _write(self, items: list, deadline: float | None = None):
+        """
+        Commit `items` as one batch, retrying transient errors with
+        backoff. Returns None once committed, else the error that ended
+        it: a permanent one, or a transient one still failing at
+        `deadline`.
+        """
+        attempt = 0
+        while True:
+            start = time.perf_counter()
+            try:
+                batch = self.db.batch()
+                for ref, doc in items:
+                    if ref is None:
+                        batch.set(self.collection.document(), doc)
+                    else:
+                        batch.set(ref, doc, merge=True)
+                batch.commit()
+            except Exception as e:
+                attempt += 1
+                print(f"Message sink flush failed (attempt {attempt}):", e)
+                if not is_transient(e):
+                    return e
+                delay = min(self.max_backoff, 0.2 * 2 ** min(attempt - 1, 10))
+                if deadline is not None and time.monotonic() + delay > deadline:
+                    return e
+                time.sleep(delay)
+                continue
+
+            ms = (time.perf_counter() - start) * 1000
+            FIRESTORE_SECONDS.observe(ms / 1000, op="batch_commit")
+            with self._stats_lock:
+                self.flushes += 1
+                self.written += len(items)
+                self.last_flush_ms = ms
+                self.max_flush_ms = max(self.max_flush_ms, ms)
+                self._flush_ms_total += ms
+            self._committed(items)
+            return None
+
+    def _commit(self, items: list, deadline: float | None = None):
+        error = self._write(items, deadline)
+        if error is None:
+            return
+        if is_transient(error):
+            # only at a shutdown deadline: Firestore is still down
+            self._drop(len(items))
+            return
+
+        # one bad document must not sink the whole batch, nor block the
+        # worker: write them one by one and give up on those that fail
+        lost = sum(1 for item in items if self._write([item], deadline) is not None)
+        if lost:
+            self._drop(lost)
+
+    def _drop(self, n: int):
+        with self._stats_lock:
+            self.dropped += n
+        SINK_DROPPED.inc(n)
+        print(f"Message sink dropped {n} messages")
+
+    def _committed(self, items: list):
+        docs = [doc for ref, doc in items if ref is None]
+        if not docs or not self.on_commit:
+            return
+        try:
+            self.on_commit(docs)
+        except Exception as e:
+            print("Message sink commit callback failed:", e)
+
+    def _process(self, items: list, deadline: float | None = None):
+        docs = [item for item in items if item[0] is not _BARRIER]
+        if docs:
+            self._commit(docs, deadline)
+        for ref, doc in items:
+            if ref is _BARRIER:
+                doc.set()
+        for _ in items:
+            self._queue.task_done()
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            self._process(self._drain(first))
+
+    def barrier(self, timeout: float = 30.0) -> bool:
+        """
+        Wait until every message queued before this call has been
+        written (or given up on); later ones don't hold it up. Returns
+        False on timeout.
+        """
+        self._worker.ensure()
+        done = threading.Event()
+        deadline = time.monotonic() + timeout
+        try:
+            self._queue.put((_BARRIER, done), timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(max(0.0, deadline - time.monotonic()))
+
+    def flush(self, timeout: float = 10.0):
+        """
+        Write out everything still queued (called at shutdown).
+        """
+        if self._worker.running:
+            deadline = time.monotonic() + timeout
+            while self._queue.unfinished_tasks and time.monotonic() < deadline:
+                time.sleep(0.01)
+            lost = self._queue.unfinished_tasks
+            if lost:
+                with self._stats_lock:
+                    self.dropped += lost
+                SINK_DROPPED.inc(lost)
+                print(f"Message sink dropped {lost} messages at shutdown")
+            return
+
+        # no live worker in this process: drain inline, giving up on
+        # whatever Firestore still refuses at the deadline
+        deadline = time.monotonic() + timeout
+        while True:
+            items = self._drain()
+            if not items:
+                return
+            self._process(items, deadline)
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "queue_max": self._queue.maxsize,
+                "enqueued": self.enqueued,
+                "written": self.written,
+                "sync_writes": self.sync_writes,
+                "dropped": self.dropped,
+                "flushes": self.flushes,
+                "last_flush_ms": round(self.last_flush_ms, 2),
+                "max_flush_ms": round(self.max_flush_ms, 2),
+                "avg_flush_ms": round(self._flush_ms_total / self.flushes, 2) if self.flushes else 0.0,
+            }
+
+
+def create_message_sink(db, collection, on_commit=None) -> MessageSink:
+    sink = MessageSink(
+        db,
+        collection,
+        on_commit=on_commit,
+        max_batch=int(os.getenv("MESSAGE_SINK_BATCH", "200")),
+        flush_interval=float(os.getenv("MESSAGE_SINK_INTERVAL", "0.25")),
+        max_queue=int(os.getenv("MESSAGE_SINK_QUEUE", "10000")),
+    )
+    atexit.register(sink.flush)
+    return sink
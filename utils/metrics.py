@@ -0,0 +1,327 @@
+# utils/metrics.py
+import abc
+import os
+import threading
+import time
+from bisect import bisect_left
+from functools import wraps
+
+from utils.kvstore import create_store
+from utils.lazy import BackgroundThread, Lazy
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# how often each worker copies its metrics into the shared KV store
+METRICS_PUBLISH_INTERVAL = float(os.getenv("METRICS_PUBLISH_INTERVAL", "5"))
+
+REGISTRY = []
+
+
+class _Metric(abc.ABC):
+    """
+    Every thread writes into its own shard (a plain dict), so recording
+    never takes a lock or contends with other threads; `collect()` sums
+    the shards. Shards of threads that have exited are folded into
+    `_retired` so per-request threads don't pile up.
+    """
+
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards = []  # (thread, shard)
+        self._retired = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _shard(self) -> dict:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._shards.append((threading.current_thread(), shard))
+        return shard
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    @abc.abstractmethod
+    def _merge(self, into: dict, shard: dict):
+        """
+        Add the values of `shard` into `into`.
+        """
+
+    @abc.abstractmethod
+    def render(self, data: dict, extra: str = "") -> list:
+        """
+        Exposition lines for `data` (as returned by collect()), with
+        `extra` added to every series' labels.
+        """
+
+    def collect(self) -> dict:
+        with self._lock:
+            alive = []
+            for thread, shard in self._shards:
+                if thread.is_alive():
+                    alive.append((thread, shard))
+                else:
+                    self._merge(self._retired, shard)
+            self._shards = alive
+
+            total = {}
+            self._merge(total, self._retired)
+            for _, shard in alive:
+                self._merge(total, shard)
+        return total
+
+    def _labels(self, key: tuple, *extra: str) -> str:
+        parts = [f'{n}="{v}"' for n, v in zip(self.labelnames, key)]
+        parts.extend(e for e in extra if e)
+        return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        shard = self._shard()
+        key = self._key(labels)
+        shard[key] = shard.get(key, 0) + amount
+
+    def _merge(self, into, shard):
+        for key, value in list(shard.items()):
+            into[key] = into.get(key, 0) + value
+
+    def render(self, data, extra=""):
+        return [f"{self.name}{self._labels(k, extra)} {v}" for k, v in sorted(data.items())]
+
+
+class _Timer:
+    def __init__(self, hist, labels):
+        self.hist = hist
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.hist.observe(time.perf_counter() - self.start, **self.labels)
+        return False
+
+    def __call__(self, fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with _Timer(self.hist, self.labels):
+                return fn(*args, **kwargs)
+        return wrapper
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        shard = self._shard()
+        key = self._key(labels)
+        row = shard.get(key)
+        if row is None:
+            # one slot per bucket, one for +Inf, then the sum
+            row = shard[key] = [0] * (len(self.buckets) + 2)
+        row[bisect_left(self.buckets, value)] += 1
+        row[-1] += value
+
+    def time(self, **labels) -> _Timer:
+        """
+        with STAGE.time(stage="x"): ...   or   @STAGE.time(stage="x")
+        """
+        return _Timer(self, labels)
+
+    def _merge(self, into, shard):
+        for key, row in list(shard.items()):
+            acc = into.setdefault(key, [0] * len(row))
+            for i, v in enumerate(list(row)):
+                acc[i] += v
+
+    def render(self, data, extra=""):
+        lines = []
+        for key, row in sorted(data.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets, row):
+                cumulative += n
+                le = self._labels(key, extra, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            cumulative += row[len(self.buckets)]
+            le = self._labels(key, extra, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{le} {cumulative}")
+            lines.append(f"{self.name}_sum{self._labels(key, extra)} {row[-1]}")
+            lines.append(f"{self.name}_count{self._labels(key, extra)} {cumulative}")
+        return lines
+
+
+def snapshot() -> dict:
+    """
+    This process's values of everything in REGISTRY, JSON-safe.
+    """
+    return {m.name: [[list(k), v] for k, v in m.collect().items()] for m in REGISTRY}
+
+
+def render_metrics(snapshots: dict | None = None) -> str:
+    """
+    Everything in REGISTRY in the Prometheus text exposition format: this
+    process's values, or `snapshots` ({worker: snapshot()}) with every
+    series labelled worker="<worker>".
+    """
+    if snapshots is None:
+        snapshots = {"": snapshot()}
+    out = []
+    for metric in REGISTRY:
+        out.append(f"# HELP {metric.name} {metric.help}")
+        out.append(f"# TYPE {metric.name} {metric.kind}")
+        for worker, snap in sorted(snapshots.items()):
+            data = {tuple(k): v for k, v in snap.get(metric.name, [])}
+            out.extend(metric.render(data, f'worker="{worker}"' if worker else ""))
+    return "\n".join(out) + "\n"
+
+
+class WorkerMetrics:
+    """
+    Lets one scrape see every worker on the host, not whichever one the
+    request happened to reach. Each worker copies its snapshot() into the
+    shared KV store as `metrics:<pid>` every `interval` seconds; /metrics
+    publishes the serving worker's own first, then renders them all, each
+    series labelled worker="<pid>".
+
+    Series are per worker, not summed: a restarted worker starts again
+    from zero under a new pid, like any restarted process, so
+    sum(rate(...)) over `worker` stays right. A worker that exits drops
+    out after a few intervals. Other workers' values trail by up to
+    `interval`.
+    """
+
+    def __init__(self, store, interval=METRICS_PUBLISH_INTERVAL):
+        self.store = store
+        self.interval = interval
+        self._thread = BackgroundThread(self._run, "metrics")
+
+    def start(self):
+        self._thread.ensure()
+
+    def _run(self):
+        while True:
+            self.publish()
+            time.sleep(self.interval)
+
+    def publish(self):
+        try:
+            self.store.set(f"metrics:{os.getpid()}", snapshot(), self.interval * 3)
+        except Exception as e:
+            print("Metrics publish error:", e)
+
+    def render(self) -> str:
+        self.start()
+        self.publish()
+        try:
+            snapshots = {
+                key.rpartition(":")[2]: snap for key, snap in self.store.items("metrics:").items()
+            }
+        except Exception as e:
+            print("Metrics read error:", e)
+            snapshots = {}
+        # this worker always answers, even if the store is unavailable
+        snapshots.setdefault(str(os.getpid()), snapshot())
+        return render_metrics(snapshots)
+
+
+# =========================
+# INSTRUMENTS
+# =========================
+RETRIEVAL_SECONDS = Histogram(
+    "ghost_retrieval_seconds", "Retrieval source latency, including late finishes.", ("source",)
+)
+RETRIEVAL_MISSED = Counter(
+    "ghost_retrieval_deadline_missed_total", "Sources dropped from a turn for being late.", ("source",)
+)
+RETRIEVAL_SKIPPED = Counter(
+    "ghost_retrieval_skipped_total", "Sources not started because the retrieval pool was full.", ("source",)
+)
+STAGE_SECONDS = Histogram(
+    "ghost_stream_stage_seconds", "Time spent in each stage of a chat turn.", ("stage",)
+)
+STREAMS = Counter(
+    "ghost_streams_total", "Chat turns by where the answer came from.", ("source",)
+)
+FIRST_TOKEN_SECONDS = Histogram(
+    "ghost_llm_first_token_seconds", "From the Groq request to its first streamed token."
+)
+TOKENS_PER_SECOND = Histogram(
+    "ghost_llm_tokens_per_second", "Groq streaming rate after the first token.",
+    buckets=(5, 10, 25, 50, 100, 200, 400, 800, 1600),
+)
+LLM_TOKENS = Counter(
+    "ghost_llm_tokens_total", "Streamed completion chunks (about one token each)."
+)
+SSE_BYTES = Counter(
+    "ghost_sse_bytes_total", "Bytes of SSE frames written to clients."
+)
+FIRESTORE_SECONDS = Histogram(
+    "ghost_firestore_seconds", "Firestore call latency.", ("op",)
+)
+SINK_DROPPED = Counter(
+    "ghost_message_sink_dropped_total", "Chat messages never written because Firestore stayed down."
+)
+REPLAY_DROPPED = Counter(
+    "ghost_replay_shared_dropped_total", "Stream events not mirrored to the shared store because its queue was full."
+)
+SMTP_SECONDS = Histogram(
+    "ghost_smtp_send_seconds", "SMTP delivery latency per attempt.", ("result",)
+)
+
+
+class TokenMeter:
+    """
+    Tracks one completion: time to first token, then tokens per second.
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.first = None
+        self.tokens = 0
+
+    def token(self):
+        if self.first is None:
+            self.first = time.perf_counter()
+            FIRST_TOKEN_SECONDS.observe(self.first - self.start)
+        self.tokens += 1
+
+    def finish(self):
+        if not self.tokens:
+            return
+        LLM_TOKENS.inc(self.tokens)
+        elapsed = time.perf_counter() - self.first
+        if self.tokens > 1 and elapsed > 0:
+            TOKENS_PER_SECOND.observe((self.tokens - 1) / elapsed)
+
+
+def count_sse(frames):
+    """
+    Pass SSE frames through, counting their bytes.
+    """
+    try:
+        for frame in frames:
+            SSE_BYTES.inc(len(frame) if isinstance(frame, bytes) else len(frame.encode("utf-8")))
+            yield frame
+    finally:
+        # close the inner generator now so its cleanup (e.g. releasing a
+        # Groq slot) runs when the client goes away
+        frames.close()
+
+
+# every worker on the host publishes here; see WorkerMetrics
+worker_metrics = WorkerMetrics(Lazy(create_store))
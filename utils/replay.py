@@ -0,0 +1,444 @@
+# utils/replay.py
+import asyncio
+import os
+import queue
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+from utils.kvstore import create_store
+from utils.lazy import BackgroundThread, Lazy
+from utils.metrics import REPLAY_DROPPED
+
+# how long a finished reply stays resumable
+SSE_REPLAY_TTL = int(os.getenv("SSE_REPLAY_TTL", "120"))
+# an unfinished stream older than this is dropped anyway
+SSE_REPLAY_MAX_AGE = int(os.getenv("SSE_REPLAY_MAX_AGE", "600"))
+SSE_REPLAY_STREAMS = int(os.getenv("SSE_REPLAY_STREAMS", "1000"))
+SSE_REPLAY_BYTES = int(os.getenv("SSE_REPLAY_BYTES", str(256 * 1024)))  # per stream
+# replies produced at once per worker; each holds a producer thread (WSGI)
+# on top of the response thread of every client following it
+SSE_MAX_PRODUCERS = int(os.getenv("SSE_MAX_PRODUCERS", "64"))
+# how often a follower on another worker checks the shared store
+SSE_REPLAY_POLL = float(os.getenv("SSE_REPLAY_POLL", "0.05"))
+# events waiting for the shared store; past this they are dropped, not queued
+SSE_REPLAY_QUEUE = int(os.getenv("SSE_REPLAY_QUEUE", "10000"))
+
+DONE_FRAME = b"event: done\ndata: {}\n\n"
+
+
+class StreamGone(Exception):
+    """
+    The stream is unknown, expired, someone else's, or has already
+    dropped the events after the client's Last-Event-ID.
+    """
+
+
+class StreamLog:
+    """
+    One reply's SSE events, numbered from 1. The producer appends and
+    closes; any number of readers, sync or async, follow it from a
+    sequence number, so a reconnect picks up where the last one stopped.
+
+    Only the newest `max_bytes` are kept; a reader that fell further
+    behind than that gets StreamGone. With a `writer` (SharedWriter)
+    every event is also mirrored to the shared KV store, for reconnects
+    that land on another worker (see RemoteLog).
+    """
+
+    def __init__(self, stream_id: str, owner: str, max_bytes: int = SSE_REPLAY_BYTES,
+                 writer=None):
+        self.id = stream_id
+        self.owner = owner
+        self.max_bytes = max_bytes
+        self.writer = writer
+        self.created = time.monotonic()
+        self.finished = None
+        self._events = []   # encoded events, seq = self._first + index
+        self._first = 1
+        self._size = 0
+        self._cond = threading.Condition()
+        self._waiters = []  # (loop, future) of async readers
+
+    @property
+    def done(self) -> bool:
+        return self.finished is not None
+
+    @property
+    def last_seq(self) -> int:
+        return self._first + len(self._events) - 1
+
+    def event_id(self, seq: int) -> str:
+        return f"{self.id}-{seq}"
+
+    def append(self, frame: bytes):
+        """
+        Number `frame` (an encoded SSE frame without an id line) and
+        keep it for readers.
+        """
+        with self._cond:
+            seq = self.last_seq + 1
+            event = f"id: {self.event_id(seq)}\n".encode() + frame
+            self._events.append(event)
+            self._size += len(event)
+            while self._size > self.max_bytes and len(self._events) > 1:
+                self._size -= len(self._events.pop(0))
+                self._first += 1
+            self._wake()
+        self._share(f"{_key(self.id)}:{seq}", {"event": event.decode("utf-8")}, SSE_REPLAY_MAX_AGE)
+
+    def _share(self, key: str, value: dict, ttl: float):
+        if self.writer is not None:
+            self.writer.put(key, value, ttl)
+
+    def close(self):
+        """
+        End the stream with a numbered `done` event, so a client can tell
+        a finished reply from a connection that was cut.
+        """
+        with self._cond:
+            if self.finished is not None:
+                return
+            self.append(DONE_FRAME)
+            self.finished = time.monotonic()
+            self._wake()
+            last = self.last_seq
+        self._share(_key(self.id), {"owner": self.owner, "last": last}, SSE_REPLAY_TTL)
+
+    def _wake(self):
+        self._cond.notify_all()
+        waiters, self._waiters = self._waiters, []
+        for loop, fut in waiters:
+            loop.call_soon_threadsafe(_resolve, fut)
+
+    def _after(self, seq: int) -> list:
+        if seq + 1 < self._first:
+            raise StreamGone(f"events after {self.event_id(seq)} were dropped")
+        return self._events[seq + 1 - self._first:]
+
+    def read(self, after: int, timeout: float | None = None) -> tuple[list, bool]:
+        """
+        Events after sequence number `after`, waiting up to `timeout`
+        seconds for some if there are none yet. Returns (events, done).
+        """
+        with self._cond:
+            events = self._after(after)
+            if not events and not self.done:
+                self._cond.wait(timeout)
+                events = self._after(after)
+            return events, self.done and after + len(events) >= self.last_seq
+
+    async def read_async(self, after: int, timeout: float | None = None) -> tuple[list, bool]:
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        with self._cond:
+            events = self._after(after)
+            if events or self.done:
+                return events, self.done and after + len(events) >= self.last_seq
+            self._waiters.append((loop, fut))
+        try:
+            await asyncio.wait_for(fut, timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._cond:
+                if (loop, fut) in self._waiters:
+                    self._waiters.remove((loop, fut))
+        with self._cond:
+            events = self._after(after)
+            return events, self.done and after + len(events) >= self.last_seq
+
+
+def _key(stream_id: str) -> str:
+    return f"replay:{stream_id}"
+
+
+class SharedWriter:
+    """
+    Mirrors stream events into the shared KV store from a background
+    thread, so neither a producer on the event loop nor one holding a
+    WSGI thread waits on SQLite. Whatever has queued up is written in
+    one set_many() batch; order is kept, so a stream's `last` marker
+    never lands before its final events. While the store lags more than
+    `maxsize` events behind, new ones are dropped and counted: the local
+    followers still get them, only cross-worker resumes miss out.
+    """
+
+    def __init__(self, store, max_batch: int = 500, maxsize: int = SSE_REPLAY_QUEUE):
+        self.store = store
+        self.max_batch = max_batch
+        self._queue = queue.Queue(maxsize)
+        # started on first use so a forked gunicorn worker gets its own thread
+        self._worker = BackgroundThread(self._run, "replay-writer")
+        self._dropped_lock = threading.Lock()
+        self.written = 0
+        self.failed = 0
+        self.dropped = 0
+
+    def put(self, key: str, value: dict, ttl: float):
+        self._worker.ensure()
+        try:
+            self._queue.put_nowait((key, value, ttl))
+        except queue.Full:
+            with self._dropped_lock:
+                self.dropped += 1
+            REPLAY_DROPPED.inc()
+
+    def _run(self):
+        while True:
+            items = [self._queue.get()]
+            while len(items) < self.max_batch:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self.store.set_many(items)
+                self.written += len(items)
+            except Exception as e:
+                # the local followers don't need it; only cross-worker resumes do
+                self.failed += len(items)
+                print("Replay store write error:", e)
+            for _ in items:
+                self._queue.task_done()
+
+    def flush(self, timeout: float = 5.0):
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.005)
+
+
+class RemoteLog:
+    """
+    Read side of a stream another worker is producing, through the
+    shared KV store: `replay:<id>` holds the owner (and, once finished,
+    the last sequence number), `replay:<id>:<seq>` each event. Followers
+    poll every `poll` seconds, so they trail the producer by about that
+    (plus the SharedWriter's lag). The async reader polls from a thread,
+    so the event loop never waits on the store.
+    """
+
+    def __init__(self, stream_id: str, owner: str, store, poll: float = SSE_REPLAY_POLL):
+        self.id = stream_id
+        self.owner = owner
+        self.store = store
+        self.poll = poll
+
+    def _read(self, after: int) -> tuple[list, bool]:
+        events = []
+        while True:
+            item = self.store.get(f"{_key(self.id)}:{after + len(events) + 1}")
+            if not item:
+                break
+            events.append(item["event"].encode("utf-8"))
+        meta = self.store.get(_key(self.id))
+        if meta is None:
+            if events:
+                return events, False
+            raise StreamGone(f"stream {self.id} expired")
+        last = meta.get("last")
+        return events, last is not None and after + len(events) >= last
+
+    def read(self, after: int, timeout: float | None = None) -> tuple[list, bool]:
+        deadline = time.monotonic() + (timeout or 0)
+        while True:
+            events, done = self._read(after)
+            if events or done or time.monotonic() >= deadline:
+                return events, done
+            time.sleep(self.poll)
+
+    async def read_async(self, after: int, timeout: float | None = None) -> tuple[list, bool]:
+        deadline = time.monotonic() + (timeout or 0)
+        while True:
+            events, done = await asyncio.to_thread(self._read, after)
+            if events or done or time.monotonic() >= deadline:
+                return events, done
+            await asyncio.sleep(self.poll)
+
+
+def _resolve(fut):
+    if not fut.done():
+        fut.set_result(None)
+
+
+def parse_event_id(value: str) -> tuple[str, int] | None:
+    stream_id, _, seq = (value or "").strip().rpartition("-")
+    if not stream_id or not seq.isdigit():
+        return None
+    return stream_id, int(seq)
+
+
+class ReplayBuffer:
+    """
+    Recent StreamLogs by stream id. Finished streams are evicted
+    `ttl` seconds after they end, unfinished ones after `max_age`, and
+    the oldest go first once there are more than `maxsize`.
+
+    Streams live in the worker that produces them. With a `shared` store
+    (the KV store from utils/kvstore.py, SQLite by default) a reconnect
+    that reaches another worker on the same host still resumes, by
+    following the copy in the store, written there by a SharedWriter
+    thread. `resume()` may read that store: call it off the event loop.
+    Across hosts, route a user's /stream requests to the same host.
+
+        log = replay_buffer.start(email)           # new reply, None if full
+        log, seq = replay_buffer.resume(email, last_event_id)
+    """
+
+    def __init__(self, maxsize=SSE_REPLAY_STREAMS, ttl=SSE_REPLAY_TTL, max_age=SSE_REPLAY_MAX_AGE,
+                 max_running=SSE_MAX_PRODUCERS, shared=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_age = max_age
+        self.max_running = max_running
+        self.shared = shared
+        self.writer = SharedWriter(shared) if shared is not None else None
+        self._logs = OrderedDict()  # stream id -> StreamLog, oldest first
+        self._lock = threading.Lock()
+
+        self.started = 0
+        self.resumed = 0
+        self.resumed_remote = 0
+        self.gone = 0
+        self.evictions = 0
+        self.refused = 0
+
+    def _expired(self, log: StreamLog, now: float) -> bool:
+        if log.done:
+            return now - log.finished > self.ttl
+        return now - log.created > self.max_age
+
+    def _prune(self, now: float):
+        for stream_id in [s for s, log in self._logs.items() if self._expired(log, now)]:
+            del self._logs[stream_id]
+            self.evictions += 1
+        while len(self._logs) > self.maxsize:
+            self._logs.popitem(last=False)
+            self.evictions += 1
+
+    def _running(self) -> int:
+        return sum(1 for log in self._logs.values() if not log.done)
+
+    def start(self, owner: str) -> StreamLog | None:
+        """
+        A new StreamLog for `owner`, or None when `max_running` replies
+        are already being produced here; callers should turn the request
+        away. The check and the reservation happen under one lock, so
+        concurrent requests cannot both take the last slot.
+        """
+        log = StreamLog(secrets.token_hex(8), owner, writer=self.writer)
+        with self._lock:
+            now = time.monotonic()
+            self._prune(now)
+            if self._running() >= self.max_running:
+                self.refused += 1
+                return None
+            self._logs[log.id] = log
+            self._prune(now)
+            self.started += 1
+        log._share(_key(log.id), {"owner": owner}, self.max_age)
+        return log
+
+    def resume(self, owner: str, last_event_id: str) -> tuple[StreamLog, int]:
+        """
+        The stream a Last-Event-ID belongs to and the sequence number to
+        continue after. Raises StreamGone if it can't be resumed.
+        """
+        parsed = parse_event_id(last_event_id)
+        if not parsed:
+            with self._lock:
+                self.gone += 1
+            raise StreamGone(f"cannot resume {last_event_id!r}")
+        stream_id, seq = parsed
+
+        with self._lock:
+            self._prune(time.monotonic())
+            log = self._logs.get(stream_id)
+            if log is not None and log.owner == owner and seq <= log.last_seq:
+                self.resumed += 1
+                return log, seq
+
+        # produced by another worker: follow it through the shared store
+        remote = self._remote(stream_id, owner, seq) if log is None else None
+        with self._lock:
+            if remote is None:
+                self.gone += 1
+                raise StreamGone(f"cannot resume {last_event_id!r}")
+            self.resumed_remote += 1
+        return remote, seq
+
+    def _remote(self, stream_id: str, owner: str, seq: int) -> RemoteLog | None:
+        if self.shared is None:
+            return None
+        try:
+            meta = self.shared.get(_key(stream_id))
+            if not meta or meta.get("owner") != owner:
+                return None
+            if seq and not self.shared.get(f"{_key(stream_id)}:{seq}"):
+                return None
+        except Exception as e:
+            print("Replay store read error:", e)
+            return None
+        return RemoteLog(stream_id, owner, self.shared)
+
+    def flush(self, timeout: float = 5.0):
+        """
+        Wait until every event produced so far is in the shared store.
+        """
+        if self.writer is not None:
+            self.writer.flush(timeout)
+
+    def stats(self) -> dict:
+        with self._lock:
+            logs = list(self._logs.values())
+        return {
+            "streams": len(logs),
+            "running": sum(1 for log in logs if not log.done),
+            "max_running": self.max_running,
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "shared": self.shared is not None,
+            "shared_written": self.writer.written if self.writer else 0,
+            "shared_failed": self.writer.failed if self.writer else 0,
+            "shared_dropped": self.writer.dropped if self.writer else 0,
+            "started": self.started,
+            "resumed": self.resumed,
+            "resumed_remote": self.resumed_remote,
+            "gone": self.gone,
+            "evictions": self.evictions,
+            "refused": self.refused,
+        }
+
+
+def follow(log, after: int = 0, heartbeat: float = 15.0):
+    """
+    Encoded events of `log` (a StreamLog or RemoteLog) after `after`,
+    until the producer is done.
+    Sends an SSE comment every `heartbeat` seconds of silence so proxies
+    keep the connection open.
+    """
+    while True:
+        events, done = log.read(after, heartbeat)
+        yield from events
+        after += len(events)
+        if done:
+            return
+        if not events:
+            yield b": keep-alive\n\n"
+
+
+async def follow_async(log, after: int = 0, heartbeat: float = 15.0):
+    while True:
+        events, done = await log.read_async(after, heartbeat)
+        for event in events:
+            yield event
+        after += len(events)
+        if done:
+            return
+        if not events:
+            yield b": keep-alive\n\n"
+
+
+# events are mirrored into the KV store shared by the host's workers
+replay_buffer = ReplayBuffer(shared=Lazy(create_store))
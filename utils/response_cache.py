@@ -0,0 +1,232 @@
+# utils/response_cache.py
+"""
+LLM answer cache. An entry is keyed on the prompt and a scope (see
+context_scope); the scope is what trades hit rate against safety.
+
+First turns are scoped on model + retrieved context only, so the same
+question asked by different users, with the same headlines or Wikipedia
+text behind it, is answered once. Follow-up turns add the user and the
+history, which makes them practically unique: they rarely hit, but an
+answer can never carry one conversation's details into another.
+
+The scope needs the retrieved context, so retrieval still runs before
+the lookup (mostly served by the retrieval cache); a hit saves the LLM
+call, not the retrieval stage.
+"""
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+from utils.cache import normalize_query
+
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+# news answers go stale with the headlines; 0 turns caching them off
+RESPONSE_CACHE_NEWS_TTL = int(os.getenv("RESPONSE_CACHE_NEWS_TTL", "120"))
+# Jaccard similarity of character 3-grams needed for a near-duplicate
+# hit; 1.0 (the default) means exact matches only, e.g. 0.9 opts in
+RESPONSE_CACHE_SIMILARITY = float(os.getenv("RESPONSE_CACHE_SIMILARITY", "1.0"))
+
+_PRIME = (1 << 61) - 1
+_NUMBER = re.compile(r"\d+")
+
+
+def context_scope(model: str, live: dict, history: list | None, user: str | None = None) -> str:
+    """
+    Hash of everything besides the question that shapes the answer: the
+    model and the retrieved context, plus, once there is one, the
+    conversation so far and whose it is. A first-turn answer is a
+    function of prompt and context alone, so it is shared between users;
+    a later one can depend on anything said earlier, so it never leaves
+    its conversation.
+    """
+    parts = [model, sorted((live or {}).items())]
+    if history:
+        parts += [user, history]
+    blob = json.dumps(parts, default=str)
+    return hashlib.sha1(blob.encode("utf-8")).hexdigest()[:16]
+
+
+def shingles(text: str, n: int = 3) -> frozenset:
+    padded = f" {text} "
+    if len(padded) <= n:
+        return frozenset((padded,))
+    return frozenset(padded[i:i + n] for i in range(len(padded) - n + 1))
+
+
+def _variant(a: str, b: str) -> bool:
+    # "plant"/"plants", "work"/"working": the same word, inflected
+    short, long = sorted((a, b), key=len)
+    return len(short) >= 4 and long.startswith(short)
+
+
+def same_words(a: str, b: str) -> bool:
+    """
+    True when two prompts differ only by inflections of the same words.
+    A word added, dropped or swapped ("not", "descending" for "ascending",
+    another name) changes the meaning however similar the text looks.
+    """
+    words_a, words_b = a.split(), b.split()
+    extra_a = [w for w in words_a if w not in set(words_b)]
+    extra_b = [w for w in words_b if w not in set(words_a)]
+    if len(extra_a) != len(extra_b):
+        return False
+    return all(_variant(x, y) for x, y in zip(extra_a, extra_b))
+
+
+class MinHasher:
+    """
+    MinHash signatures over shingle sets, from `num_perm` universal hash
+    functions (a*x + b) mod p applied to each shingle's crc32.
+    """
+
+    def __init__(self, num_perm: int = 64, seed: int = 1):
+        rnd = random.Random(seed)
+        self.params = [(rnd.randrange(1, _PRIME), rnd.randrange(0, _PRIME)) for _ in range(num_perm)]
+
+    def signature(self, grams: frozenset) -> tuple:
+        values = [zlib.crc32(g.encode("utf-8")) for g in grams]
+        return tuple(min((a * v + b) % _PRIME for v in values) for a, b in self.params)
+
+
+class ResponseCache:
+    """
+    LLM answers keyed on (scope, normalized prompt). On an exact miss the
+    prompt's MinHash signature is split into `bands` LSH bands; entries
+    sharing a band with it are candidates, and the best one whose true
+    3-gram Jaccard similarity reaches `threshold` and whose words differ
+    only by inflection is served.
+
+    "What is Python?" and "what is python" are the same key. With
+    threshold=0.9, "explain how photosynthesis works in plants" vs "...
+    in plant" is a near-duplicate hit, while "when to use X" vs "when not
+    to use X" is not.
+    """
+
+    def __init__(self, maxsize=5000, ttl=RESPONSE_CACHE_TTL,
+                 threshold=RESPONSE_CACHE_SIMILARITY, num_perm=64, bands=16):
+        assert num_perm % bands == 0
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self._hasher = MinHasher(num_perm)
+        self._entries = OrderedDict()  # (scope, prompt) -> (expires, reply, grams, bands)
+        self._buckets = {}             # (scope, band no, band) -> {keys}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _bands(self, sig: tuple) -> list:
+        return [(i, sig[i * self.rows:(i + 1) * self.rows]) for i in range(self.bands)]
+
+    def _drop(self, key):
+        expires, reply, grams, bands = self._entries.pop(key)
+        scope = key[0]
+        for i, band in bands:
+            bucket = self._buckets.get((scope, i, band))
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[(scope, i, band)]
+
+    def _near(self, scope: str, prompt: str, grams: frozenset, bands: list, now: float):
+        numbers = _NUMBER.findall(prompt)
+        candidates = set()
+        for i, band in bands:
+            candidates |= self._buckets.get((scope, i, band), set())
+
+        best, best_sim = None, self.threshold
+        for key in candidates:
+            expires, reply, other, _ = self._entries[key]
+            # "top 5 ..." and "top 10 ..." are close in text but not in meaning
+            if expires <= now or _NUMBER.findall(key[1]) != numbers:
+                continue
+            if not same_words(prompt, key[1]):
+                continue
+            sim = len(grams & other) / len(grams | other)
+            if sim >= best_sim:
+                best, best_sim = key, sim
+        return best
+
+    def get(self, prompt: str, scope: str) -> str | None:
+        prompt = normalize_query(prompt)
+        key = (scope, prompt)
+        near_ok = self.threshold < 1.0 and prompt
+        if near_ok:
+            # hashing is the expensive part; keep it outside the lock
+            grams = shingles(prompt)
+            bands = self._bands(self._hasher.signature(grams))
+        now = time.monotonic()
+
+        with self._lock:
+            item = self._entries.get(key)
+            if item is not None and item[0] <= now:
+                self._drop(key)
+                item = None
+            if item is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return item[1]
+
+            if near_ok:
+                near = self._near(scope, prompt, grams, bands, now)
+                if near is not None:
+                    self._entries.move_to_end(near)
+                    self.near_hits += 1
+                    return self._entries[near][1]
+
+            self.misses += 1
+            return None
+
+    def set(self, prompt: str, scope: str, reply: str, ttl: int | None = None):
+        ttl = self.ttl if ttl is None else ttl
+        prompt = normalize_query(prompt)
+        if ttl <= 0 or not prompt or not reply:
+            return
+
+        key = (scope, prompt)
+        grams = shingles(prompt)
+        bands = self._bands(self._hasher.signature(grams))
+
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.monotonic() + ttl, reply, grams, bands)
+            for i, band in bands:
+                self._buckets.setdefault((scope, i, band), set()).add(key)
+            while len(self._entries) > self.maxsize:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def ttl_for(self, intents) -> int:
+        return RESPONSE_CACHE_NEWS_TTL if "news" in intents else self.ttl
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = len(self._entries)
+            buckets = len(self._buckets)
+        total = self.hits + self.near_hits + self.misses
+        return {
+            "size": size,
+            "maxsize": self.maxsize,
+            "lsh_buckets": buckets,
+            "hits": self.hits,
+            "near_hits": self.near_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round((self.hits + self.near_hits) / total, 3) if total else 0.0,
+            "threshold": self.threshold,
+        }
+
+
+response_cache = ResponseCache()
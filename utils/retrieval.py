@@ -0,0 +1,121 @@
+# utils/retrieval.py
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from utils.metrics import RETRIEVAL_SECONDS, RETRIEVAL_MISSED, RETRIEVAL_SKIPPED
+
+# seconds each source may take before it is dropped from the turn
+SOURCE_TIMEOUTS = {
+    "wikipedia": 2.5,
+    "news": 2.0,
+    "search": 3.0,
+}
+DEFAULT_SOURCE_TIMEOUT = 2.0
+
+# hard ceiling for the whole retrieval stage
+RETRIEVAL_BUDGET = float(os.getenv("RETRIEVAL_BUDGET", "3.0"))
+
+RETRIEVAL_WORKERS = int(os.getenv("RETRIEVAL_WORKERS", "8"))
+
+_executor = ThreadPoolExecutor(max_workers=RETRIEVAL_WORKERS, thread_name_prefix="retrieval")
+
+# lookups submitted and not yet finished, late ones included
+_inflight = 0
+_inflight_lock = threading.Lock()
+
+
+def source_timeout(name: str) -> float:
+    # also the network timeout of the source's own HTTP calls (utils/sources.py)
+    return SOURCE_TIMEOUTS.get(name, DEFAULT_SOURCE_TIMEOUT)
+
+
+def _timed(name: str, fn, query: str):
+    start = time.perf_counter()
+    try:
+        return fn(query)
+    finally:
+        RETRIEVAL_SECONDS.observe(time.perf_counter() - start, source=name)
+        _release()
+
+
+def _reserve() -> bool:
+    # a full pool would only queue the lookup behind late ones, past its deadline
+    global _inflight
+    with _inflight_lock:
+        if _inflight >= RETRIEVAL_WORKERS:
+            return False
+        _inflight += 1
+        return True
+
+
+def _release():
+    global _inflight
+    with _inflight_lock:
+        _inflight -= 1
+
+
+def fan_out(jobs: dict, query: str, budget: float = None) -> dict:
+    """
+    Run every `jobs[name](query)` at the same time and return
+    {name: result} for the ones that finished inside their own timeout
+    and the overall budget. Late sources are dropped, not waited on;
+    they keep running in the pool (until their own network timeout) and
+    still warm the retrieval cache. Sources wrapped in `cached_lookup`
+    are checked against the cache in the calling thread first; only
+    misses go to the pool, and while every pool thread is busy they are
+    skipped rather than queued.
+    """
+    if not jobs:
+        return {}
+
+    budget = RETRIEVAL_BUDGET if budget is None else budget
+    start = time.monotonic()
+
+    deadlines = {}
+    pending = set()
+    results = {}
+    for name, fn in jobs.items():
+        # cache hits are served here, so a full pool never throws them away
+        cached = getattr(fn, "cached", None)
+        if cached is not None:
+            hit = cached(query)
+            if hit is not None:
+                results[name] = hit
+                continue
+            fn = fn.fill
+
+        if not _reserve():
+            print(f"Retrieval pool full, skipping source {name}")
+            RETRIEVAL_SKIPPED.inc(source=name)
+            continue
+        fut = _executor.submit(_timed, name, fn, query)
+        timeout = min(source_timeout(name), budget)
+        deadlines[fut] = (name, start + timeout)
+        pending.add(fut)
+
+    while pending:
+        now = time.monotonic()
+        next_deadline = min(deadlines[f][1] for f in pending)
+        done, pending = wait(
+            pending, timeout=max(0.0, next_deadline - now), return_when=FIRST_COMPLETED
+        )
+
+        for fut in done:
+            name = deadlines[fut][0]
+            try:
+                results[name] = fut.result()
+            except Exception as e:
+                print(f"Retrieval source {name} failed:", e)
+
+        now = time.monotonic()
+        expired = {f for f in pending if deadlines[f][1] <= now}
+        for fut in expired:
+            if fut.cancel():
+                _release()  # never started, so _timed won't
+            print(f"Retrieval source {deadlines[fut][0]} missed its deadline")
+            RETRIEVAL_MISSED.inc(source=deadlines[fut][0])
+        pending -= expired
+
+    return results
@@ -0,0 +1,98 @@
+# utils/session_registry.py
+import os
+import threading
+import time
+
+from utils.message_sink import FIRESTORE_BATCH_LIMIT
+from utils.metrics import FIRESTORE_SECONDS
+
+# how long a worker trusts its cached answer; revocations made through
+# another worker take effect everywhere within this many seconds
+SESSION_CACHE_TTL = float(os.getenv("SESSION_CACHE_TTL", "5"))
+
+
+class SessionRegistry:
+    """
+    Validity check for the session id (`sid`) stored in each Flask
+    session. Answers come from a short-TTL in-process cache, so a request
+    normally costs no Firestore read; the sessions/{sid} document is the
+    source of truth.
+    """
+
+    def __init__(self, db, ttl=SESSION_CACHE_TTL, maxsize=50000):
+        self.db = db
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._cache = {}  # sid -> (expires, active)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.reads = 0
+
+    @property
+    def col(self):
+        # resolved per call: `db` may connect lazily
+        return self.db.collection("sessions")
+
+    def _remember(self, sid: str, active: bool):
+        with self._lock:
+            if len(self._cache) >= self.maxsize:
+                now = time.monotonic()
+                for k in [k for k, (exp, _) in self._cache.items() if exp <= now]:
+                    del self._cache[k]
+                if len(self._cache) >= self.maxsize:
+                    self._cache.clear()
+            self._cache[sid] = (time.monotonic() + self.ttl, active)
+
+    def is_active(self, sid: str) -> bool:
+        with self._lock:
+            item = self._cache.get(sid)
+            if item and item[0] > time.monotonic():
+                self.hits += 1
+                return item[1]
+            self.reads += 1
+
+        try:
+            with FIRESTORE_SECONDS.time(op="session_get"):
+                doc = self.col.document(sid).get()
+            active = bool(doc.exists and doc.to_dict().get("active"))
+        except Exception as e:
+            # fail open on a Firestore hiccup rather than logging everyone out
+            print("Session check error:", e)
+            return True
+
+        self._remember(sid, active)
+        return active
+
+    def _revoke_refs(self, refs):
+        for i in range(0, len(refs), FIRESTORE_BATCH_LIMIT):
+            batch = self.db.batch()
+            for ref in refs[i:i + FIRESTORE_BATCH_LIMIT]:
+                batch.update(ref, {"active": False})
+            with FIRESTORE_SECONDS.time(op="session_revoke"):
+                batch.commit()
+        for ref in refs:
+            self._remember(ref.id, False)
+
+    def revoke(self, sid: str):
+        self._revoke_refs([self.col.document(sid)])
+
+    def revoke_user(self, email: str, keep_sid: str | None = None) -> int:
+        """
+        Revoke every active session of `email` except `keep_sid` in
+        batched updates. Returns how many were revoked.
+        """
+        with FIRESTORE_SECONDS.time(op="session_query"):
+            docs = list(
+                self.col
+                .where("user_id", "==", email)
+                .where("active", "==", True)
+                .select([])
+                .stream()
+            )
+        refs = [d.reference for d in docs if d.id != keep_sid]
+        self._revoke_refs(refs)
+        return len(refs)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"cached": len(self._cache), "hits": self.hits, "reads": self.reads}
@@ -1,65 +1,58 @@
 # utils/sessions.py
 from datetime import datetime
-from utils.device import device_icon, browser_name
-from utils.location import detect_location
-from utils.email import send_new_device_alert
-from datetime import datetime
-
-from firebase_admin import firestore
-def get_db():
-    return firestore.client()
-def register_session(user_id, request):
-    db = get_db()
-    db.collection("sessions").add({
-        "user_id": user_id,
-        "agent": request.headers.get("User-Agent"),
-        "ip": request.remote_addr,
-        "created": datetime.utcnow(),
-        "active": True
-    })
-
-def register_session(user_email, request):
-    agent = request.headers.get("User-Agent", "")
-    ip = request.remote_addr or "0.0.0.0"
-
-    device = device_icon(agent)
-    browser = browser_name(agent)
-    location = detect_location(ip)
 
-    # 🔍 check if device already known
-    known = db.sessions.find_one({
-        "user_id": user_email,
-        "device": device,
-        "browser": browser
-    })
+from utils.useragent import parse_user_agent, device_fingerprint
+from utils.location import detect_location, UNKNOWN
+from utils.email import send_new_device_alert
 
-    if not known:
-        send_new_device_alert(
-            user_email,
-            device=device,
-            browser=browser,
-            location=location
-        )
-
-    db.sessions.insert_one({
-        "user_id": user_email,
-        "agent": agent,
-        "device": device,
-        "browser": browser,
-        "location": location,
-        "ip": ip,
-        "created": datetime.utcnow(),
-        "active": True
-    })
 
 def register_session(db, user_id, request):
     agent = request.headers.get("User-Agent", "")
     ip = request.remote_addr or "0.0.0.0"
-
-    db.collection("sessions").add({
+    ua = parse_user_agent(agent)
+
+    # the doc id is the session id kept in the Flask session
+    ref = db.collection("sessions").document()
+
+    # cached/offline answer now; a remote lookup may fill it in later.
+    # Both writes merge, so whichever lands first the location survives.
+    location = detect_location(
+        ip, on_resolved=lambda loc: ref.set({"location": loc}, merge=True)
+    )
+
+    # 🔍 known devices: one small doc per user, one read per login
+    fingerprint = device_fingerprint(agent)
+    known_ref = db.collection("known_devices").document(user_id)
+    known = known_ref.get()
+    known_set = set(known.to_dict().get("fingerprints", [])) if known.exists else set()
+
+    if fingerprint not in known_set:
+        from firebase_admin import firestore
+        known_ref.set(
+            {"fingerprints": firestore.ArrayUnion([fingerprint])}, merge=True
+        )
+        # the very first device of an account is not "new"
+        if known_set:
+            send_new_device_alert(
+                user_id,
+                device=f"{ua.icon} {ua.os}",
+                browser=ua.browser,
+                location=location,
+            )
+
+    session_doc = {
         "user_id": user_id,
         "agent": agent,
+        "device": ua.icon,
+        "os": ua.os,
+        "browser": ua.browser,
+        "fingerprint": fingerprint,
         "ip": ip,
         "created": datetime.utcnow(),
         "active": True
-    })
\ No newline at end of file
+    }
+    # an unknown location is left out so it can't overwrite a late answer
+    if location != UNKNOWN:
+        session_doc["location"] = location
+    ref.set(session_doc, merge=True)
+    return ref.id
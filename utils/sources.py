@@ -0,0 +1,70 @@
+# utils/sources.py
+"""
+Network calls behind the retrieval sources, each with a real socket
+timeout. fan_out() stops waiting for a late source, but it cannot stop
+the thread running it; these make sure that thread gives up too instead
+of holding a retrieval worker indefinitely.
+"""
+import re
+
+WIKI_API = "https://en.wikipedia.org/w/api.php"
+USER_AGENT = "ghost-chat (retrieval)"
+
+
+def _get(url: str, params: dict, timeout: float):
+    import requests
+    # (connect, read): the read timeout bounds each wait for bytes
+    resp = requests.get(
+        url, params=params, headers={"User-Agent": USER_AGENT}, timeout=(timeout, timeout)
+    )
+    resp.raise_for_status()
+    return resp
+
+
+def wiki_summary(query: str, sentences: int, timeout: float) -> str:
+    """
+    The first `sentences` sentences of the best Wikipedia match for
+    `query`, skipping disambiguation pages; "" if there is none. One API
+    request (search, redirects and extract together) where the
+    `wikipedia` package made three without a timeout.
+    """
+    data = _get(WIKI_API, {
+        "action": "query",
+        "format": "json",
+        "generator": "search",
+        "gsrsearch": query,
+        "gsrlimit": 3,
+        "prop": "extracts|pageprops",
+        "ppprop": "disambiguation",
+        "explaintext": 1,
+        "exsentences": sentences,
+        "redirects": 1,
+    }, timeout).json()
+
+    pages = sorted(data.get("query", {}).get("pages", {}).values(), key=lambda p: p.get("index", 0))
+    for page in pages:
+        if "disambiguation" not in page.get("pageprops", {}) and page.get("extract"):
+            return page["extract"]
+    return ""
+
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def split_sentences(text: str, n: int) -> tuple[str, str]:
+    """
+    (first `n` sentences, the rest) of a summary, so one extract can
+    serve as both the short verified snippet and the longer summary.
+    """
+    parts = _SENTENCE_END.split(text.strip(), maxsplit=n)
+    if len(parts) <= n:
+        return text.strip(), ""
+    return " ".join(parts[:n]), parts[n]
+
+
+def fetch_feed(url: str, params: dict, timeout: float):
+    """
+    feedparser.parse(url) fetches without a timeout; download first.
+    """
+    import feedparser
+    return feedparser.parse(_get(url, params, timeout).content)
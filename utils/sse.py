@@ -0,0 +1,239 @@
+# utils/sse.py
+import asyncio
+import contextlib
+import heapq
+import itertools
+import json
+import os
+import threading
+import time
+
+from utils.lazy import BackgroundThread
+
+SSE_COALESCE_BYTES = int(os.getenv("SSE_COALESCE_BYTES", "256"))
+SSE_COALESCE_MS = float(os.getenv("SSE_COALESCE_MS", "10"))
+
+_PREFIX = b'data: {"chunk": '
+_SUFFIX = b"}\n\n"
+
+
+def chunk_frame(text: str) -> bytes:
+    """
+    b'data: {"chunk": "..."}\\n\\n', the same bytes as
+    f"data: {json.dumps({'chunk': text})}\\n\\n" with only the string
+    itself going through json.
+    """
+    return _PREFIX + json.dumps(text).encode("utf-8") + _SUFFIX
+
+
+class Coalescer:
+    """
+    Merges token deltas into fewer SSE frames. The first delta goes out
+    at once (time to first token is what users notice), and so does any
+    delta arriving `interval` seconds or more after the last frame, so
+    slow streams are not delayed. Faster text is held until `max_bytes`
+    of UTF-8 have piled up or `interval` has passed.
+
+        c = Coalescer()
+        frame = c.add(delta)     # bytes to write now, or None
+        c.due_in()               # seconds until held text must go out
+        frame = c.flush()        # whatever is held, e.g. at the end
+    """
+
+    def __init__(self, max_bytes=SSE_COALESCE_BYTES, interval=SSE_COALESCE_MS / 1000,
+                 clock=time.monotonic):
+        self.max_bytes = max_bytes
+        self.interval = interval
+        self.clock = clock
+        self._parts = []
+        self._size = 0
+        self._last = None
+        self.frames = 0
+        self.deltas = 0
+
+    def add(self, text: str) -> bytes | None:
+        if not text:
+            return None
+        self.deltas += 1
+        self._parts.append(text)
+        self._size += len(text) if text.isascii() else len(text.encode("utf-8"))
+
+        now = self.clock()
+        if (
+            self._last is None
+            or self._size >= self.max_bytes
+            or now - self._last >= self.interval
+        ):
+            return self.flush()
+        return None
+
+    def due_in(self) -> float | None:
+        if not self._parts:
+            return None
+        return max(0.0, self._last + self.interval - self.clock())
+
+    def flush(self) -> bytes | None:
+        if not self._parts:
+            return None
+        text = "".join(self._parts)
+        self._parts = []
+        self._size = 0
+        self._last = self.clock()
+        self.frames += 1
+        return chunk_frame(text)
+
+
+class FlushTimer:
+    """
+    One background thread that flushes held text for every sync stream
+    when it falls due, so a slow next delta never delays what is already
+    there, and no stream needs a timer thread of its own.
+    """
+
+    def __init__(self):
+        self._heap = []  # (deadline, n, stream)
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = BackgroundThread(self._run, "sse-flush", on_start=self._reset)
+
+    def _reset(self):
+        # streams scheduled in the parent process (or before the thread died)
+        with self._cond:
+            self._heap = []
+
+    def schedule(self, stream, delay: float):
+        self._thread.ensure()
+        with self._cond:
+            heapq.heappush(self._heap, (time.monotonic() + delay, next(self._counter), stream))
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._heap:
+                    self._cond.wait()
+                deadline, _, stream = self._heap[0]
+                wait = deadline - time.monotonic()
+                if wait > 0:
+                    self._cond.wait(wait)
+                    continue
+                heapq.heappop(self._heap)
+            try:
+                again = stream.flush_due()
+            except Exception as e:
+                print("SSE flush error:", e)
+                continue
+            if again is not None:
+                self.schedule(stream, again)
+
+
+flush_timer = FlushTimer()
+
+
+class TimedStream:
+    """
+    A Coalescer feeding `emit(frame)`, with held text flushed by the
+    shared FlushTimer. Frames are emitted under one lock, in order.
+    """
+
+    def __init__(self, emit, coalescer: Coalescer | None = None, timer: FlushTimer = flush_timer):
+        self.emit = emit
+        self.coalescer = coalescer or Coalescer()
+        self.timer = timer
+        self._lock = threading.Lock()
+        self._scheduled = False
+        self._closed = False
+
+    def add(self, delta: str):
+        with self._lock:
+            frame = self.coalescer.add(delta)
+            if frame:
+                self.emit(frame)
+            due = self.coalescer.due_in()
+            schedule = due is not None and not self._scheduled
+            if schedule:
+                self._scheduled = True
+        if schedule:
+            self.timer.schedule(self, due)
+
+    def flush_due(self) -> float | None:
+        """
+        Called by the timer: flush if due, else seconds until it will be.
+        """
+        with self._lock:
+            self._scheduled = False
+            if self._closed:
+                return None
+            due = self.coalescer.due_in()
+            if due is None:
+                return None
+            if due > 0:
+                self._scheduled = True
+                return due
+            frame = self.coalescer.flush()
+            if frame:
+                self.emit(frame)
+            return None
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            frame = self.coalescer.flush()
+            if frame:
+                self.emit(frame)
+
+
+def coalesce_into(deltas, emit, coalescer: Coalescer | None = None):
+    """
+    Sync deltas -> emit(frame). Held text goes out when it is due even
+    if the next delta is slow to arrive; whatever is left is flushed at
+    the end, also when `deltas` raises.
+    """
+    stream = TimedStream(emit, coalescer)
+    try:
+        for delta in deltas:
+            stream.add(delta)
+    finally:
+        stream.close()
+
+
+async def coalesce_async(deltas, coalescer: Coalescer | None = None):
+    """
+    Async deltas -> frames, with a real timer: held text goes out when
+    it is due even if the next delta is slow to arrive.
+    """
+    coalescer = coalescer or Coalescer()
+    it = deltas.__aiter__()
+    pending = None
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(it.__anext__())
+            done, _ = await asyncio.wait({pending}, timeout=coalescer.due_in())
+            if not done:
+                frame = coalescer.flush()
+                if frame:
+                    yield frame
+                continue
+
+            task, pending = pending, None
+            try:
+                delta = task.result()
+            except StopAsyncIteration:
+                break
+            frame = coalescer.add(delta)
+            if frame:
+                yield frame
+
+        tail = coalescer.flush()
+        if tail:
+            yield tail
+    finally:
+        # the consumer went away: stop the producer now, not at GC time
+        if pending is not None:
+            pending.cancel()
+            with contextlib.suppress(asyncio.CancelledError, Exception):
+                await pending
+        aclose = getattr(it, "aclose", None)
+        if aclose is not None:
+            await aclose()
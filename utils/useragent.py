@@ -0,0 +1,61 @@
+# utils/useragent.py
+import hashlib
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+UserAgent = namedtuple("UserAgent", "os device browser icon")
+
+# every marker the classifiers below care about, found in one scan
+_MARKERS = re.compile(
+    r"edg|chrome|safari|firefox|iphone|ipad|android|macintosh|windows|linux"
+)
+
+
+@lru_cache(maxsize=4096)
+def parse_user_agent(agent: str) -> UserAgent:
+    """
+    OS, device class, browser and icon for a User-Agent string. Real
+    traffic has few distinct UAs, so results are memoized per string.
+    """
+    found = set(_MARKERS.findall((agent or "").lower()))
+
+    if "iphone" in found or "ipad" in found:
+        os_name = "iOS"
+    elif "android" in found:
+        os_name = "Android"
+    elif "windows" in found:
+        os_name = "Windows"
+    elif "macintosh" in found:
+        os_name = "macOS"
+    elif "linux" in found:
+        os_name = "Linux"
+    else:
+        os_name = "Unknown"
+
+    if found & {"iphone", "android", "ipad"}:
+        device, icon = "Mobile", "📱"
+    elif found & {"macintosh", "windows", "linux"}:
+        device, icon = "Desktop", "💻"
+    else:
+        device, icon = "Unknown", "🌐"
+
+    if "edg" in found:
+        browser = "Edge"
+    elif "chrome" in found and "safari" in found:
+        browser = "Chrome"
+    elif "safari" in found and "chrome" not in found:
+        browser = "Safari"
+    elif "firefox" in found:
+        browser = "Firefox"
+    else:
+        browser = "Unknown"
+
+    return UserAgent(os_name, device, browser, icon)
+
+
+def device_fingerprint(agent: str) -> str:
+    # compact and stable: the same browser on the same kind of device
+    ua = parse_user_agent(agent)
+    raw = f"{ua.os}|{ua.device}|{ua.browser}"
+    return hashlib.sha1(raw.encode()).hexdigest()[:12]
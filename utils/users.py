@@ -0,0 +1,114 @@
+# utils/users.py
+import threading
+import time
+
+from utils.cache import TTLCache
+from utils.metrics import FIRESTORE_SECONDS
+
+_MISSING = object()
+
+# unknown emails are cached only briefly: a signup on another worker
+# must show up there almost at once
+NEGATIVE_TTL = 1
+
+
+class UserExists(Exception):
+    pass
+
+
+class UserRepository:
+    """
+    Read-through cache in front of the `users` collection. Every write
+    goes through here and updates or drops the cached entry, so this
+    worker never serves its own stale data; other workers catch up
+    within `ttl` seconds. That lag is fine for names and themes, not for
+    credentials: checks like login pass `fresh=True`, which always reads
+    Firestore (and refreshes the cached entry).
+    """
+
+    def __init__(self, users_col, ttl=30, maxsize=10000):
+        self.col = users_col
+        # missing users are cached too ({}), for NEGATIVE_TTL, so bursts
+        # of probes for an unknown email don't each cost a read
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl, negative_ttl=NEGATIVE_TTL)
+        self._lock = threading.Lock()
+        self._minute = int(time.time() // 60)
+        self._saved_this_minute = 0
+        self._saved_last_minute = 0
+        self.reads = 0
+
+    def _count_saved(self):
+        minute = int(time.time() // 60)
+        with self._lock:
+            if minute != self._minute:
+                self._saved_last_minute = (
+                    self._saved_this_minute if minute == self._minute + 1 else 0
+                )
+                self._saved_this_minute = 0
+                self._minute = minute
+            self._saved_this_minute += 1
+
+    def get(self, email: str, fresh: bool = False) -> dict | None:
+        if not fresh:
+            cached = self._cache.get(email, _MISSING)
+            if cached is not _MISSING:
+                self._count_saved()
+                return dict(cached) if cached else None
+
+        with FIRESTORE_SECONDS.time(op="user_get"):
+            doc = self.col.document(email).get()
+        with self._lock:
+            self.reads += 1
+        data = doc.to_dict() if doc.exists else {}
+        self._cache.set(email, data)
+        return dict(data) if data else None
+
+    def exists(self, email: str) -> bool:
+        return self.get(email) is not None
+
+    def create(self, email: str, data: dict):
+        """
+        Raises UserExists instead of overwriting an existing account,
+        whatever this worker's cache says.
+        """
+        try:
+            with FIRESTORE_SECONDS.time(op="user_create"):
+                self.col.document(email).create(data)
+        except Exception as e:
+            from google.api_core.exceptions import AlreadyExists
+            if not isinstance(e, AlreadyExists):
+                raise
+            self._cache.invalidate(email)
+            raise UserExists(email) from e
+        self._cache.set(email, dict(data))
+
+    def update(self, email: str, fields: dict):
+        with FIRESTORE_SECONDS.time(op="user_update"):
+            self.col.document(email).update(fields)
+        cached = self._cache.get(email, _MISSING)
+        if cached is not _MISSING and cached:
+            self._cache.set(email, {**cached, **fields})
+        else:
+            self._cache.invalidate(email)
+
+    def delete(self, email: str):
+        with FIRESTORE_SECONDS.time(op="user_delete"):
+            self.col.document(email).delete()
+        self._cache.invalidate(email)
+
+    def stats(self) -> dict:
+        minute = int(time.time() // 60)
+        with self._lock:
+            this_minute = self._saved_this_minute if minute == self._minute else 0
+            last_minute = (
+                self._saved_last_minute if minute == self._minute
+                else self._saved_this_minute if minute == self._minute + 1
+                else 0
+            )
+            reads = self.reads
+        return {
+            **self._cache.stats(),
+            "firestore_reads": reads,
+            "reads_saved_this_minute": this_minute,
+            "reads_saved_last_minute": last_minute,
+        }